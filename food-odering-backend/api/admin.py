@@ -1,25 +1,56 @@
+from functools import partial
+
 from django.contrib import admin
-from .models import FoodItem, Order
+from django.db import transaction
+from .models import FoodItem, Ingredient, Order
 from django.utils.html import format_html  # Import for image preview functionality
+from .images import smallest_variant_url
+from .recommender import recommender
 
 @admin.register(FoodItem)
 class FoodItemAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'category', 'image_preview')  # Columns to display in the admin list view
+    list_display = ('name', 'price', 'category', 'like_count', 'dislike_count', 'image_preview')  # Columns to display in the admin list view
     list_filter = ('category',)  # Filter by category
     search_fields = ('name',)  # Search by name
     fields = ('name', 'price', 'category', 'ingredients', 'image',)  # Fields in the edit form
 
-    # Method to display a preview of the image
+    # Method to display a preview of the image, from its smallest variant once it exists
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 100px; height: auto;" />', obj.image.url)
+            url = smallest_variant_url(obj.image_hash) if obj.image_hash else obj.image.url
+            return format_html('<img src="{}" style="width: 100px; height: auto;" />', url)
         return "No Image"
 
     image_preview.short_description = "Image Preview"  # Admin display label for the image preview
 
+    # Keep the precomputed TF-IDF item index in step with catalog edits; each
+    # edit is published as a new artifact version that every worker switches
+    # to, once the edit has committed, so a rolled-back edit publishes nothing
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or 'ingredients' in form.changed_data:
+            transaction.on_commit(partial(recommender.update_items, [(obj.id, obj.ingredients)]))
+
+    def delete_model(self, request, obj):
+        food_id = obj.id
+        super().delete_model(request, obj)
+        transaction.on_commit(partial(recommender.remove_items, [food_id]))
+
+    def delete_queryset(self, request, queryset):
+        food_ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(partial(recommender.remove_items, food_ids))
+
+# Ingredients are parsed from FoodItem.ingredients on save; listed here for lookup only
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
 # Register the Order model as-is
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'created_at')  # Customize this as needed
+    list_select_related = ('user',)  # The user column and Order.__str__ would otherwise query per row
     list_filter = ('created_at',)
     search_fields = ('user__username',)
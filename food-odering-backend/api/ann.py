@@ -0,0 +1,269 @@
+import numpy as np
+from scipy import sparse
+
+from .topk import to_dense, top_k
+
+# Below this many rows an exact scan is fast enough, so no index is built
+MIN_ROWS = 10_000
+# Lists probed per query unless told otherwise: the recall/latency knob
+DEFAULT_NPROBE = 8
+# Heaviest terms kept per centroid, so centroids stay sparse over a large vocabulary
+CENTROID_TERMS = 256
+# Rows k-means trains on per list; the rest are only assigned
+TRAINING_ROWS_PER_LIST = 256
+# Similarity cells held in memory at once by batch searches
+SEARCH_BUDGET = 2 ** 24
+
+
+def _truncate(rows, fallback=None, terms=CENTROID_TERMS):
+    """Keep the ``terms`` largest entries of every row and renormalize; empty rows take the ``fallback`` row."""
+    rows = sparse.csr_matrix(rows, dtype=np.float32)
+    indptr, indices, data = [0], [np.empty(0, dtype=np.int32)], [np.empty(0, dtype=np.float32)]
+    for row in range(rows.shape[0]):
+        source = rows
+        if rows.indptr[row] == rows.indptr[row + 1] and fallback is not None:
+            source = fallback
+        start, end = source.indptr[row], source.indptr[row + 1]
+        values, columns = source.data[start:end], source.indices[start:end]
+        if len(values) > terms:
+            keep = np.argpartition(-np.abs(values), terms - 1)[:terms]
+            values, columns = values[keep], columns[keep]
+        data.append(values)
+        indices.append(columns)
+        indptr.append(indptr[-1] + len(values))
+
+    truncated = sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=rows.shape)
+    truncated.sort_indices()
+    norms = np.sqrt(np.asarray(truncated.multiply(truncated).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(truncated).tocsr().astype(np.float32)
+
+
+def _nearest(matrix, centroids):
+    """Closest centroid of every row of ``matrix``."""
+    n_rows = matrix.shape[0]
+    assignments = np.empty(n_rows, dtype=np.int32)
+    chunk = max(1, SEARCH_BUDGET // max(centroids.shape[0], 1))
+    for start in range(0, n_rows, chunk):
+        similarities = to_dense(matrix[start:start + chunk] @ centroids.T)
+        assignments[start:start + chunk] = similarities.argmax(axis=1)
+    return assignments
+
+
+def _merge(candidates, scores, k):
+    """The ``k`` best (candidate, score) pairs of every row, best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    return np.take_along_axis(candidates, top, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized rows (sparse TF-IDF or dense latent
+    vectors), for cosine similarity.
+
+    Spherical k-means splits the rows into ``n_lists`` clusters, and a query
+    is scored exactly against the members of its ``nprobe`` closest clusters
+    only. ``nprobe`` trades recall for latency: probing every list gives the
+    exact result. Centroids keep only their largest terms, so they stay
+    sparse over a large vocabulary. The index is plain arrays and is stored
+    inside the artifact whose rows it indexes.
+    """
+
+    backend = 'ivf'
+
+    def __init__(self, centroids, assignments, order=None, offsets=None):
+        self.centroids = sparse.csr_matrix(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        if order is None:
+            # Rows grouped by list, so a list's members are one slice
+            order = np.argsort(self.assignments, kind='stable')
+            offsets = np.searchsorted(self.assignments[order], np.arange(self.n_lists + 1))
+        self.order = order
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.assignments)
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, iterations=10, seed=0):
+        """Cluster the rows of ``matrix``, which must be L2-normalized; ``n_lists`` defaults to sqrt(rows)."""
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32) if sparse.issparse(matrix) else np.asarray(matrix)
+        n_rows = matrix.shape[0]
+        if not n_rows:
+            raise ValueError('Cannot build an index over an empty matrix')
+        n_lists = min(n_lists or max(1, int(np.sqrt(n_rows))), n_rows)
+
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(n_rows, min(n_rows, n_lists * TRAINING_ROWS_PER_LIST), replace=False))]
+        centroids = _truncate(sample[rng.choice(sample.shape[0], n_lists, replace=False)])
+        for _ in range(iterations):
+            assignments = _nearest(sample, centroids)
+            members = sparse.csr_matrix(
+                (np.ones(len(assignments), dtype=np.float32), (assignments, np.arange(len(assignments)))),
+                shape=(n_lists, sample.shape[0]),
+            )
+            # Each centroid moves to the mean direction of its members; empty lists keep theirs
+            centroids = _truncate(members @ sample, fallback=centroids)
+        return cls(centroids, _nearest(matrix, centroids))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        centroids = sparse.csr_matrix(
+            (arrays['centroid_data'], arrays['centroid_indices'], arrays['centroid_indptr']),
+            shape=tuple(arrays['centroid_shape']),
+        )
+        return cls(centroids, arrays['assignments'], arrays['order'], arrays['offsets'])
+
+    def arrays(self):
+        return {
+            'backend': np.array(self.backend),
+            'centroid_data': self.centroids.data,
+            'centroid_indices': self.centroids.indices,
+            'centroid_indptr': self.centroids.indptr,
+            'centroid_shape': np.array(self.centroids.shape),
+            'assignments': self.assignments,
+            'order': self.order,
+            'offsets': self.offsets,
+        }
+
+    def probe(self, queries, nprobe=DEFAULT_NPROBE):
+        """The ``nprobe`` closest lists of every query row, shape (queries, nprobe)."""
+        similarities = to_dense(queries @ self.centroids.T)
+        if nprobe >= self.n_lists:
+            return np.broadcast_to(np.arange(self.n_lists), similarities.shape)
+        return np.argpartition(-similarities, nprobe - 1, axis=1)[:, :nprobe]
+
+    def members(self, lists):
+        """Rows assigned to any of ``lists``."""
+        return np.concatenate(
+            [np.empty(0, dtype=np.intp)] + [self.order[self.offsets[list_id]:self.offsets[list_id + 1]] for list_id in lists]
+        )
+
+    def search(self, matrix, query, k=10, nprobe=DEFAULT_NPROBE, excluded=None):
+        """
+        Rows of ``matrix`` that best match one query vector, best first.
+
+        Only the members of the probed lists are scored. ``excluded`` is an
+        optional boolean mask over the rows, as for ``top_k``.
+        """
+        if sparse.issparse(query):
+            query = query.toarray()
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        rows = self.members(self.probe(query, nprobe)[0])
+        scores = np.asarray(matrix[rows] @ query.ravel()).ravel()
+        winners = top_k(scores, k, excluded[rows] if excluded is not None else None)
+        return rows[winners]
+
+    def search_rows(self, matrix, rows=None, k=10, nprobe=DEFAULT_NPROBE):
+        """
+        The ``k`` nearest rows of the sparse ``matrix`` to each of its own
+        ``rows`` (all rows by default), never the row itself.
+
+        Queries are grouped by the lists they probe, so every list is scored
+        against all of its queries in one sparse product. Returns (neighbours,
+        similarities) of shape (len(rows), k), padded with -1 / -inf.
+        """
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows, dtype=np.int64)
+        neighbours = np.full((len(rows), k), -1, dtype=np.int64)
+        similarities = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        if not len(rows):
+            return neighbours, similarities
+
+        chunk = max(1, SEARCH_BUDGET // self.n_lists)
+        probed = np.vstack([self.probe(matrix[rows[start:start + chunk]], nprobe) for start in range(0, len(rows), chunk)])
+        query_of = np.repeat(np.arange(len(rows)), probed.shape[1])
+        by_list = np.argsort(probed.ravel(), kind='stable')
+        bounds = np.searchsorted(probed.ravel()[by_list], np.arange(self.n_lists + 1))
+
+        for list_id in range(self.n_lists):
+            members = self.order[self.offsets[list_id]:self.offsets[list_id + 1]]
+            queries = query_of[by_list[bounds[list_id]:bounds[list_id + 1]]]
+            if not len(members) or not len(queries):
+                continue
+            member_rows = matrix[members].T.tocsr()
+            chunk = max(1, SEARCH_BUDGET // len(members))
+            for start in range(0, len(queries), chunk):
+                block = queries[start:start + chunk]
+                scores = (matrix[rows[block]] @ member_rows).toarray()
+                scores[rows[block][:, None] == members[None, :]] = -np.inf
+                neighbours[block], similarities[block] = _merge(
+                    np.hstack([neighbours[block], np.broadcast_to(members, scores.shape)]),
+                    np.hstack([similarities[block], scores]),
+                    k,
+                )
+
+        neighbours[~np.isfinite(similarities)] = -1
+        return neighbours, similarities
+
+    def with_rows(self, matrix, rows):
+        """
+        Return a copy covering every row of ``matrix``, with ``rows`` (new or
+        changed) assigned to their closest list. Centroids are not retrained.
+        """
+        assignments = np.zeros(matrix.shape[0], dtype=np.int32)
+        kept = min(len(self), matrix.shape[0])
+        assignments[:kept] = self.assignments[:kept]
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            assignments[rows] = _nearest(matrix[rows], self.centroids)
+        return IVFIndex(self.centroids, assignments)
+
+    def without_rows(self, keep):
+        """Return a copy without the rows where the boolean mask ``keep`` is False."""
+        return IVFIndex(self.centroids, self.assignments[keep])
+
+
+# Index types by the name stored with their arrays
+BACKENDS = {IVFIndex.backend: IVFIndex}
+
+
+def build_ann(matrix, backend=IVFIndex.backend, min_rows=MIN_ROWS, **options):
+    """Index the L2-normalized rows of ``matrix``, or return None when there are fewer than ``min_rows``."""
+    if matrix.shape[0] < min_rows:
+        return None
+    return BACKENDS[backend].build(matrix, **options)
+
+
+def ann_arrays(index, prefix='ann_'):
+    """The arrays of ``index`` under ``prefix``, to store next to the rows it indexes."""
+    if index is None:
+        return {}
+    return {prefix + name: value for name, value in index.arrays().items()}
+
+
+def load_ann(data, prefix='ann_'):
+    """Rebuild the index stored under ``prefix`` in loaded artifact arrays, or None if there is none."""
+    arrays = {name[len(prefix):]: value for name, value in data.items() if name.startswith(prefix)}
+    if not arrays:
+        return None
+    return BACKENDS[str(arrays['backend'][()])].from_arrays(arrays)
+
+
+def recall_at_k(index, matrix, rows, k=10, nprobe=DEFAULT_NPROBE):
+    """
+    Mean recall@k of ``index.search`` against an exact scan, using the given
+    ``rows`` of ``matrix`` as queries (each row excluded from its own result).
+
+    A returned row counts as a hit when it scores at least as high as the
+    k-th exact match, so ties at the cut-off are not counted as misses.
+    """
+    recalls = []
+    for row in rows:
+        query = to_dense(matrix[row]).ravel()
+        scores = np.asarray(matrix @ query).ravel()
+        excluded = np.zeros(matrix.shape[0], dtype=bool)
+        excluded[row] = True
+        exact = top_k(scores, k, excluded)
+        if not len(exact):
+            continue
+        found = index.search(matrix, query, k, nprobe, excluded)
+        recalls.append(np.count_nonzero(scores[found] >= scores[exact[-1]]) / len(exact))
+    return float(np.mean(recalls)) if recalls else 1.0
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401  Connect cache invalidation receivers
+        from . import checks  # noqa: F401  Register the shared cache check
+
+        # Web workers can load the ML stack up front; everything else loads it on first use
+        if settings.RECOMMENDER_WARMUP:
+            from .recommender import recommender
+            recommender.warm()
@@ -0,0 +1,231 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Every training run writes a complete artifact set to its own directory
+# under VERSIONS_DIR, described by a manifest; CURRENT names the set that is
+# being served. Served artifacts are directories of .npy arrays that workers
+# memory-map, so all of them share one copy through the page cache. Paths
+# are absolute so they do not depend on the working
+# directory of the worker. Keep this module free of Django imports:
+# train_model.py runs outside the project.
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_models')
+VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+CURRENT_FILE = os.path.join(MODEL_DIR, 'CURRENT')
+MANIFEST_NAME = 'manifest.json'
+# Held while a set is derived from the current one and published
+LOCK_FILE = os.path.join(MODEL_DIR, '.lock')
+KEEP_VERSIONS = 5  # Older artifact sets are deleted after a successful publish
+
+
+def current_version():
+    """Return the name of the artifact set being served, or None before the first versioned run."""
+    try:
+        with open(CURRENT_FILE) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(version):
+    return os.path.join(VERSIONS_DIR, version)
+
+
+def version_path(version, name):
+    """Path of an artifact in ``version``, or in the flat ml_models/ layout when it is None."""
+    if version is None:
+        return os.path.join(MODEL_DIR, name)
+    return os.path.join(version_dir(version), name)
+
+
+def artifact_path(name, version=None):
+    """
+    Path of an artifact in the given (default: current) set. Falls back to
+    the flat ml_models/ layout used before artifacts were versioned.
+    """
+    return version_path(version or current_version(), name)
+
+
+def create_version():
+    """Create an empty directory for a new artifact set and return its name."""
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    base = time.strftime('%Y%m%d-%H%M%S')
+    version, suffix = base, 1
+    while True:
+        try:
+            os.mkdir(version_dir(version))
+            return version
+        except FileExistsError:
+            suffix += 1
+            version = f'{base}-{suffix}'
+
+
+def derive_version(base, names, replace=()):
+    """
+    Create a new set holding every artifact of ``base`` except ``replace``,
+    hard-linked rather than copied, and return its name. Artifacts are never
+    rewritten in place, so two sets can share their files. ``names`` lists
+    the artifacts to take from the flat layout when ``base`` is None.
+    """
+    version = create_version()
+    if base is None:
+        entries = [name for name in names if os.path.exists(version_path(None, name))]
+    else:
+        entries = [name for name in os.listdir(version_dir(base)) if name != MANIFEST_NAME]
+    for name in entries:
+        if name in replace:
+            continue
+        source, target = version_path(base, name), version_path(version, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, copy_function=os.link)
+        else:
+            os.link(source, target)
+    return version
+
+
+@contextlib.contextmanager
+def artifact_lock():
+    """
+    Exclusive lock, across processes, for a read-modify-publish cycle that
+    starts from the current set, so two of them never publish over each other.
+    """
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(LOCK_FILE, 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        yield  # Closing the file releases the lock
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _files(directory):
+    """Paths of every file under ``directory``, relative to it."""
+    for root, _, names in os.walk(directory):
+        for name in names:
+            yield os.path.relpath(os.path.join(root, name), directory)
+
+
+def write_manifest(version, **info):
+    """Record every file of the set with its size and checksum, plus ``info``."""
+    directory = version_dir(version)
+    files = {
+        name: {'size': os.path.getsize(os.path.join(directory, name)), 'sha256': _sha256(os.path.join(directory, name))}
+        for name in sorted(_files(directory)) if name != MANIFEST_NAME
+    }
+    manifest = {'version': version, 'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'files': files, **info}
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def read_manifest(version):
+    with open(os.path.join(version_dir(version), MANIFEST_NAME)) as file:
+        return json.load(file)
+
+
+def publish(version):
+    """
+    Point CURRENT at ``version`` with a single atomic rename, after checking
+    that every file in its manifest is present and complete.
+    """
+    for name, entry in read_manifest(version)['files'].items():
+        path = os.path.join(version_dir(version), name)
+        if not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+            raise ValueError(f'Artifact {path} does not match the manifest of {version}')
+
+    tmp_path = f'{CURRENT_FILE}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(version)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, CURRENT_FILE)
+
+
+def save_arrays(path, **arrays):
+    """
+    Write each array to ``path/<name>.npy``. The directory is assembled under
+    a temporary name and swapped in whole; files are never rewritten in
+    place, so workers that still map the old ones keep reading valid data.
+    """
+    parent, name = os.path.split(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f'.{name}.', dir=parent)
+    try:
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{key}.npy'), array)
+        os.chmod(tmp_path, 0o755)
+        old_path = None
+        if os.path.exists(path):
+            old_path = tempfile.mkdtemp(prefix=f'.{name}.old.', dir=parent)
+            os.rename(path, os.path.join(old_path, name))
+        os.rename(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    if old_path:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_arrays(path, mmap_mode='r'):
+    """Memory-map every array written by save_arrays; pages are read on first touch."""
+    return {
+        name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+        for name in os.listdir(path) if name.endswith('.npy')
+    }
+
+
+def prune_versions(keep):
+    """
+    Delete all but the ``keep`` newest complete sets, never the current one.
+    Sets without a manifest are still being written and are left alone.
+    """
+    current = current_version()
+    versions = sorted(
+        version for version in (os.listdir(VERSIONS_DIR) if os.path.isdir(VERSIONS_DIR) else [])
+        if os.path.exists(os.path.join(version_dir(version), MANIFEST_NAME))
+    )
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+
+
+class PointerWatcher:
+    """
+    Cheap change detection for CURRENT: at most one ``stat`` every
+    ``interval`` seconds, and ``changed`` is only True when the pointer file
+    was replaced since the last check.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_check = 0.0
+        self.signature = self._signature()
+
+    def _signature(self):
+        try:
+            stat = os.stat(CURRENT_FILE)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
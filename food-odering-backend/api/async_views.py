@@ -0,0 +1,188 @@
+"""
+Async variants of the recommendation and catalog endpoints, for ASGI workers.
+
+DRF views are sync-only, so these are plain Django ``async def`` views that
+authenticate the same ``Authorization: Token <key>`` header and return the
+same JSON. Database access goes through the async ORM; ranking is CPU-bound
+numpy/scipy work and runs on a bounded thread pool so it never blocks the
+event loop. Concurrent requests for the same user's ranking share a single
+computation instead of each scoring the catalog.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from decimal import InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .authentication import acached_token
+from .models import FoodItem
+from .pagination import FoodItemCursorPagination
+from .recommendation_cache import acached_recommendations, acatalog_etag, arecommendations_etag
+from .recommender import recommender
+from .serializers import FoodItemListSerializer, FoodItemSerializer
+from .views import etag_matches, not_modified, parse_catalog_filters, parse_cf_params, parse_excluded_ingredients, with_etag
+
+_executor = ThreadPoolExecutor(max_workers=settings.RECOMMENDER_THREADS, thread_name_prefix='recommender')
+# (event loop, kind, user id) -> the task ranking it, awaited by every concurrent request
+_in_flight = {}
+
+
+def token_required(view):
+    """Authenticate like CachedTokenAuthentication and set ``request.user``, or answer 401."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        header = request.headers.get('Authorization', '').split()
+        if len(header) != 2 or header[0] != 'Token':
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        entry = await acached_token(header[1])
+        if entry is None:
+            return JsonResponse({'detail': 'Invalid token.'}, status=401)
+        user, _ = entry
+        if not user.is_active:
+            return JsonResponse({'detail': 'User inactive or deleted.'}, status=401)
+
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def run_ranking(function, *args, **kwargs):
+    """Run a Recommender method on the ranking thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(function, *args, **kwargs))
+
+
+async def coalesced(key, compute):
+    """
+    Await ``compute()``, sharing one run between concurrent callers with the same key.
+
+    The task is shielded so a client that disconnects does not cancel the
+    ranking the other callers are waiting on.
+    """
+    key = (asyncio.get_running_loop(), *key)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def rated_ids(user):
+    """The ids the user liked and disliked, as two sets."""
+    liked_ids = {food_id async for food_id in user.liked_food_items.values_list('id', flat=True)}
+    disliked_ids = {food_id async for food_id in user.disliked_food_items.values_list('id', flat=True)}
+    return liked_ids, disliked_ids
+
+
+async def recommendations_response(request, kind, rank):
+    """Ranked items for ``request.user``, or a 304 when If-None-Match still matches."""
+    user = request.user
+    tag = await arecommendations_etag(kind, user.id)
+    if etag_matches(request, tag):
+        return not_modified(tag)
+
+    ranked_ids = await coalesced((kind, user.id), lambda: acached_recommendations(kind, user.id, rank))
+    items_by_id = await FoodItem.objects.ain_bulk(ranked_ids)
+    items = [items_by_id[food_id] for food_id in ranked_ids if food_id in items_by_id]
+    return with_etag(JsonResponse(FoodItemSerializer(items, many=True).data, safe=False), tag)
+
+
+@require_GET
+@token_required
+async def recommend_food_ml(request):
+    user = request.user
+    exclude_ingredients, kind = parse_excluded_ingredients(request.GET, 'ml')
+
+    async def rank():
+        liked_ids, disliked_ids = await rated_ids(user)
+        return await run_ranking(
+            recommender.rank_profile, liked_ids, exclude_ids=liked_ids | disliked_ids,
+            exclude_ingredients=exclude_ingredients,
+        )
+
+    return await recommendations_response(request, kind, rank)
+
+
+@require_GET
+@token_required
+async def recommend_food_cf(request):
+    """Async ``recommend_food_cf``: ?mode=cf|hybrid, ?alpha=0..1 and ?exclude_ingredients=a,b."""
+    user = request.user
+    try:
+        mode, alpha = parse_cf_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    exclude_ingredients, kind = parse_excluded_ingredients(request.GET, 'cf' if mode == 'cf' else f'hybrid:{alpha}')
+
+    async def rank():
+        liked_items = [item async for item in user.liked_food_items.only('id', 'ingredients')]
+        excluded = {item.id for item in liked_items}
+        excluded.update([food_id async for food_id in user.disliked_food_items.values_list('id', flat=True)])
+
+        if mode == 'cf':
+            return await run_ranking(
+                recommender.rank_collaborative, user.id, exclude_ids=excluded, exclude_ingredients=exclude_ingredients
+            )
+
+        liked_ingredients = " ".join([item.ingredients or "" for item in liked_items])
+        return await run_ranking(
+            recommender.rank_hybrid, user.id, liked_ingredients, excluded, alpha, exclude_ingredients=exclude_ingredients
+        )
+
+    return await recommendations_response(request, kind, rank)
+
+
+def paginated_catalog(request, items, context):
+    """Run the DRF cursor paginator, which is sync-only; None when no ?limit= was given."""
+    drf_request = Request(request)
+    paginator = FoodItemCursorPagination()
+    page = paginator.paginate_queryset(items, drf_request)
+    if page is None:
+        return None
+    return {
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': FoodItemListSerializer(page, many=True, context=context).data,
+    }
+
+
+@require_GET
+@token_required
+async def food_items(request):
+    """Async ``FoodItemList.get``, with the same filters, ?fields= and ?limit= pagination."""
+    params = request.GET
+    fields = [name for name in params.get('fields', '').split(',') if name]
+    try:
+        filters = parse_catalog_filters(params)
+    except InvalidOperation:
+        return JsonResponse({'error': 'min_price and max_price must be numbers'}, status=400)
+    tag = await acatalog_etag(request.user.id, params.lists())
+    if etag_matches(request, tag):
+        return not_modified(tag)
+
+    try:
+        items = FoodItem.objects.filter(filters).order_by('id')
+
+        context = {'fields': fields}
+        if not fields or 'user_interaction' in fields:
+            context['liked_ids'], context['disliked_ids'] = await rated_ids(request.user)
+
+        if 'limit' in params:
+            page = await sync_to_async(paginated_catalog)(request, items, context)
+            if page is not None:
+                return with_etag(JsonResponse(page), tag)
+
+        data = FoodItemListSerializer([item async for item in items], many=True, context=context).data
+        return with_etag(JsonResponse(data, safe=False), tag)
+    except APIException as e:
+        return JsonResponse({'detail': e.detail}, status=e.status_code)
+    except Exception as e:
+        return JsonResponse({"error": "Failed to fetch food items", "details": str(e)}, status=500)
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# The (user, token) pair one token key authenticates, in Django's cache
+TOKEN_KEY = 'auth_token:{key}'
+# The only fields a cached lookup holds; the rest of the user (the password
+# hash included) is never cached and loads from the database if accessed
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+TOKEN_FIELDS = ('key', 'user_id', 'created')
+# User fields whose change drops the user's cached lookups (see api/signals.py)
+AUTH_FIELDS = USER_FIELDS + ('password',)
+
+
+class LocalTokenCache:
+    """
+    Per-process LRU of recent token lookups, each kept for ``ttl`` seconds.
+
+    Invalidation only reaches the process that handles it, so ``ttl`` bounds
+    how long other workers may still accept a deleted token or a
+    deactivated user.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+_local = LocalTokenCache(settings.AUTH_TOKEN_LOCAL_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def _valid_key(key):
+    # Anything else cannot be a Token key, and would not be a safe cache key
+    return 0 < len(key) <= 40 and key.isalnum()
+
+
+def _entry(token):
+    """The cacheable field values of a Token and its user."""
+    return (
+        {name: getattr(token.user, name) for name in USER_FIELDS},
+        {name: getattr(token, name) for name in TOKEN_FIELDS},
+    )
+
+
+def _from_values(model, values):
+    # from_db takes the values in field order and defers every field left out
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(model.objects.db, names, [values[name] for name in names])
+
+
+def _instances(entry):
+    # Every request gets its own instances, so nothing it sets on them leaks into other requests
+    user_values, token_values = entry
+    user = _from_values(Token._meta.get_field('user').related_model, user_values)
+    token = _from_values(Token, token_values)
+    token.user = user
+    return user, token
+
+
+def cached_token(key):
+    """
+    Return (user, token) for a token key, or None if there is no such token.
+    Tries the local LRU, then Django's cache, then the database.
+    """
+    if not _valid_key(key):
+        return None
+    entry = _local.get(key)
+    if entry is None:
+        entry = cache.get(TOKEN_KEY.format(key=key))
+        if entry is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                return None
+            entry = _entry(token)
+            cache.set(TOKEN_KEY.format(key=key), entry, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        _local.set(key, entry)
+    return _instances(entry)
+
+
+async def acached_token(key):
+    """Async counterpart of ``cached_token``."""
+    if not _valid_key(key):
+        return None
+    entry = _local.get(key)
+    if entry is None:
+        entry = await cache.aget(TOKEN_KEY.format(key=key))
+        if entry is None:
+            try:
+                token = await Token.objects.select_related('user').aget(key=key)
+            except Token.DoesNotExist:
+                return None
+            entry = _entry(token)
+            await cache.aset(TOKEN_KEY.format(key=key), entry, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        _local.set(key, entry)
+    return _instances(entry)
+
+
+def forget_tokens(keys):
+    """Drop cached lookups of these token keys, after a logout or a change to their user."""
+    keys = list(keys)
+    for key in keys:
+        _local.discard(key)
+    cache.delete_many([TOKEN_KEY.format(key=key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication without the per-request Token/user query.
+
+    Lookups are cached in Django's cache and in a short-lived per-process
+    LRU in front of it, so steady-state requests authenticate without a
+    query or a cache round trip. Deleting a token (logout) and saving its
+    user (e.g. deactivation) invalidate the entries; see api/signals.py.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = cached_token(key)
+        if entry is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user, token = entry
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
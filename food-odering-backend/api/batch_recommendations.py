@@ -0,0 +1,59 @@
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import F
+
+from .interactions import DISLIKES, LIKES
+from .models import CustomUser
+from .recommender import BATCH_MEMORY_BUDGET, recommender
+
+
+def parse_shard(value):
+    """Parse ``"i/n"`` into ``(i, n)``; raises ValueError unless 0 <= i < n."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except (AttributeError, ValueError):
+        raise ValueError('shard must look like "0/4"')
+    if not 0 <= index < count:
+        raise ValueError('shard must be "i/n" with 0 <= i < n')
+    return index, count
+
+
+def shard_user_ids(shard=(0, 1), chunk_size=1000):
+    """Ids of active users whose id modulo n is i, in id order."""
+    index, count = shard
+    users = CustomUser.objects.filter(is_active=True).order_by('id')
+    if count > 1:
+        users = users.alias(shard=F('id') % count).filter(shard=index)
+    return users.values_list('id', flat=True).iterator(chunk_size=chunk_size)
+
+
+def user_ratings(user_ids, chunk_size=1000):
+    """
+    Yield ``(user_id, liked_ids, rated_ids)`` for ``user_ids``.
+
+    Ratings are read straight from the join tables, two queries per block of
+    ``chunk_size`` users.
+    """
+    user_ids = iter(user_ids)
+    while block := list(islice(user_ids, chunk_size)):
+        liked, disliked = defaultdict(set), defaultdict(set)
+        for ratings, through in ((liked, LIKES), (disliked, DISLIKES)):
+            rows = through.objects.filter(customuser_id__in=block).values_list('customuser_id', 'fooditem_id')
+            for user_id, food_id in rows:
+                ratings[user_id].add(food_id)
+        for user_id in block:
+            yield user_id, liked[user_id], liked[user_id] | disliked[user_id]
+
+
+def batch_recommendations(shard=(0, 1), k=10, chunk_size=1000, memory_budget=BATCH_MEMORY_BUDGET):
+    """Yield ``(user_id, ranked food ids)`` for every active user in the shard, as recommendations_ml ranks them."""
+    users = user_ratings(shard_user_ids(shard, chunk_size), chunk_size)
+    return recommender.rank_profiles(users, k=k, memory_budget=memory_budget)
+
+
+def jsonl(results):
+    """Encode ``(user_id, food_ids)`` pairs as JSON lines."""
+    for user_id, food_ids in results:
+        yield json.dumps({'user_id': user_id, 'food_ids': food_ids}) + '\n'
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    """
+    Version stamps, token lookups and prices are invalidated by whichever
+    worker handles the change, so a deployment's default cache must be
+    shared by all of them.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f'The default cache ({backend}) is not shared between processes.',
+            hint='With several workers, 304 responses, token lookups and prices go stale. '
+                 'Set REDIS_URL or MEMCACHED_LOCATION.',
+            id='api.E001',
+        )
+    ]
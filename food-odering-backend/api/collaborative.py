@@ -0,0 +1,149 @@
+import numpy as np
+from scipy import sparse
+
+from .ann import ann_arrays, load_ann
+from .artifacts import artifact_path, load_arrays, save_arrays
+from .topk import top_k
+
+# Written by train_model.py next to the NearestNeighbors model
+COLLABORATIVE_NAME = 'collaborative'
+
+
+class CollaborativeModel:
+    """
+    User-based collaborative filtering served from precomputed neighbour lists.
+
+    ``interactions`` is the sparse user x food matrix from training (like/order
+    = 1, dislike = -1). ``neighbours[row]`` holds the rows of that user's
+    nearest neighbours and ``similarities[row]`` their cosine similarities, so
+    a recommendation is a lookup plus one small sparse product. Users are
+    found by binary search over ``user_order`` rather than a per-process
+    dict, so a loaded model is nothing but memory-mapped arrays. ``ann``
+    optionally indexes the normalized interaction rows, so training can find
+    neighbours without comparing every pair of users. ``ordered`` marks the
+    cells with an order (see dataset.build_order_matrix), for incremental
+    training; sets saved before it existed load without it.
+    """
+
+    def __init__(self, user_ids, food_ids, interactions, neighbours, similarities, user_order=None, ann=None,
+                 ordered=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.food_ids = np.asarray(food_ids, dtype=np.int64)
+        self.interactions = sparse.csr_matrix(interactions, dtype=np.float32)
+        self.neighbours = np.asarray(neighbours)
+        self.similarities = np.asarray(similarities, dtype=np.float32)
+        self.user_order = np.argsort(self.user_ids, kind='stable') if user_order is None else user_order
+        self.ann = ann
+        self.ordered = ordered
+
+    @classmethod
+    def load(cls, path=None, mmap_mode='r'):
+        data = load_arrays(path or artifact_path(COLLABORATIVE_NAME), mmap_mode)
+        interactions = sparse.csr_matrix(
+            (data['data'], data['indices'], data['indptr']), shape=tuple(data['shape'])
+        )
+        ordered = None
+        if 'ordered_indices' in data:
+            ordered = sparse.csr_matrix(
+                (np.ones(len(data['ordered_indices']), dtype=bool), data['ordered_indices'], data['ordered_indptr']),
+                shape=interactions.shape,
+            )
+        return cls(
+            data['user_ids'], data['food_ids'], interactions,
+            data['neighbours'], data['similarities'], data['user_order'], load_ann(data), ordered,
+        )
+
+    def save(self, path=None):
+        ordered = {}
+        if self.ordered is not None:
+            ordered = dict(ordered_indices=self.ordered.indices, ordered_indptr=self.ordered.indptr)
+        save_arrays(
+            path or artifact_path(COLLABORATIVE_NAME),
+            user_ids=self.user_ids,
+            food_ids=self.food_ids,
+            data=self.interactions.data,
+            indices=self.interactions.indices,
+            indptr=self.interactions.indptr,
+            shape=np.array(self.interactions.shape),
+            neighbours=self.neighbours,
+            similarities=self.similarities,
+            user_order=self.user_order,
+            **ann_arrays(self.ann),
+            **ordered,
+        )
+
+    def row_of(self, user_id):
+        """Matrix row of ``user_id``, or None for users unseen in training."""
+        if not len(self.user_ids):
+            return None
+        found = min(np.searchsorted(self.user_ids, user_id, sorter=self.user_order), len(self.user_ids) - 1)
+        row = int(self.user_order[found])
+        return row if self.user_ids[row] == user_id else None
+
+    def knows(self, user_id):
+        return self.row_of(user_id) is not None
+
+    def scores(self, user_id):
+        """
+        Similarity-weighted sum of the neighbours' interactions, one score per
+        entry of ``food_ids``. Returns None for users unseen in training.
+        """
+        row = self.row_of(user_id)
+        if row is None:
+            return None
+
+        found = self.neighbours[row] >= 0
+        neighbour_rows = self.neighbours[row][found]
+        weights = self.similarities[row][found]
+        if not len(neighbour_rows):
+            return np.zeros(len(self.food_ids), dtype=np.float32)
+        return np.asarray(self.interactions[neighbour_rows].T @ weights).ravel()
+
+    def recommend(self, user_id, k=10, exclude_ids=()):
+        """Return the ids of the ``k`` foods the user's neighbours liked most."""
+        scores = self.scores(user_id)
+        if scores is None:
+            return []
+
+        # Never suggest what the user already rated during training or since
+        row = self.row_of(user_id)
+        excluded = np.zeros(len(self.food_ids), dtype=bool)
+        excluded[self.interactions[row].indices] = True
+        excluded |= np.isin(self.food_ids, list(exclude_ids))
+        excluded |= scores <= 0
+
+        winners = top_k(scores, k, excluded)
+        return [int(food_id) for food_id in self.food_ids[winners]]
+
+
+def blend_scores(content_ids, content_scores, cf_ids, cf_scores, alpha):
+    """
+    Blend collaborative scores into content scores over ``content_ids``.
+
+    Both score vectors are scaled to a maximum of 1 before mixing, so ``alpha``
+    is the weight of the collaborative signal (0 = content only, 1 = CF only).
+    Foods missing from the collaborative data get a CF score of 0.
+    """
+    blended = np.zeros(len(content_ids), dtype=np.float32)
+    if content_scores is not None and len(content_scores):
+        peak = np.abs(content_scores).max()
+        if peak > 0:
+            blended += (1 - alpha) * content_scores / peak
+
+    if cf_scores is not None and len(cf_scores):
+        peak = np.abs(cf_scores).max()
+        if peak > 0:
+            order = np.argsort(cf_ids)
+            found = np.searchsorted(cf_ids, content_ids, sorter=order)
+            found = np.minimum(found, len(cf_ids) - 1)
+            matched = cf_ids[order[found]] == content_ids
+            blended[matched] += alpha * cf_scores[order[found[matched]]] / peak
+    return blended
+
+
+def load_collaborative_model(path=None):
+    """Load the collaborative data written by train_model.py, or None if it is missing."""
+    try:
+        return CollaborativeModel.load(path)
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
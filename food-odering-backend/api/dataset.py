@@ -0,0 +1,185 @@
+import os
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+from .artifacts import load_arrays, save_arrays
+
+# Columnar training dataset shared by the export_data command and train_model.py.
+# Each column is a plain .npy file so training can memory-map it instead of
+# parsing text. Keep this module free of Django imports: train_model.py runs
+# outside the project.
+DATASET_DIR = 'ml_models/dataset'
+COLUMNS = {'user_id': np.int64, 'food_id': np.int64, 'interaction': np.int8}
+INTERACTION_CODES = {'like': 1, 'dislike': 2, 'order': 3}
+LIKE, DISLIKE, ORDER = (INTERACTION_CODES[name] for name in ('like', 'dislike', 'order'))
+
+
+class DatasetWriter:
+    """
+    Accumulate interaction rows in compact typed buffers and write one ``.npy``
+    file per column. The directory is swapped into place only once every
+    column has been written.
+    """
+
+    def __init__(self, path=DATASET_DIR):
+        self.path = path
+        self.columns = {'user_id': array('q'), 'food_id': array('q'), 'interaction': array('b')}
+
+    def __len__(self):
+        return len(self.columns['user_id'])
+
+    def add(self, user_id, food_id, interaction):
+        self.columns['user_id'].append(user_id)
+        self.columns['food_id'].append(food_id)
+        self.columns['interaction'].append(INTERACTION_CODES[interaction])
+
+    def save(self):
+        save_arrays(self.path, **{
+            name: np.frombuffer(self.columns[name], dtype=dtype) for name, dtype in COLUMNS.items()
+        })
+
+
+def exists(path=DATASET_DIR):
+    return all(os.path.exists(os.path.join(path, f'{name}.npy')) for name in COLUMNS)
+
+
+def load_columns(path=DATASET_DIR, mmap_mode='r'):
+    """Memory-map every column; pages are only read from disk when touched."""
+    columns = load_arrays(path, mmap_mode)
+    return {name: columns[name] for name in COLUMNS}
+
+
+def encode_interactions(names):
+    """Map interaction names from the CSV fallback to their integer codes."""
+    codes = np.zeros(len(names), dtype=np.int8)
+    for name, code in INTERACTION_CODES.items():
+        codes[np.asarray(names) == name] = code
+    return codes
+
+
+def interaction_values(interactions):
+    """Matrix value of each interaction code: like/order = 1, dislike = -1, unknown = 0."""
+    interactions = np.asarray(interactions)
+    values = np.zeros(len(interactions), dtype=np.int8)
+    values[interactions == DISLIKE] = -1
+    values[(interactions == LIKE) | (interactions == ORDER)] = 1
+    return values
+
+
+def _strongest_per_cell(rows, cols, values, shape):
+    """CSR matrix keeping the largest value per (row, col) so likes beat dislikes."""
+    known = values != 0
+    rows, cols, values = rows[known], cols[known], values[known]
+
+    # Sort by cell, then by value descending, and keep the first entry of each cell
+    cells = rows.astype(np.int64) * shape[1] + cols
+    order = np.lexsort((-values, cells))
+    cells, values = cells[order], values[order]
+    first = np.ones(len(cells), dtype=bool)
+    first[1:] = cells[1:] != cells[:-1]
+    cells, values = cells[first], values[first]
+
+    return sparse.csr_matrix(
+        (values.astype(np.float32), (cells // shape[1], cells % shape[1])), shape=shape
+    )
+
+
+def _positions(index, ids):
+    """Positions of ``ids`` in an id array that may not be sorted."""
+    order = np.argsort(index, kind='stable')
+    return order[np.searchsorted(index, ids, sorter=order)]
+
+
+def build_interaction_matrix(user_ids, food_ids, interactions):
+    """
+    Build the sparse user x food matrix straight from integer-coded columns.
+
+    A cell is 1 if the user liked or ordered the food, otherwise -1 if they
+    disliked it; pairs with no interaction are not stored. Returns the CSR
+    matrix plus the sorted ``user_index`` / ``food_index`` arrays that map rows
+    and columns back to ids.
+    """
+    user_index, rows = np.unique(np.asarray(user_ids), return_inverse=True)
+    food_index, cols = np.unique(np.asarray(food_ids), return_inverse=True)
+    matrix = _strongest_per_cell(rows, cols, interaction_values(interactions), (len(user_index), len(food_index)))
+    return matrix, user_index, food_index
+
+
+def _cell_matrix(cells, shape):
+    """Boolean CSR matrix with True at the flat ``row * width + col`` positions in ``cells``."""
+    cells = np.unique(cells)
+    return sparse.csr_matrix(
+        (np.ones(len(cells), dtype=bool), (cells // shape[1], cells % shape[1])), shape=shape
+    )
+
+
+def _cells(matrix, width):
+    """Flat positions of the stored cells of ``matrix`` in a matrix ``width`` columns wide."""
+    coo = matrix.tocoo()
+    return coo.row.astype(np.int64) * width + coo.col
+
+
+def build_order_matrix(user_index, food_index, user_ids, food_ids, interactions):
+    """
+    Boolean user x food matrix of the pairs with at least one order, over
+    the rows and columns ``build_interaction_matrix`` returned. Incremental
+    runs keep it next to the interactions, so a later dislike never erases
+    an order, as it would not in a full build.
+    """
+    ordered = np.asarray(interactions) == ORDER
+    rows = _positions(user_index, np.asarray(user_ids)[ordered])
+    cols = _positions(food_index, np.asarray(food_ids)[ordered])
+    return _cell_matrix(rows.astype(np.int64) * len(food_index) + cols, (len(user_index), len(food_index)))
+
+
+def merge_interactions(matrix, user_index, food_index, user_ids, food_ids, interactions, ordered=None):
+    """
+    Fold new interaction rows (in export order) into an existing matrix,
+    resolving every cell they touch the way a full build of the current
+    data would.
+
+    Unseen users and foods are appended as new rows and columns, so existing
+    positions (and the neighbour lists that refer to them) stay valid.
+    ``ordered`` is the ``build_order_matrix`` of the stored matrix. A touched
+    cell is 1 if the pair was ever ordered; otherwise it takes the last like
+    or dislike of the new rows. A like and a dislike are never both current,
+    so the later one replaced the earlier one and the stored value.
+    Returns the merged matrix, the extended id arrays, the rows of the users
+    that changed and the extended order matrix.
+    """
+    user_ids, food_ids, interactions = np.asarray(user_ids), np.asarray(food_ids), np.asarray(interactions)
+    user_index = np.concatenate([user_index, np.setdiff1d(user_ids, user_index)])
+    food_index = np.concatenate([food_index, np.setdiff1d(food_ids, food_index)])
+    shape = (len(user_index), len(food_index))
+    cells = _positions(user_index, user_ids).astype(np.int64) * shape[1] + _positions(food_index, food_ids)
+
+    ordered_cells = cells[interactions == ORDER]
+    if ordered is not None:
+        ordered_cells = np.union1d(_cells(ordered, shape[1]), ordered_cells)
+
+    # The last like or dislike of each cell
+    rated = (interactions == LIKE) | (interactions == DISLIKE)
+    order = np.argsort(cells[rated], kind='stable')
+    rated_cells, rated_values = cells[rated][order], interaction_values(interactions[rated])[order]
+    last = np.ones(len(rated_cells), dtype=bool)
+    last[:-1] = rated_cells[:-1] != rated_cells[1:]
+    rated_cells, rated_values = rated_cells[last], rated_values[last]
+
+    touched = np.union1d(rated_cells, cells[interactions == ORDER])
+    values = np.zeros(len(touched), dtype=np.float32)
+    values[np.searchsorted(touched, rated_cells)] = rated_values
+    values[np.isin(touched, ordered_cells)] = 1
+
+    existing = matrix.tocoo()
+    kept = ~np.isin(_cells(matrix, shape[1]), touched)
+    merged = sparse.csr_matrix(
+        (
+            np.concatenate([existing.data[kept], values]).astype(np.float32),
+            (np.concatenate([existing.row[kept], touched // shape[1]]),
+             np.concatenate([existing.col[kept], touched % shape[1]])),
+        ),
+        shape=shape,
+    )
+    return merged, user_index, food_index, np.unique(touched // shape[1]), _cell_matrix(ordered_cells, shape)
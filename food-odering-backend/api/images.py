@@ -0,0 +1,133 @@
+"""
+Resized copies of FoodItem images, named by the content hash of the original.
+
+A variant's URL changes whenever its original does, so variants can be
+served with a far-future, immutable Cache-Control. They are written in a
+background thread pool after a FoodItem's image is set or replaced, and
+``FoodItem.image_hash`` is only set once they all exist, so serializers
+never hand out a variant URL that is not there yet. The variants of a
+replaced image are deleted once no item uses its hash any more.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Widths in pixels, largest first; images are never upscaled
+VARIANT_WIDTHS = (960, 480, 160)
+# File extension -> (Pillow format, save options) of every width
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'food_images/variants'
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_THREADS, thread_name_prefix='image-variants')
+
+
+def content_hash(file):
+    """Short hex digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=10)
+    file.seek(0)
+    for chunk in iter(lambda: file.read(2**20), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_name(image_hash, width, extension):
+    return f'{VARIANT_DIR}/{image_hash}-{width}.{extension}'
+
+
+def variant_urls(image_hash):
+    """``{extension: {width: url}}`` for an image hash, or {} when there are no variants (yet)."""
+    if not image_hash:
+        return {}
+    return {
+        extension: {str(width): default_storage.url(variant_name(image_hash, width, extension)) for width in VARIANT_WIDTHS}
+        for extension in VARIANT_FORMATS
+    }
+
+
+def smallest_variant_url(image_hash, extension='jpg'):
+    return default_storage.url(variant_name(image_hash, VARIANT_WIDTHS[-1], extension))
+
+
+def write_variants(file, image_hash):
+    """Write every missing variant of an image file; each width is resized from the next larger one."""
+    from PIL import Image, ImageOps
+
+    names = [variant_name(image_hash, width, extension) for width in VARIANT_WIDTHS for extension in VARIANT_FORMATS]
+    if all(default_storage.exists(name) for name in names):
+        return
+
+    file.seek(0)
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for width in VARIANT_WIDTHS:
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for extension, (image_format, options) in VARIANT_FORMATS.items():
+                name = variant_name(image_hash, width, extension)
+                if default_storage.exists(name):
+                    continue
+                # JPEG has no alpha channel
+                frame = image.convert('RGB') if image_format == 'JPEG' else image
+                buffer = io.BytesIO()
+                frame.save(buffer, image_format, **options)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_variants(image_hash):
+    """Delete every variant of an image hash."""
+    for width in VARIANT_WIDTHS:
+        for extension in VARIANT_FORMATS:
+            default_storage.delete(variant_name(image_hash, width, extension))
+
+
+def generate_variants(food_id):
+    """
+    Write the variants of one FoodItem's current image and record its hash.
+    Returns the hash, or '' when the item has no image.
+    """
+    from .models import FoodItem
+    from .recommendation_cache import bump_catalog_version
+
+    item = FoodItem.objects.only('image', 'image_hash').get(pk=food_id)
+    image_hash = ''
+    if item.image:
+        with item.image.open('rb') as file:
+            image_hash = content_hash(file)
+            write_variants(file, image_hash)
+
+    # Skip the write if the image was replaced meanwhile; its own job records it
+    updated = FoodItem.objects.filter(pk=food_id, image=item.image.name).exclude(image_hash=image_hash).update(
+        image_hash=image_hash
+    )
+    if updated:
+        bump_catalog_version()
+        # Other items may have been given the same picture
+        if item.image_hash and not FoodItem.objects.filter(image_hash=item.image_hash).exists():
+            delete_variants(item.image_hash)
+    return image_hash
+
+
+def _run(food_id):
+    try:
+        generate_variants(food_id)
+    except Exception:
+        logger.exception('Could not generate image variants for food item %s', food_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(food_id):
+    """Generate a FoodItem's variants in the background once the current transaction commits."""
+    transaction.on_commit(lambda: _executor.submit(_run, food_id))
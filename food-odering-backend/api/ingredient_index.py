@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+
+class IngredientIndex:
+    """
+    Inverted index from ingredient name to the sorted ids of the FoodItems
+    that contain it.
+
+    The posting lists are concatenated into one array with ``offsets`` per
+    sorted name, so a lookup is a binary search and a slice, and resolving a
+    set of excluded ingredients never touches the ingredient text.
+    """
+
+    def __init__(self, names, offsets, food_ids):
+        self.names = names
+        self.offsets = offsets
+        self.food_ids = food_ids
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_links(cls, links):
+        """Build from ``(name, food_id)`` pairs sorted by name, then id."""
+        links = list(links)
+        names = np.array([name for name, _ in links], dtype=str)
+        food_ids = np.array([food_id for _, food_id in links], dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]]) if len(links) else np.empty(0, dtype=np.intp)
+        return cls(names[starts], np.r_[starts, len(links)], food_ids)
+
+    @classmethod
+    def load(cls):
+        """Read every link from the through table in one query."""
+        from .models import FoodItemIngredient
+
+        links = FoodItemIngredient.objects.order_by('ingredient__name', 'food_item_id')
+        return cls.from_links(links.values_list('ingredient__name', 'food_item_id'))
+
+    def postings(self, name):
+        """Sorted ids of the FoodItems containing ``name``."""
+        position = np.searchsorted(self.names, name)
+        if position == len(self.names) or self.names[position] != name:
+            return self.food_ids[:0]
+        return self.food_ids[self.offsets[position]:self.offsets[position + 1]]
+
+    def containing_any(self, names):
+        """Sorted ids of the FoodItems containing at least one of ``names``."""
+        return np.unique(np.concatenate([self.food_ids[:0]] + [self.postings(name) for name in names]))
+
+
+_index = None  # (catalog version, IngredientIndex)
+_lock = threading.Lock()
+
+
+def ingredient_index():
+    """The inverted index of the current catalog; rebuilt in this process after any catalog change."""
+    from .recommendation_cache import get_catalog_version
+
+    global _index
+    version = get_catalog_version()
+    cached = _index
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        if _index is None or _index[0] != version:
+            _index = (version, IngredientIndex.load())
+        return _index[1]
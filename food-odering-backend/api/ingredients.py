@@ -0,0 +1,33 @@
+from django.db import transaction
+
+from .models import FoodItemIngredient, Ingredient
+
+# Ingredient.name's max_length; longer names are cut
+MAX_NAME_LENGTH = 100
+
+
+def parse_ingredients(text):
+    """
+    Normalized names from a comma-separated ingredient list, in order and
+    without duplicates. Names are lowercased and runs of whitespace
+    collapsed, so "Olive  Oil" and "olive oil" are one ingredient.
+    """
+    names = (' '.join(part.split()).lower()[:MAX_NAME_LENGTH] for part in (text or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def sync_ingredients(items):
+    """
+    Replace the ingredient links of ``(food_id, ingredients)`` pairs with the
+    names parsed from their text, creating Ingredient rows as needed.
+    """
+    parsed = {food_id: parse_ingredients(text) for food_id, text in items}
+    names = {name for item_names in parsed.values() for name in item_names}
+    with transaction.atomic():
+        Ingredient.objects.bulk_create([Ingredient(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+        FoodItemIngredient.objects.filter(food_item_id__in=parsed).delete()
+        FoodItemIngredient.objects.bulk_create([
+            FoodItemIngredient(food_item_id=food_id, ingredient_id=ids[name])
+            for food_id, item_names in parsed.items() for name in item_names
+        ])
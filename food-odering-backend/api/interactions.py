@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CustomUser, FoodItem
+from .recommendation_cache import bump_counts_version, bump_user_version
+
+LIKES = FoodItem.likes.through
+DISLIKES = FoodItem.dislikes.through
+INTERACTION_STATES = ('like', 'dislike', 'none')
+
+
+def _count_of(through):
+    """Subquery counting the join-table rows of the outer FoodItem."""
+    rows = through.objects.filter(fooditem_id=OuterRef('pk')).order_by().values('fooditem_id')
+    return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+
+def recount_interactions(food_ids=None):
+    """
+    Recompute like_count / dislike_count from the join tables in one UPDATE.
+    Recounts the whole catalog when ``food_ids`` is None. Used for M2M
+    manager changes and by reconcile_interaction_counts; the API write path
+    moves the counters by deltas instead.
+    """
+    items = FoodItem.objects.all() if food_ids is None else FoodItem.objects.filter(pk__in=food_ids)
+    updated = items.update(like_count=_count_of(LIKES), dislike_count=_count_of(DISLIKES))
+    # Once committed, so no listing is tagged with the new version while it still reads the old counts
+    transaction.on_commit(bump_counts_version)
+    return updated
+
+
+def drifted_items():
+    """Ids of FoodItems whose counters disagree with the join tables."""
+    return (
+        FoodItem.objects
+        .annotate(actual_likes=_count_of(LIKES), actual_dislikes=_count_of(DISLIKES))
+        .exclude(like_count=F('actual_likes'), dislike_count=F('actual_dislikes'))
+        .values_list('id', flat=True)
+    )
+
+
+def _lock_user(user_id):
+    """
+    Lock the user's row until commit, so writes to that user's join-table
+    rows run one at a time and the rows each of them read stay current.
+    """
+    list(CustomUser.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+
+
+def _delta(added, removed):
+    """Counter change per food: +1 for ids in ``added``, -1 for ids in ``removed``."""
+    whens = [When(pk__in=ids, then=Value(step)) for ids, step in ((added, 1), (removed, -1)) if ids]
+    return Case(*whens, default=Value(0)) if whens else Value(0)
+
+
+def set_interactions(user_id, states):
+    """
+    Apply ``{food_id: 'like' | 'dislike' | 'none'}`` for one user atomically.
+
+    Likes and dislikes are mutually exclusive: each food ends up with at most
+    one row across the two join tables. One SELECT reads the rows the user
+    already has for these foods; then the batch costs one DELETE and one
+    INSERT ... ON CONFLICT DO NOTHING per join table and one counter UPDATE,
+    however many foods it touches. Statements with nothing to do are
+    skipped. Counters move by F() deltas of the rows actually added and
+    removed, so the cost does not grow with an item's popularity and
+    concurrent taps from other users are never overwritten.
+    """
+    liked = {food_id for food_id, state in states.items() if state == 'like'}
+    disliked = {food_id for food_id, state in states.items() if state == 'dislike'}
+
+    with transaction.atomic():
+        _lock_user(user_id)
+        rows = (
+            LIKES.objects.filter(customuser_id=user_id, fooditem_id__in=states)
+            .values_list('fooditem_id', Value('like', output_field=CharField()))
+            .union(
+                DISLIKES.objects.filter(customuser_id=user_id, fooditem_id__in=states)
+                .values_list('fooditem_id', Value('dislike', output_field=CharField()))
+            )
+        )
+        had_liked = {food_id for food_id, kind in rows if kind == 'like'}
+        had_disliked = {food_id for food_id, kind in rows if kind == 'dislike'}
+
+        added_likes, removed_likes = liked - had_liked, had_liked - liked
+        added_dislikes, removed_dislikes = disliked - had_disliked, had_disliked - disliked
+        if removed_likes:
+            LIKES.objects.filter(customuser_id=user_id, fooditem_id__in=removed_likes).delete()
+        if removed_dislikes:
+            DISLIKES.objects.filter(customuser_id=user_id, fooditem_id__in=removed_dislikes).delete()
+        if added_likes:
+            LIKES.objects.bulk_create(
+                [LIKES(fooditem_id=food_id, customuser_id=user_id) for food_id in added_likes], ignore_conflicts=True
+            )
+        if added_dislikes:
+            DISLIKES.objects.bulk_create(
+                [DISLIKES(fooditem_id=food_id, customuser_id=user_id) for food_id in added_dislikes],
+                ignore_conflicts=True,
+            )
+
+        changed = added_likes | removed_likes | added_dislikes | removed_dislikes
+        if changed:
+            FoodItem.objects.filter(pk__in=changed).update(
+                # Clamped like remove_interaction, for counters that have drifted low
+                like_count=Greatest(F('like_count') + _delta(added_likes, removed_likes), 0),
+                dislike_count=Greatest(F('dislike_count') + _delta(added_dislikes, removed_dislikes), 0),
+            )
+            transaction.on_commit(bump_counts_version)
+    bump_user_version(user_id)
+
+
+def remove_interaction(through, counter, food_id, user_id):
+    """Delete one like or dislike row and decrement its counter by what was removed."""
+    with transaction.atomic():
+        _lock_user(user_id)
+        deleted, _ = through.objects.filter(fooditem_id=food_id, customuser_id=user_id).delete()
+        if deleted:
+            # Clamped, so a counter that has drifted low stays at 0 until reconcile_interaction_counts
+            FoodItem.objects.filter(pk=food_id).update(**{counter: Greatest(F(counter) - deleted, 0)})
+            transaction.on_commit(bump_counts_version)
+    bump_user_version(user_id)
+    return deleted
@@ -0,0 +1,140 @@
+import numpy as np
+from scipy import sparse
+
+from .ann import ann_arrays, build_ann, load_ann
+from .artifacts import artifact_path, load_arrays, save_arrays
+from .topk import TopKScorer
+
+# Precomputed TF-IDF (or latent) rows for every FoodItem, stored next to the
+# vectorizer in the current artifact set
+ITEM_INDEX_NAME = 'item_index'
+
+
+class ItemIndex:
+    """
+    TF-IDF matrix of the catalog, one CSR row per FoodItem, or a dense
+    float32 row per FoodItem when the vectorizer projects into a latent space.
+
+    Rows are L2-normalized and ranked through ``scorer``. An index is never
+    modified in place: ``with_item`` / ``without_items`` return a new index so
+    requests that already hold a reference keep a consistent view. A loaded
+    index is memory-mapped from its artifact directory.
+
+    Large catalogs also carry an approximate nearest-neighbour index
+    (``ann``, see api/ann.py) so ``top_k`` can score a few clusters instead
+    of every row.
+    """
+
+    def __init__(self, ids, matrix, normalized=False, order=None, ann=None):
+        if not isinstance(matrix, np.ndarray):
+            matrix = sparse.csr_matrix(matrix)
+        self.scorer = TopKScorer(ids, matrix, normalized, order)
+        self.ids = self.scorer.ids
+        self.matrix = self.scorer.matrix
+        self.ann = ann
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectorizer, items):
+        """Vectorize ``(id, ingredients)`` pairs into a new index."""
+        items = list(items)
+        ids = [food_id for food_id, _ in items]
+        matrix = vectorizer.transform([ingredients or '' for _, ingredients in items])
+        return cls(ids, matrix).with_ann()
+
+    @classmethod
+    def load(cls, path=None, mmap_mode='r'):
+        data = load_arrays(path or artifact_path(ITEM_INDEX_NAME), mmap_mode)
+        if 'vectors' in data:
+            matrix = data['vectors']
+        else:
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=tuple(data['shape'])
+            )
+        return cls(data['ids'], matrix, normalized=True, order=data['order'], ann=load_ann(data))
+
+    def save(self, path=None):
+        # Rows are stored normalized with their id order so loading copies nothing
+        if sparse.issparse(self.matrix):
+            rows = dict(
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.array(self.matrix.shape),
+            )
+        else:
+            rows = dict(vectors=self.matrix)
+        save_arrays(
+            path or artifact_path(ITEM_INDEX_NAME),
+            ids=self.ids,
+            **rows,
+            order=self.scorer.order,
+            **ann_arrays(self.ann),
+        )
+
+    def matches(self, vectorizer):
+        """Check that the index was built with this vectorizer's vocabulary (or latent space)."""
+        latent = vectorizer.components is not None
+        return self.matrix.shape[1] == vectorizer.n_dimensions and sparse.issparse(self.matrix) != latent
+
+    def with_ann(self, **options):
+        """Return a copy with a freshly built ANN index (none for catalogs below ann.MIN_ROWS)."""
+        ann = build_ann(self.matrix, **options)
+        return ItemIndex(self.ids, self.matrix, normalized=True, order=self.scorer.order, ann=ann)
+
+    def top_k(self, query, k=10, exclude_ids=(), nprobe=None, excluded=None):
+        """
+        Ids of the ``k`` best rows for ``query``, skipping ``exclude_ids`` and
+        rows masked by ``excluded``. With an ANN index and a positive
+        ``nprobe`` only that many clusters are scored.
+        """
+        if self.ann is None or not nprobe:
+            return self.scorer.top_k(query, k=k, exclude_ids=exclude_ids, excluded=excluded)
+        excluded = self.scorer.exclusions(exclude_ids, excluded)
+        return [int(food_id) for food_id in self.ids[self.ann.search(self.matrix, query, k, nprobe, excluded)]]
+
+    def with_item(self, vectorizer, food_id, ingredients):
+        """Return a copy of the index with the row for ``food_id`` added or replaced."""
+        return self.with_items(vectorizer, [(food_id, ingredients)])
+
+    def with_items(self, vectorizer, items):
+        """Return a copy of the index with rows for ``(id, ingredients)`` pairs added or replaced."""
+        items = list(items)
+        if not items:
+            return self
+        new_ids = np.array([food_id for food_id, _ in items], dtype=np.int64)
+        rows = vectorizer.transform([ingredients or '' for _, ingredients in items])
+        keep = ~np.isin(self.ids, new_ids)
+        ids = np.concatenate([self.ids[keep], new_ids])
+        if sparse.issparse(self.matrix):
+            matrix = sparse.vstack([self.matrix[keep], rows], format='csr')
+        else:
+            matrix = np.vstack([self.matrix[keep], rows])
+        index = ItemIndex(ids, matrix)
+        if self.ann is not None:
+            # New rows join their closest cluster; the clusters are rebuilt by the next full training
+            index.ann = self.ann.without_rows(keep).with_rows(index.matrix, np.arange(keep.sum(), len(ids)))
+        return index
+
+    def without_items(self, food_ids):
+        """Return a copy of the index without the rows for ``food_ids``."""
+        keep = ~np.isin(self.ids, list(food_ids))
+        ann = self.ann.without_rows(keep) if self.ann is not None else None
+        return ItemIndex(self.ids[keep], self.matrix[keep], ann=ann)
+
+
+def load_item_index(path=None):
+    """Load a persisted index, or return None if it has not been built."""
+    try:
+        return ItemIndex.load(path)
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
+
+
+def build_catalog_index(vectorizer):
+    """Vectorize the whole catalog once."""
+    from .models import FoodItem
+
+    return ItemIndex.build(vectorizer, FoodItem.objects.order_by('id').values_list('id', 'ingredients'))
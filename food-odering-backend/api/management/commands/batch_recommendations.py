@@ -0,0 +1,53 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from api.batch_recommendations import batch_recommendations, jsonl, parse_shard
+from api.recommender import BATCH_MEMORY_BUDGET
+
+class Command(BaseCommand):
+    help = 'Write recommendations_ml results for every active user as JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write (default: stdout); written to a temporary file and moved into place')
+        parser.add_argument('--top-k', type=int, default=10, help='Recommendations per user')
+        parser.add_argument(
+            '--shard', default='0/1',
+            help='Only users whose id modulo n is i ("i/n"); run one process per shard to spread the work',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users fetched per database round trip')
+        parser.add_argument(
+            '--memory-budget', type=int, default=BATCH_MEMORY_BUDGET // 2**20,
+            help='MiB of scores per block of users scored together',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            shard = parse_shard(options['shard'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = batch_recommendations(
+            shard, k=options['top_k'], chunk_size=options['chunk_size'],
+            memory_budget=options['memory_budget'] * 2**20,
+        )
+        path = options['output']
+        if not path:
+            self.write(self.stdout, results)
+            return
+
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                count = self.write(file, results)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.stdout.write(f"Wrote recommendations for {count} users to {path}")
+
+    def write(self, file, results):
+        count = 0
+        for line in jsonl(results):
+            file.write(line)
+            count += 1
+        return count
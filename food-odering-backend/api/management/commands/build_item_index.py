@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.item_index import ITEM_INDEX_NAME
+from api.recommender import recommender
+
+class Command(BaseCommand):
+    help = 'Vectorize every food item and save the TF-IDF item index'
+
+    def handle(self, *args, **kwargs):
+        models = recommender.models()
+        if not models.vectorizer:
+            raise CommandError('Vectorizer not found. Please run train_model.py first.')
+
+        index = models.rebuild_item_index(force=True)
+        self.stdout.write(f"Indexed {len(index)} food items to {recommender.models().path(ITEM_INDEX_NAME)}")
@@ -1,42 +1,125 @@
 import csv
+import json
+import os
+import shutil
+from contextlib import contextmanager
 from django.core.management.base import BaseCommand
-from api.models import FoodItem, Order, CustomUser
+from api.dataset import DATASET_DIR, DatasetWriter
+from api.models import FoodItem, OrderLine
+
+INTERACTIONS_FILE = 'ml_models/recommendation_data.csv'  # user_id, food_id, interaction
+ITEMS_FILE = 'ml_models/recommendation_items.csv'  # food_id, ingredients (one row per item)
+DELTA_FILE = 'ml_models/recommendation_data_delta.csv'  # Interactions newer than the watermark
+WATERMARK_FILE = 'ml_models/export_watermark.json'  # Highest row ids already exported
 
 class Command(BaseCommand):
     help = 'Export data for recommendations'
 
-    def handle(self, *args, **kwargs):
-        file_path = 'ml_models/recommendation_data.csv'  # Save file in ml_models
-        with open(file_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['user_id', 'food_id', 'interaction', 'ingredients'])
-            for user in CustomUser.objects.all():
-                for food in user.liked_food_items.all():
-                    writer.writerow([user.id, food.id, 'like', food.ingredients])
-                for food in user.disliked_food_items.all():
-                    writer.writerow([user.id, food.id, 'dislike', food.ingredients])
-        self.stdout.write(f"Data exported successfully to {file_path}")
-
-    # def handle(self, *args, **kwargs):
-    #     with open('recommendation_data.csv', 'w', newline='') as csvfile:
-    #         writer = csv.writer(csvfile)
-    #         writer.writerow(['user_id', 'food_id', 'interaction', 'ingredients'])
-
-    #         # Export likes
-    #         for food in FoodItem.objects.all():
-    #             for user in food.likes.all():
-    #                 writer.writerow([user.id, food.id, 'like', food.ingredients])
-    #             for user in food.dislikes.all():
-    #                 writer.writerow([user.id, food.id, 'dislike', food.ingredients])
-
-    #         # Export orders
-    #         for order in Order.objects.all():
-    #             for item in order.items:
-    #                 writer.writerow([
-    #                     order.user.id,
-    #                     item['id'],
-    #                     'order',
-    #                     FoodItem.objects.get(id=item['id']).ingredients
-    #                 ])
-
-    #     self.stdout.write(self.style.SUCCESS('Data exported successfully!'))
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument(
+            '--format', choices=['npy', 'csv'], default='npy',
+            help=f'npy writes integer-coded columns to {DATASET_DIR} for memory-mapped loading; '
+                 f'csv writes {INTERACTIONS_FILE}',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help=f'Only append likes, dislikes and orders added since the last export to {DELTA_FILE}. '
+                 'Removed likes/dislikes are only picked up by a full export.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        watermark = self.read_watermark() if options['incremental'] else {}
+        file_path = DELTA_FILE if options['incremental'] else INTERACTIONS_FILE
+
+        # Ingredients go into their own table instead of being repeated per interaction
+        food_ids = set()
+        with atomic_csv(ITEMS_FILE) as writer:
+            writer.writerow(['food_id', 'ingredients'])
+            for food_id, ingredients in FoodItem.objects.values_list('id', 'ingredients').iterator(chunk_size=chunk_size):
+                food_ids.add(food_id)
+                writer.writerow([food_id, ingredients or ''])
+
+        new_watermark = dict(watermark)
+        rows = self.interactions(watermark, new_watermark, chunk_size)
+
+        if options['format'] == 'npy' and not options['incremental']:
+            file_path = DATASET_DIR
+            dataset = DatasetWriter(file_path)
+            for row in rows:
+                dataset.add(*row)
+            dataset.save()
+            count = len(dataset)
+        else:
+            # Deltas are small and appended to, so they always stay CSV
+            count = 0
+            write_header = not options['incremental'] or not os.path.exists(file_path)
+            output = appending_csv(file_path) if options['incremental'] else atomic_csv(file_path)
+            with output as writer:
+                if write_header:
+                    writer.writerow(['user_id', 'food_id', 'interaction'])
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+
+        self.write_watermark(new_watermark)
+        if not options['incremental'] and os.path.exists(DELTA_FILE):
+            os.remove(DELTA_FILE)  # A full export supersedes any pending delta
+        if options['format'] == 'csv' and not options['incremental']:
+            # train_model.py prefers the dataset directory, which is now older than the CSV
+            shutil.rmtree(DATASET_DIR, ignore_errors=True)
+        self.stdout.write(f"Data exported successfully to {file_path} ({count} interactions, {len(food_ids)} items in {ITEMS_FILE})")
+
+    def interactions(self, watermark, new_watermark, chunk_size):
+        """Yield (user_id, food_id, interaction) rows past the watermark, advancing new_watermark."""
+        # Stream the M2M through-tables directly: one query each, no per-user lookups
+        for key, through in (('like', FoodItem.likes.through), ('dislike', FoodItem.dislikes.through)):
+            interactions = (
+                through.objects.filter(id__gt=watermark.get(key, 0)).order_by('id')
+                .values_list('id', 'customuser_id', 'fooditem_id')
+            )
+            for row_id, user_id, food_id in interactions.iterator(chunk_size=chunk_size):
+                yield user_id, food_id, key
+                new_watermark[key] = row_id
+
+        # One row per order line; lines of items that left the catalog have no food item
+        lines = (
+            OrderLine.objects.filter(order_id__gt=watermark.get('order', 0), food_item__isnull=False)
+            .order_by('order_id', 'id').values_list('order_id', 'order__user_id', 'food_item_id')
+        )
+        for order_id, user_id, food_id in lines.iterator(chunk_size=chunk_size):
+            yield user_id, food_id, 'order'
+            new_watermark['order'] = order_id
+
+    def read_watermark(self):
+        try:
+            with open(WATERMARK_FILE) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def write_watermark(self, watermark):
+        with open(f'{WATERMARK_FILE}.tmp', 'w') as file:
+            json.dump(watermark, file)
+        os.replace(f'{WATERMARK_FILE}.tmp', WATERMARK_FILE)
+
+
+@contextmanager
+def atomic_csv(path):
+    """Write a CSV to a temporary file and move it into place only once it is complete."""
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, mode='w', newline='') as file:
+            yield csv.writer(file)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@contextmanager
+def appending_csv(path):
+    """Append to a CSV so deltas that have not been applied yet are never overwritten."""
+    with open(path, mode='a', newline='') as file:
+        yield csv.writer(file)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.images import generate_variants
+from api.models import FoodItem
+
+class Command(BaseCommand):
+    help = 'Write resized image variants for food items that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-check every item with an image, not only unprocessed ones')
+
+    def handle(self, *args, **options):
+        items = FoodItem.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            items = items.filter(image_hash='')
+
+        count = 0
+        for food_id in items.order_by('id').values_list('id', flat=True):
+            if generate_variants(food_id):
+                count += 1
+        self.stdout.write(f"Generated image variants for {count} food items")
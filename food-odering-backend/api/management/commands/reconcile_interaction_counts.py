@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.interactions import drifted_items, recount_interactions
+
+class Command(BaseCommand):
+    help = 'Recount like/dislike counters on food items that drifted from the join tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Items recounted per UPDATE')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted items')
+
+    def handle(self, *args, **options):
+        drifted = list(drifted_items())
+        if not options['dry_run']:
+            batch_size = options['batch_size']
+            for start in range(0, len(drifted), batch_size):
+                recount_interactions(drifted[start:start + batch_size])
+
+        action = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(f"{action} {len(drifted)} food items with drifted counters")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counts(apps, schema_editor):
+    FoodItem = apps.get_model('api', 'FoodItem')
+
+    def count_of(through):
+        rows = through.objects.filter(fooditem_id=OuterRef('pk')).order_by().values('fooditem_id')
+        return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+    FoodItem.objects.update(
+        like_count=count_of(FoodItem.likes.through),
+        dislike_count=count_of(FoodItem.dislikes.through),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_fooditem_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
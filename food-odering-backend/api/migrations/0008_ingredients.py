@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def parse_ingredients(text):
+    # Frozen copy of api.ingredients.parse_ingredients
+    names = (' '.join(part.split()).lower()[:100] for part in (text or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def populate_ingredients(apps, schema_editor):
+    FoodItem = apps.get_model('api', 'FoodItem')
+    Ingredient = apps.get_model('api', 'Ingredient')
+    FoodItemIngredient = apps.get_model('api', 'FoodItemIngredient')
+
+    items = FoodItem.objects.order_by('id').values_list('id', 'ingredients')
+    for start in range(0, items.count(), BATCH_SIZE):
+        parsed = {food_id: parse_ingredients(text) for food_id, text in items[start:start + BATCH_SIZE]}
+        names = {name for item_names in parsed.values() for name in item_names}
+        Ingredient.objects.bulk_create([Ingredient(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+        FoodItemIngredient.objects.bulk_create([
+            FoodItemIngredient(food_item_id=food_id, ingredient_id=ids[name])
+            for food_id, item_names in parsed.items() for name in item_names
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_fooditem_interaction_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FoodItemIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('food_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_links', to='api.fooditem')),
+                ('ingredient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='food_links', to='api.ingredient')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='ingredient_set',
+            field=models.ManyToManyField(blank=True, related_name='food_items', through='api.FoodItemIngredient', to='api.ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='fooditemingredient',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'food_item'), name='unique_food_item_ingredient'),
+        ),
+        migrations.RunPython(populate_ingredients, migrations.RunPython.noop),
+    ]
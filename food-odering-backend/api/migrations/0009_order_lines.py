@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def order_line(OrderLine, order_id, item, catalog):
+    """An OrderLine from one entry of an order's JSON items, or None if it cannot be read."""
+    if not isinstance(item, dict):
+        return None
+    food_id = item.get('id')
+    food_id = food_id if food_id in catalog else None
+    try:
+        quantity = max(int(item.get('quantity', 1)), 1)
+    except (TypeError, ValueError):
+        quantity = 1
+    try:
+        unit_price = Decimal(str(item['price'])).quantize(Decimal('0.01'))
+    except (KeyError, InvalidOperation):
+        unit_price = catalog.get(food_id, Decimal('0'))
+    return OrderLine(order_id=order_id, food_item_id=food_id, quantity=quantity, unit_price=unit_price)
+
+
+def populate_order_lines(apps, schema_editor):
+    FoodItem = apps.get_model('api', 'FoodItem')
+    Order = apps.get_model('api', 'Order')
+    OrderLine = apps.get_model('api', 'OrderLine')
+
+    # Ids no longer in the catalog keep their line, without a food item
+    catalog = dict(FoodItem.objects.values_list('id', 'price'))
+    orders = Order.objects.order_by('id').values_list('id', 'items')
+    lines = []
+    for order_id, items in orders.iterator(chunk_size=BATCH_SIZE):
+        lines.extend(filter(None, (order_line(OrderLine, order_id, item, catalog) for item in items or [])))
+        if len(lines) >= BATCH_SIZE:
+            OrderLine.objects.bulk_create(lines)
+            lines = []
+    OrderLine.objects.bulk_create(lines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ingredients'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('food_item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='api.fooditem')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='api.order')),
+            ],
+        ),
+        migrations.RunPython(populate_order_lines, migrations.RunPython.noop),
+    ]
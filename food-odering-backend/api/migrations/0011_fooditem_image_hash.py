@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+    ]
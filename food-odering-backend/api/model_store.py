@@ -0,0 +1,160 @@
+import logging
+import threading
+
+from django.conf import settings
+
+from .artifacts import (
+    KEEP_VERSIONS, PointerWatcher, artifact_lock, current_version, derive_version, prune_versions, publish,
+    version_path, write_manifest,
+)
+from .collaborative import COLLABORATIVE_NAME, load_collaborative_model
+from .item_index import ITEM_INDEX_NAME, build_catalog_index, load_item_index
+from .vectorizer import VECTORIZER_NAME, load_vectorizer
+
+logger = logging.getLogger(__name__)
+
+# The artifacts serving needs, taken from the flat ml_models/ layout when
+# the first edited set is derived from it
+SERVED_NAMES = (VECTORIZER_NAME, ITEM_INDEX_NAME, COLLABORATIVE_NAME)
+
+
+class ModelSet:
+    """
+    Everything loaded from one artifact set. Requests take a reference once
+    and use it throughout, so a reload never mixes the vectorizer of one
+    version with the item index of another. Every artifact is memory-mapped,
+    so worker processes share one copy of the arrays through the page cache.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.vectorizer = load_vectorizer(self.path(VECTORIZER_NAME))
+
+        # Precomputed TF-IDF rows for the catalog; built on first use if missing
+        self.item_index = load_item_index(self.path(ITEM_INDEX_NAME))
+        # Interaction matrix, id mappings and neighbour lists saved by train_model.py
+        self.collaborative = load_collaborative_model(self.path(COLLABORATIVE_NAME))
+
+    def path(self, name):
+        return version_path(self.version, name)
+
+    def get_item_index(self):
+        """Return the item index, building it if it is missing or stale."""
+        index = self.item_index
+        if index is None or not index.matches(self.vectorizer):
+            index = self.rebuild_item_index()
+        return index
+
+    def rebuild_item_index(self, force=False):
+        """
+        Vectorize the whole catalog and publish it. Unless ``force`` is set,
+        an index another worker published meanwhile is used instead.
+        """
+        index = publish_item_index(
+            lambda vectorizer, index: build_catalog_index(vectorizer) if force or index is None else index
+        )
+        if index is not None:
+            self.item_index = index
+        return index
+
+
+def publish_item_index(edit):
+    """
+    Publish the current set with its item index replaced by
+    ``edit(vectorizer, index)`` and switch this worker to it; ``index`` is
+    None when it is missing or was built with another vectorizer.
+
+    The edit starts from the set CURRENT names on disk, not from this
+    worker's copy, and runs under the artifact lock, so edits other workers
+    made meanwhile are kept. They switch to the new version through CURRENT.
+    The published set is never modified, so its manifest stays valid.
+    Returns the index, or None when there is no vectorizer.
+    """
+    with artifact_lock():
+        base = current_version()
+        vectorizer = load_vectorizer(version_path(base, VECTORIZER_NAME))
+        if vectorizer is None:
+            return None
+        loaded = load_item_index(version_path(base, ITEM_INDEX_NAME))
+        if loaded is not None and not loaded.matches(vectorizer):
+            loaded = None
+        index = edit(vectorizer, loaded)
+        if index is loaded:
+            return index
+
+        version = derive_version(base, SERVED_NAMES, replace=[ITEM_INDEX_NAME])
+        index.save(version_path(version, ITEM_INDEX_NAME))
+        write_manifest(version, mode='edit', base=base, items=len(index))
+        publish(version)
+        prune_versions(KEEP_VERSIONS)
+
+    with _lock:
+        _reload()
+    return index
+
+
+def update_items(items):
+    """Re-vectorize created or edited FoodItems, as ``(id, ingredients)`` pairs."""
+    items = list(items)
+    publish_item_index(
+        lambda vectorizer, index: build_catalog_index(vectorizer) if index is None else index.with_items(vectorizer, items)
+    )
+
+
+def remove_items(food_ids):
+    """Drop deleted FoodItems from the index."""
+    food_ids = list(food_ids)
+    publish_item_index(
+        lambda vectorizer, index: build_catalog_index(vectorizer) if index is None else index.without_items(food_ids)
+    )
+
+
+_models = None
+_lock = threading.Lock()
+_watcher = PointerWatcher(getattr(settings, 'MODEL_RELOAD_INTERVAL', 30))
+
+
+def current_models():
+    """
+    Return the loaded ModelSet, swapping in a newly published version when
+    CURRENT changes. The pointer is stat-ed at most every
+    MODEL_RELOAD_INTERVAL seconds; while one thread loads the new set the
+    others keep serving the old one.
+    """
+    models = _models
+    if models is not None and not _watcher.changed():
+        return models
+    if not _lock.acquire(blocking=models is None):
+        return models
+    try:
+        return _reload()
+    finally:
+        _lock.release()
+
+
+def served_version():
+    """
+    Version of the set this worker ranks with, part of every recommendation
+    version stamp, or None before the first set is loaded. A newly published
+    set is picked up as in current_models, so each worker's stamps move when
+    it switches, without a shared bump.
+    """
+    return current_models().version if _models is not None else None
+
+
+def _reload():
+    global _models
+    version = current_version()
+    if _models is not None and version == _models.version:
+        return _models
+
+    loaded = ModelSet(version)
+    if _models is not None:
+        if loaded.vectorizer is None:
+            logger.warning('Artifact version %s could not be loaded; still serving %s', version, _models.version)
+            return _models
+        # Rankings are stamped with the served version (see served_version), so
+        # nothing is bumped here: every worker switching would flush all caches again
+        logger.info('Switched recommendation artifacts from %s to %s', _models.version, version)
+    _models = loaded
+    return _models
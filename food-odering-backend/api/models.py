@@ -3,6 +3,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 
+class Ingredient(models.Model):
+    """One normalized ingredient name, parsed from FoodItem.ingredients (see api.ingredients)."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
 class FoodItem(models.Model):
     CATEGORY_CHOICES = [
         ('Main', 'Main'),
@@ -14,6 +21,8 @@ class FoodItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     image = models.ImageField(upload_to='food_images/', blank=True, null=True)  # Image upload field
+    # Content hash naming the resized copies of ``image``; set by api.images once they exist
+    image_hash = models.CharField(max_length=20, blank=True, default='', editable=False)
     likes = models.ManyToManyField(
         settings.AUTH_USER_MODEL, related_name='liked_food_items', blank=True
     )
@@ -21,25 +30,78 @@ class FoodItem(models.Model):
         settings.AUTH_USER_MODEL, related_name='disliked_food_items', blank=True
     )
     ingredients = models.TextField(blank=True, null=True)  # Add ingredients field
+    # Parsed from ``ingredients`` on every save, for indexed ingredient filters
+    ingredient_set = models.ManyToManyField(
+        Ingredient, through='FoodItemIngredient', related_name='food_items', blank=True
+    )
+    # Denormalized sizes of likes / dislikes, kept in sync by api.interactions
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Catalog filters: ?category= with an optional price range, or a price range alone
+            models.Index(fields=['category', 'price']),
+            models.Index(fields=['price']),
+        ]
 
     def __str__(self):
         return self.name
         
+class FoodItemIngredient(models.Model):
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='ingredient_links')
+    # The unique index leads with the ingredient, so it doubles as the ingredient -> items lookup
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='food_links', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ingredient', 'food_item'], name='unique_food_item_ingredient'),
+        ]
+
 class Order(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        default=1  # Replace with the ID of an actual user in your database
+        default=1,  # Replace with the ID of an actual user in your database
+        db_index=False,  # Covered by the (user, created_at, id) index
     )
     items = models.JSONField()
     total = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # One user's order history, by date range and in keyset pages
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+class OrderLine(models.Model):
+    """One food item of an Order, with the unit price it was sold at."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    # Kept when the item leaves the catalog, so past orders still add up
+    food_item = models.ForeignKey(FoodItem, on_delete=models.SET_NULL, null=True, related_name='order_lines')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.food_item_id} in order {self.order_id}"
+
 class CustomUser(AbstractUser):
     name = models.CharField(max_length=100, blank=True)
 
     def __str__(self):
         return self.username
+
+class VersionStamp(models.Model):
+    """
+    Durable copy of one version stamp of api/recommendation_cache.py, so a
+    stamp the cache evicts comes back with the same value.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
@@ -0,0 +1,118 @@
+import secrets
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import FoodItem, Order, OrderLine
+
+# (name, price) of one FoodItem as orders snapshot it, with the version it was read under
+PRICE_KEY = 'food_price:{food_id}'
+# Replaced once an edit of the FoodItem has committed; cached prices read under another value are ignored
+PRICE_VERSION_KEY = 'food_price_version:{food_id}'
+PRICE_TIMEOUT = 3600  # Cache for 1 hour
+# Most distinct items and units of one item accepted in an order
+MAX_ORDER_LINES = 100
+MAX_QUANTITY = 1000
+
+
+def _whole_number(value):
+    """``value`` as an int, from an integer, an integral float or a string of digits; raises ValueError otherwise."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    if not isinstance(value, (int, float, str)):
+        raise ValueError(value)
+    return int(value)  # Strings such as '2.7' raise too
+
+
+def parse_order_items(items):
+    """
+    Return ``{food_id: quantity}`` from the client's ``[{"id": 1, "quantity": 2}, ...]``.
+    Any name or price sent along is ignored; repeated ids add up. Raises
+    ValueError with the message for the client.
+    """
+    if not isinstance(items, list) or not 0 < len(items) <= MAX_ORDER_LINES:
+        raise ValueError(f'items must be a list of 1 to {MAX_ORDER_LINES} entries')
+
+    quantities = {}
+    for item in items:
+        try:
+            food_id = _whole_number(item['id'])
+            quantity = _whole_number(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError('Each item needs an id and a whole-number quantity')
+        quantities[food_id] = quantities.get(food_id, 0) + quantity
+        if not 0 < quantities[food_id] <= MAX_QUANTITY:
+            raise ValueError(f'quantity must be between 1 and {MAX_QUANTITY}')
+    return quantities
+
+
+def get_prices(food_ids):
+    """
+    ``{food_id: (name, price)}`` for the ids that exist. Served from the
+    per-item price cache, with the misses fetched in one ``in_bulk`` query.
+
+    A price is cached with the item's version as read before that query, and
+    the version only changes once an edit has committed, so a price read
+    while an edit was in flight is never served after the edit lands.
+    """
+    version_keys = {food_id: PRICE_VERSION_KEY.format(food_id=food_id) for food_id in food_ids}
+    price_keys = {food_id: PRICE_KEY.format(food_id=food_id) for food_id in food_ids}
+    cached = cache.get_many([*version_keys.values(), *price_keys.values()])
+
+    prices = {}
+    versions = {}
+    for food_id, key in version_keys.items():
+        version = cached.get(key)
+        if version is None:
+            cache.add(key, secrets.token_hex(8), timeout=None)
+            version = cache.get(key)
+        entry = cached.get(price_keys[food_id])
+        if entry is not None and entry['version'] == version:
+            prices[food_id] = entry['price']
+        else:
+            versions[food_id] = version
+
+    if versions:
+        fetched = {
+            food_id: (item.name, item.price)
+            for food_id, item in FoodItem.objects.only('name', 'price').in_bulk(list(versions)).items()
+        }
+        cache.set_many(
+            {price_keys[food_id]: {'version': versions[food_id], 'price': price} for food_id, price in fetched.items()},
+            timeout=PRICE_TIMEOUT,
+        )
+        prices.update(fetched)
+    return prices
+
+
+def forget_prices(food_ids):
+    """Invalidate cached prices once an edit or deletion of these FoodItems has committed."""
+    cache.set_many(
+        {PRICE_VERSION_KEY.format(food_id=food_id): secrets.token_hex(8) for food_id in food_ids},
+        timeout=None,
+    )
+
+
+def create_order(user, quantities, prices):
+    """
+    Write an Order and its OrderLines (one ``bulk_create``) for validated
+    ``quantities``, priced and totalled on the server from ``prices``.
+    """
+    lines = [(food_id, quantity, *prices[food_id]) for food_id, quantity in quantities.items()]
+    total = sum((price * quantity for _, quantity, _, price in lines), Decimal('0'))
+    with transaction.atomic():
+        # ``items`` keeps the snapshot order history displays
+        order = Order.objects.create(
+            user=user,
+            items=[
+                {'id': food_id, 'name': name, 'quantity': quantity, 'price': str(price)}
+                for food_id, quantity, name, price in lines
+            ],
+            total=float(total),
+        )
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, food_item_id=food_id, quantity=quantity, unit_price=price)
+            for food_id, quantity, _, price in lines
+        ])
+    return order
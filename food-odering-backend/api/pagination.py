@@ -0,0 +1,32 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FoodItemCursorPagination(CursorPagination):
+    """
+    Keyset pagination on FoodItem id.
+
+    Pages are opt-in: a request without ``?limit=`` still gets the plain list
+    the web frontend expects, while ``?limit=20`` returns ``next`` /
+    ``previous`` cursors that seek on the primary key instead of using OFFSET.
+    """
+    ordering = 'id'
+    page_size = None
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination over one user's order history, oldest first, the same
+    order as the unpaginated list.
+
+    Opt-in with ``?limit=`` like FoodItemCursorPagination. Pages seek on
+    created_at through the (user, created_at, id) index, so a page costs the
+    same however many orders the user has placed. DRF's cursor holds only a
+    created_at position plus an offset past the orders sharing it; id merely
+    keeps those orders in a stable order.
+    """
+    ordering = ('created_at', 'id')
+    page_size = None
+    page_size_query_param = 'limit'
+    max_page_size = 100
@@ -0,0 +1,160 @@
+import hashlib
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import VersionStamp
+
+# Bumped whenever the catalog changes; part of every cached result's version stamp
+CATALOG_VERSION_KEY = 'catalog_version'
+# Bumped whenever a user likes or dislikes something
+USER_VERSION_KEY = 'user_version:{user_id}'
+# Bumped whenever any like/dislike counter changes; only the catalog listing shows them
+COUNTS_VERSION_KEY = 'interaction_counts_version'
+# Ranked FoodItem ids for one user and one kind of recommendation
+RESULT_KEY = 'recommendations:{user_id}:{kind}'
+RESULT_TIMEOUT = 3600  # Cache for 1 hour
+
+
+def _new_version():
+    # Random rather than counted: two workers incrementing at once could land
+    # on the same value, and every value a stamp takes is then new
+    return secrets.randbits(63)
+
+
+def _bump(key):
+    """Give a stamp a new value, in the database first so eviction from the cache cannot lose it."""
+    version = _new_version()
+    VersionStamp.objects.update_or_create(key=key, defaults={'value': version})
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def _restore(keys):
+    """
+    Put stamps the cache no longer holds back from the database, creating the
+    ones that never existed. ``add`` never overwrites a value a concurrent
+    bump has just set.
+    """
+    VersionStamp.objects.bulk_create([VersionStamp(key=key, value=_new_version()) for key in keys], ignore_conflicts=True)
+    for key, value in VersionStamp.objects.filter(key__in=keys).values_list('key', 'value'):
+        cache.add(key, value, timeout=None)
+    return cache.get_many(keys)
+
+
+def _get(keys):
+    """
+    The current value of every version key, in one cache round trip when
+    they are all cached. Only a stamp missing from the cache costs a query.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        versions.update(_restore(missing))
+    return tuple(versions[key] for key in keys)
+
+
+def _served_version():
+    from .recommender import recommender
+
+    return recommender.served_version()
+
+
+def get_versions(user_id):
+    """Return the (catalog, user) version stamp results for this user are valid for."""
+    return _get([CATALOG_VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)])
+
+
+def get_catalog_version():
+    """Return the current catalog version stamp."""
+    return _get([CATALOG_VERSION_KEY])[0]
+
+
+def etag(*parts):
+    """Weak ETag over version stamps and request parameters."""
+    return 'W/"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def recommendations_etag(kind, user_id):
+    """ETag of one user's ``kind`` recommendations, which change with the same versions as the cached ids."""
+    return etag('recommendations', kind, user_id, _served_version(), *get_versions(user_id))
+
+
+def catalog_etag(user_id, params):
+    """ETag of the catalog listing as ``user_id`` sees it with the query ``params`` (a list of pairs)."""
+    keys = [CATALOG_VERSION_KEY, COUNTS_VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)]
+    return etag('catalog', user_id, sorted(params), *_get(keys))
+
+
+def bump_catalog_version():
+    """Invalidate every user's cached recommendations after a catalog change."""
+    return _bump(CATALOG_VERSION_KEY)
+
+
+def bump_user_version(user_id):
+    """Invalidate one user's cached recommendations after they rated something."""
+    return _bump(USER_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_counts_version():
+    """Invalidate every user's catalog listing after like/dislike counters changed."""
+    return _bump(COUNTS_VERSION_KEY)
+
+
+def cached_recommendations(kind, user_id, compute):
+    """
+    Return the ranked id list for ``user_id``, computing it only on a miss.
+
+    Results are stored with the version stamp from ``get_versions`` plus
+    the artifact version this worker serves, and ignored once any of them
+    has moved on, so repeat requests skip the ranking entirely until the
+    user, the catalog or the published models change.
+    """
+    version = (_served_version(), *get_versions(user_id))
+    key = RESULT_KEY.format(user_id=user_id, kind=kind)
+    entry = cache.get(key)
+    if entry and entry['version'] == version:
+        return entry['ids']
+
+    ranked_ids = list(compute())
+    cache.set(key, {'version': version, 'ids': ranked_ids}, timeout=RESULT_TIMEOUT)
+    return ranked_ids
+
+
+async def _aget(keys):
+    """Async counterpart of ``_get``."""
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        versions.update(await sync_to_async(_restore)(missing))
+    return tuple(versions[key] for key in keys)
+
+
+async def aget_versions(user_id):
+    """Async counterpart of ``get_versions``."""
+    return await _aget([CATALOG_VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)])
+
+
+async def arecommendations_etag(kind, user_id):
+    """Async counterpart of ``recommendations_etag``."""
+    return etag('recommendations', kind, user_id, _served_version(), *await aget_versions(user_id))
+
+
+async def acatalog_etag(user_id, params):
+    """Async counterpart of ``catalog_etag``."""
+    keys = [CATALOG_VERSION_KEY, COUNTS_VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)]
+    return etag('catalog', user_id, sorted(params), *await _aget(keys))
+
+
+async def acached_recommendations(kind, user_id, compute):
+    """Async counterpart of ``cached_recommendations``; ``compute`` is a coroutine function."""
+    version = (_served_version(), *await aget_versions(user_id))
+    key = RESULT_KEY.format(user_id=user_id, kind=kind)
+    entry = await cache.aget(key)
+    if entry and entry['version'] == version:
+        return entry['ids']
+
+    ranked_ids = list(await compute())
+    await cache.aset(key, {'version': version, 'ids': ranked_ids}, timeout=RESULT_TIMEOUT)
+    return ranked_ids
@@ -0,0 +1,156 @@
+# Weight of the collaborative score in hybrid recommendations (0 = content only)
+HYBRID_ALPHA = 0.5
+# Default memory for one block of users scored together in batch mode
+BATCH_MEMORY_BUDGET = 256 * 2**20
+
+
+class Recommender:
+    """
+    Ranking service over the published artifact set; views pass in ids and
+    ingredients and get ranked FoodItem ids back.
+
+    numpy, scipy and the artifacts are imported and loaded on first use
+    rather than when Django starts, so manage.py commands and worker boot
+    skip them. Set RECOMMENDER_WARMUP to load them in AppConfig.ready
+    instead, ahead of the first request.
+    """
+
+    def models(self):
+        from .model_store import current_models
+
+        return current_models()
+
+    def served_version(self):
+        """The artifact version rankings come from, without loading a set (None until one is)."""
+        from .model_store import served_version
+
+        return served_version()
+
+    def update_items(self, items):
+        """Re-vectorize created or edited FoodItems, as ``(id, ingredients)`` pairs, for every worker."""
+        from .model_store import update_items
+
+        update_items(items)
+
+    def remove_items(self, food_ids):
+        """Drop deleted FoodItems from the item index of every worker."""
+        from .model_store import remove_items
+
+        remove_items(food_ids)
+
+    def nprobe(self):
+        """Clusters an ANN item search scores (RECOMMENDER_ANN_NPROBE); 0 scans the whole catalog."""
+        from django.conf import settings
+
+        return getattr(settings, 'RECOMMENDER_ANN_NPROBE', 0)
+
+    def warm(self):
+        """Import the ML stack and map the current artifact set now."""
+        return self.models()
+
+    def ingredient_mask(self, index, exclude_ingredients):
+        """
+        Mask over the rows of ``index`` for items containing any of
+        ``exclude_ingredients``, from the ingredient inverted index, so they
+        are dropped before the top-k instead of filtered out of it; None when
+        nothing is excluded.
+        """
+        if not exclude_ingredients:
+            return None
+        from .ingredient_index import ingredient_index
+
+        return index.scorer.exclusion_mask(ingredient_index().containing_any(exclude_ingredients))
+
+    def score_ingredients(self, models, index, liked_ingredients):
+        """Score every indexed item against the liked ingredients, or None if there are none."""
+        if not liked_ingredients.strip():
+            return None
+
+        user_vector = models.vectorizer.transform([liked_ingredients])
+        return index.scorer.score(user_vector)
+
+    def rank_ingredients(self, liked_ingredients, exclude_ids=(), k=10, exclude_ingredients=()):
+        """Rank the catalog by TF-IDF similarity to the liked ingredients."""
+        models = self.models()
+        if not models.vectorizer or not liked_ingredients.strip():
+            return []
+
+        index = models.get_item_index()
+        user_vector = models.vectorizer.transform([liked_ingredients])
+        excluded = self.ingredient_mask(index, exclude_ingredients)
+        return index.top_k(user_vector, k=k, exclude_ids=exclude_ids, nprobe=self.nprobe(), excluded=excluded)
+
+    def rank_profile(self, liked_ids, exclude_ids=(), k=10, exclude_ingredients=()):
+        """Rank the catalog by mean TF-IDF similarity to the liked items."""
+        if not liked_ids:
+            return []
+        models = self.models()
+        if not models.vectorizer:
+            return []
+
+        # Average the precomputed rows of liked items into one query vector; the
+        # rows are unit length, so its scores are the mean cosine similarity
+        index = models.get_item_index()
+        profile = index.scorer.profile(liked_ids)
+        if profile is None:
+            return []
+        excluded = self.ingredient_mask(index, exclude_ingredients)
+        return index.top_k(profile, k=k, exclude_ids=exclude_ids, nprobe=self.nprobe(), excluded=excluded)
+
+    def rank_profiles(self, users, k=10, memory_budget=BATCH_MEMORY_BUDGET):
+        """
+        Batch ``rank_profile`` for ``(user_id, liked_ids, exclude_ids)`` triples.
+
+        Yields ``(user_id, ranked ids)`` in input order. Users are scored in
+        blocks, one users x items product per block, with the block size
+        chosen so the dense scores stay within ``memory_budget`` bytes.
+        """
+        from itertools import islice
+
+        models = self.models()
+        users = iter(users)
+        if not models.vectorizer:
+            for user_id, _, _ in users:
+                yield user_id, []
+            return
+
+        scorer = models.get_item_index().scorer
+        block_size = scorer.batch_size(memory_budget)
+        while block := list(islice(users, block_size)):
+            user_ids, liked_ids, exclude_ids = zip(*block)
+            yield from zip(user_ids, scorer.top_k_profiles(liked_ids, exclude_ids, k=k))
+
+    def rank_collaborative(self, user_id, exclude_ids=(), k=10, exclude_ingredients=()):
+        """Rank what the user's nearest neighbours liked."""
+        collaborative = self.models().collaborative
+        if not collaborative:
+            return []
+        if exclude_ingredients:
+            from .ingredient_index import ingredient_index
+
+            exclude_ids = set(exclude_ids).union(ingredient_index().containing_any(exclude_ingredients).tolist())
+        return collaborative.recommend(user_id, k=k, exclude_ids=exclude_ids)
+
+    def rank_hybrid(self, user_id, liked_ingredients, exclude_ids=(), alpha=HYBRID_ALPHA, k=10, exclude_ingredients=()):
+        """Rank ids by blending the collaborative score with the ingredient score."""
+        from .collaborative import blend_scores
+        from .topk import top_k
+
+        models = self.models()
+        if not models.vectorizer:
+            return []
+
+        collaborative = models.collaborative
+        index = models.get_item_index()
+        content_scores = self.score_ingredients(models, index, liked_ingredients)
+        cf_scores = collaborative.scores(user_id) if collaborative else None
+        if content_scores is None and cf_scores is None:
+            return []
+
+        cf_ids = collaborative.food_ids if collaborative else None
+        blended = blend_scores(index.ids, content_scores, cf_ids, cf_scores, alpha)
+        excluded = index.scorer.exclusions(exclude_ids, self.ingredient_mask(index, exclude_ingredients))
+        return [int(index.ids[i]) for i in top_k(blended, k, excluded)]
+
+
+recommender = Recommender()
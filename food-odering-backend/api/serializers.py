@@ -1,14 +1,60 @@
 from rest_framework import serializers
+from .images import variant_urls
 from .models import FoodItem, Order
 
-class FoodItemSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Keep only the fields named in the ``fields`` context entry (from ?fields=a,b).
+    Serializes every field when it is missing.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+class ImageVariantsMixin:
+    """``image_variants``: {"webp": {"160": url, ...}, "jpg": {...}}, empty until they are generated."""
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_hash)
+
+class FoodItemSerializer(ImageVariantsMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    # The like/dislike user-id lists grow with the user base, so they are not embedded
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FoodItem
+        fields = ['id', 'name', 'price', 'category', 'image', 'image_variants', 'ingredients']
+
+class FoodItemListSerializer(ImageVariantsMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Catalog row with like/dislike counts and the requesting user's own rating.
+    Expects ``liked_ids`` / ``disliked_ids`` sets in the context.
+    """
+    likes = serializers.IntegerField(source='like_count', read_only=True)
+    dislikes = serializers.IntegerField(source='dislike_count', read_only=True)
+    user_interaction = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = FoodItem
-        fields = '__all__'
+        fields = [
+            'id', 'name', 'price', 'category', 'image', 'image_variants', 'ingredients',
+            'likes', 'dislikes', 'user_interaction',
+        ]
+
+    def get_user_interaction(self, obj):
+        if obj.id in self.context['liked_ids']:
+            return "like"
+        if obj.id in self.context['disliked_ids']:
+            return "dislike"
+        return None
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = serializers.JSONField()  # Ensure items is a JSON field
-    total = serializers.FloatField()
+    # Written by api.orders from the catalog; clients only send ids and quantities
+    items = serializers.JSONField(read_only=True)
+    total = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Order
@@ -0,0 +1,124 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import AUTH_FIELDS, forget_tokens
+from .models import CustomUser, FoodItem
+from .images import schedule_variants
+from .ingredients import sync_ingredients
+from .interactions import recount_interactions
+from .orders import forget_prices
+from .recommendation_cache import bump_catalog_version, bump_user_version
+
+
+@receiver(m2m_changed, sender=FoodItem.likes.through)
+@receiver(m2m_changed, sender=FoodItem.dislikes.through)
+def interactions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recount like/dislike counters and drop cached recommendations for every
+    user whose likes or dislikes changed through the M2M managers.
+    """
+    if action == 'pre_clear' and reverse:
+        # user.liked_food_items.clear() does not say which foods it touched
+        instance._cleared_food_ids = list(
+            sender.objects.filter(customuser_id=instance.pk).values_list('fooditem_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    # Versions move once the change commits, so no result is stamped with them while still reading the old rows
+    if reverse:
+        # user.liked_food_items.add(...): the instance is the user
+        food_ids = pk_set if pk_set is not None else instance.__dict__.pop('_cleared_food_ids', [])
+        transaction.on_commit(partial(bump_user_version, instance.pk))
+    else:
+        food_ids = [instance.pk]
+        if pk_set is None:
+            # food.likes.clear() does not say which users were affected
+            transaction.on_commit(bump_catalog_version)
+        else:
+            for user_id in pk_set:
+                transaction.on_commit(partial(bump_user_version, user_id))
+
+    recount_interactions(food_ids)
+
+
+@receiver(post_save, sender=FoodItem)
+def ingredients_changed(sender, instance, raw, update_fields, **kwargs):
+    """
+    Re-parse the ingredient links of a saved FoodItem. Connected before
+    catalog_changed, so the links are in place by the time the version moves.
+    """
+    if raw or (update_fields is not None and 'ingredients' not in update_fields):
+        return
+    sync_ingredients([(instance.pk, instance.ingredients)])
+
+
+@receiver(post_init, sender=FoodItem)
+def image_loaded(sender, instance, **kwargs):
+    """Remember the stored image name, so image_changed can tell whether a save replaced it."""
+    name = instance.__dict__.get('image')
+    if 'image' in instance.__dict__ and (name is None or isinstance(name, str)):
+        instance._loaded_image = name or ''
+    else:
+        # Deferred, or a new upload still held as a file object
+        instance._loaded_image = None
+
+
+@receiver(post_save, sender=FoodItem)
+def image_changed(sender, instance, created, raw, update_fields, **kwargs):
+    """Resize a new or replaced image in the background; saves that keep the image schedule nothing."""
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    name = instance.image.name or ''
+    replaced = bool(name) if created else name != getattr(instance, '_loaded_image', None)
+    instance._loaded_image = name
+    if replaced:
+        schedule_variants(instance.pk)
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def catalog_changed(sender, instance, **kwargs):
+    """Any FoodItem write can change every user's ranking, and its price."""
+    # Only after the commit: a worker reading the old row in between would cache it under the new version
+    transaction.on_commit(partial(forget_prices, [instance.pk]))
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Logging out deletes the token; stop accepting its cached lookup."""
+    forget_tokens([instance.key])
+
+
+def _auth_values(user):
+    # Deferred fields are left out rather than loaded
+    return {name: user.__dict__[name] for name in AUTH_FIELDS if name in user.__dict__}
+
+
+@receiver(post_init, sender=CustomUser)
+def user_loaded(sender, instance, **kwargs):
+    """Remember the auth fields as loaded, so user_changed can tell whether a save changed them."""
+    instance._auth_values = _auth_values(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    """
+    Cached token lookups hold the user's auth fields, so drop them when one
+    changes (e.g. the user is deactivated). Other saves, like the last_login
+    update of every login, keep them.
+    """
+    if update_fields is not None and not set(update_fields) & set(AUTH_FIELDS):
+        return
+    values = _auth_values(instance)
+    unchanged = values == instance._auth_values and len(values) == len(AUTH_FIELDS)
+    instance._auth_values = values
+    if created or unchanged:
+        return
+    forget_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
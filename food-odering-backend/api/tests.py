@@ -1,3 +1,1033 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import json
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from PIL import Image
+from scipy import sparse
+
+from . import artifacts, model_store
+from .ann import IVFIndex, recall_at_k
+from .async_views import coalesced
+from .authentication import TOKEN_KEY, CachedTokenAuthentication, LocalTokenCache
+from .checks import shared_cache_check
+from .dataset import DISLIKE, LIKE, ORDER, build_interaction_matrix, exists as dataset_exists
+from .collaborative import COLLABORATIVE_NAME, CollaborativeModel, blend_scores
+from .images import generate_variants, variant_name
+from .ingredient_index import ingredient_index
+from .interactions import set_interactions
+from .models import CustomUser, FoodItem, Order, OrderLine
+from .orders import PRICE_KEY, PRICE_VERSION_KEY, create_order, get_prices
+from .recommendation_cache import CATALOG_VERSION_KEY, COUNTS_VERSION_KEY, USER_VERSION_KEY
+from .recommender import recommender
+from .item_index import ITEM_INDEX_NAME, ItemIndex
+from .serializers import FoodItemSerializer
+from .topk import TopKScorer, l2_normalize_rows
+from .vectorizer import VECTORIZER_NAME, IngredientVectorizer
+from .views import rank_food_ml
+
+
+@contextmanager
+def temporary_artifacts():
+    """Point the artifact store at an empty temporary ml_models/ and forget the loaded set."""
+    with tempfile.TemporaryDirectory() as directory, mock.patch.multiple(
+        artifacts,
+        MODEL_DIR=directory,
+        VERSIONS_DIR=os.path.join(directory, 'versions'),
+        CURRENT_FILE=os.path.join(directory, 'CURRENT'),
+        LOCK_FILE=os.path.join(directory, '.lock'),
+    ):
+        with mock.patch.multiple(model_store, _models=None, _watcher=artifacts.PointerWatcher(0)):
+            yield directory
+
+
+@contextmanager
+def working_directory():
+    """Run in an empty temporary directory with the ml_models/ folder export_data and train_model.py write to."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.mkdir(os.path.join(directory, 'ml_models'))
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+
+def publish_artifacts(items, collaborative=None):
+    """
+    Publish a vectorizer and item index fitted on ``(id, ingredients)``
+    pairs, plus an optional CollaborativeModel; returns the version.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    items = list(items)
+    tfidf = TfidfVectorizer(stop_words='english').fit([ingredients or '' for _, ingredients in items])
+    vectorizer = IngredientVectorizer.from_sklearn(tfidf)
+    version = artifacts.create_version()
+    vectorizer.save(artifacts.version_path(version, VECTORIZER_NAME))
+    ItemIndex.build(vectorizer, items).save(artifacts.version_path(version, ITEM_INDEX_NAME))
+    if collaborative is not None:
+        collaborative.save(artifacts.version_path(version, COLLABORATIVE_NAME))
+    artifacts.write_manifest(version)
+    artifacts.publish(version)
+    return version
+
+
+class CacheTestCase(TestCase):
+    """
+    TestCase that also starts from an empty cache. The test cache lives in
+    process memory, which the per-test rollback does not reset, and ids are
+    reused from one test to the next.
+    """
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        cache.clear()
+
+
+class FoodItemListQueryCountTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.other = CustomUser.objects.create_user(username='bob', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def add_items(self, count):
+        for i in range(count):
+            item = FoodItem.objects.create(name=f'Item {i}', price=10, category='Main', ingredients='rice')
+            item.likes.add(self.other)
+            if i % 2:
+                item.likes.add(self.user)
+            else:
+                item.dislikes.add(self.user)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/food-items/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.add_items(2)
+        self.count_queries()  # The first request also caches the token lookup
+        small_catalog = self.count_queries()
+
+        self.add_items(30)
+        with self.assertNumQueries(small_catalog):
+            response = self.client.get('/api/food-items/')
+        self.assertEqual(len(response.json()), 32)
+
+    def test_response_shape(self):
+        self.add_items(2)
+        disliked, liked = sorted(self.client.get('/api/food-items/').json(), key=lambda item: item['id'])
+
+        self.assertEqual(
+            list(liked),
+            ['id', 'name', 'price', 'category', 'image', 'image_variants', 'ingredients', 'likes', 'dislikes',
+             'user_interaction'],
+        )
+        self.assertEqual((liked['likes'], liked['dislikes'], liked['user_interaction']), (2, 0, 'like'))
+        self.assertEqual((disliked['likes'], disliked['dislikes'], disliked['user_interaction']), (1, 1, 'dislike'))
+
+
+class FoodItemListParameterTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        for i in range(5):
+            FoodItem.objects.create(name=f'Main {i}', price=10 + i, category='Main')
+        FoodItem.objects.create(name='Juice', price=3, category='Beverage')
+
+    def test_cursor_pagination_walks_the_catalog_by_id(self):
+        page = self.client.get('/api/food-items/', {'limit': 4}).json()
+        self.assertEqual(len(page['results']), 4)
+
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 2)
+        self.assertIsNone(rest['next'])
+        ids = [item['id'] for item in page['results'] + rest['results']]
+        self.assertEqual(ids, sorted(FoodItem.objects.values_list('id', flat=True)))
+
+    def test_sparse_fieldset(self):
+        items = self.client.get('/api/food-items/', {'fields': 'id,name'}).json()
+        self.assertEqual({tuple(item) for item in items}, {('id', 'name')})
+
+    def test_category_and_price_filters(self):
+        items = self.client.get('/api/food-items/', {'category': 'Main', 'min_price': 11, 'max_price': 13}).json()
+        self.assertEqual(sorted(item['name'] for item in items), ['Main 1', 'Main 2', 'Main 3'])
+
+        response = self.client.get('/api/food-items/', {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncEndpointTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for i in range(5):
+            item = FoodItem.objects.create(name=f'Main {i}', price=10 + i, category='Main', ingredients='rice')
+            if i % 2:
+                item.likes.add(self.user)
+
+    def test_catalog_matches_sync_endpoint(self):
+        for params in ({}, {'fields': 'id,user_interaction'}, {'category': 'Main', 'min_price': 11}):
+            self.assertEqual(
+                self.client.get('/api/async/food-items/', params).json(),
+                self.client.get('/api/food-items/', params).json(),
+            )
+
+        page = self.client.get('/api/async/food-items/', {'limit': 3}).json()
+        self.assertIn('/api/async/food-items/', page['next'])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(page['results']) + len(rest['results']), 5)
+
+    def test_requires_token(self):
+        self.assertEqual(APIClient().get('/api/async/recommendations_ml/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(self.client.get('/api/async/food-items/').status_code, 401)
+
+    async def test_concurrent_callers_share_one_computation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [1, 2]
+
+        results = await asyncio.gather(*[coalesced(('ml', 1), compute) for _ in range(5)])
+        self.assertEqual(results, [[1, 2]] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class InteractionCounterTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.item = FoodItem.objects.create(name='Rice', price=5, category='Main')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def counts(self):
+        self.item.refresh_from_db()
+        return self.item.like_count, self.item.dislike_count
+
+    def test_like_endpoint_is_counted_once(self):
+        url = f'/api/food/{self.item.id}/like/'
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(self.counts(), (1, 0))
+
+        self.client.delete(url)
+        self.client.delete(url)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_removal_never_takes_a_drifted_counter_below_zero(self):
+        self.item.likes.add(self.user)
+        FoodItem.objects.filter(pk=self.item.pk).update(like_count=0)
+        self.assertEqual(self.client.delete(f'/api/food/{self.item.id}/like/').status_code, 200)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_m2m_manager_changes_are_counted(self):
+        self.user.disliked_food_items.add(self.item)
+        self.assertEqual(self.counts(), (0, 1))
+
+        self.user.disliked_food_items.clear()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_reconcile_command_repairs_drift(self):
+        self.item.likes.add(self.user)
+        FoodItem.objects.filter(pk=self.item.pk).update(like_count=42)
+
+        call_command('reconcile_interaction_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0))
+
+
+class InteractionWritePathTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.items = [FoodItem.objects.create(name=f'Item {i}', price=5, category='Main') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def state_of(self, item):
+        liked = self.user.liked_food_items.filter(pk=item.pk).exists()
+        disliked = self.user.disliked_food_items.filter(pk=item.pk).exists()
+        return liked, disliked
+
+    def test_like_and_dislike_are_mutually_exclusive(self):
+        item = self.items[0]
+        self.client.post(f'/api/food/{item.id}/like/')
+        self.client.post(f'/api/food/{item.id}/dislike/')
+        self.assertEqual(self.state_of(item), (False, True))
+
+        response = self.client.put(f'/api/food/{item.id}/interaction/', {'interaction': 'like'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.state_of(item), (True, False))
+        item.refresh_from_db()
+        self.assertEqual((item.like_count, item.dislike_count), (1, 0))
+
+    def test_interaction_is_idempotent(self):
+        url = f'/api/food/{self.items[0].id}/interaction/'
+        for _ in range(2):
+            self.client.put(url, {'interaction': 'dislike'}, format='json')
+        self.assertEqual(self.user.disliked_food_items.count(), 1)
+
+        self.client.put(url, {'interaction': 'none'}, format='json')
+        self.assertEqual(self.state_of(self.items[0]), (False, False))
+
+    def test_batch_statement_count_does_not_grow_with_batch(self):
+        taps = [{'food_id': item.id, 'interaction': 'like'} for item in self.items]
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/food/interactions/', taps[:1], format='json')
+
+        taps[1]['interaction'] = 'dislike'
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/food/interactions/', taps + [taps[0]], format='json')
+        self.assertEqual(response.json(), {'updated': 3})
+        self.assertLessEqual(len(large), len(small) + 2)  # The dislike DELETE and INSERT
+        self.assertEqual(
+            [self.state_of(item) for item in self.items], [(True, False), (False, True), (True, False)]
+        )
+
+    def test_counters_move_by_deltas_without_recounting(self):
+        item = self.items[0]
+        url = f'/api/food/{item.id}/interaction/'
+        FoodItem.objects.filter(pk=item.pk).update(like_count=10, dislike_count=5)  # Other users' ratings
+
+        expected = {'like': (11, 5), 'dislike': (10, 6), 'none': (10, 5)}
+        for interaction, counts in expected.items():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.put(url, {'interaction': interaction}, format='json')
+            self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+            item.refresh_from_db()
+            self.assertEqual((item.like_count, item.dislike_count), counts)
+
+        # Counters that have drifted low stay at zero
+        FoodItem.objects.filter(pk=item.pk).update(like_count=0, dislike_count=0)
+        self.client.put(url, {'interaction': 'like'}, format='json')
+        FoodItem.objects.filter(pk=item.pk).update(like_count=0)
+        self.assertEqual(self.client.put(url, {'interaction': 'none'}, format='json').status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual((item.like_count, item.dislike_count), (0, 0))
+
+    def test_batch_rejects_unknown_items(self):
+        response = self.client.post('/api/food/interactions/', [{'food_id': 999, 'interaction': 'like'}], format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['food_ids'], [999])
+
+
+class InteractionMatrixTests(CacheTestCase):
+    def test_likes_and_orders_beat_dislikes(self):
+        user_ids = [5, 5, 5, 7, 7, 7, 9]
+        food_ids = [30, 30, 10, 10, 10, 30, 20]
+        interactions = [DISLIKE, LIKE, ORDER, DISLIKE, ORDER, DISLIKE, 0]
+        matrix, users, foods = build_interaction_matrix(user_ids, food_ids, interactions)
+
+        np.testing.assert_array_equal(users, [5, 7, 9])
+        np.testing.assert_array_equal(foods, [10, 20, 30])
+        np.testing.assert_array_equal(matrix.toarray(), [[1, 0, 1], [1, 0, -1], [0, 0, 0]])
+        # One stored cell per rated pair; the unknown code is not stored at all
+        self.assertEqual(matrix.nnz, 4)
+
+
+class ExportDataTests(CacheTestCase):
+    def test_training_reads_the_latest_export(self):
+        import train_model
+
+        user = CustomUser.objects.create_user(username='alice', password='secret')
+        items = [FoodItem.objects.create(name=f'Item {i}', price=5, category='Main', ingredients='rice') for i in range(3)]
+        user.liked_food_items.add(items[0])
+        with working_directory():
+            call_command('export_data', stdout=StringIO())
+            self.assertTrue(dataset_exists())
+
+            user.liked_food_items.add(items[1])
+            user.disliked_food_items.add(items[2])
+            call_command('export_data', format='csv', stdout=StringIO())
+            self.assertFalse(dataset_exists())
+            with redirect_stdout(StringIO()):
+                data, _ = train_model.load_data(train_model.data_file_path)
+            self.assertEqual(len(data['user_id']), 3)
+
+
+class IncrementalTrainingTests(CacheTestCase):
+    def snapshot(self):
+        """The published interaction matrix and neighbour lists, keyed by ids."""
+        model = CollaborativeModel.load(artifacts.artifact_path(COLLABORATIVE_NAME))
+        matrix = model.interactions.tocoo()
+        cells = {
+            (int(model.user_ids[row]), int(model.food_ids[col])): float(value)
+            for row, col, value in zip(matrix.row, matrix.col, matrix.data)
+        }
+        neighbours = {
+            int(user_id): {
+                (int(model.user_ids[row]), round(float(similarity), 5))
+                for row, similarity in zip(model.neighbours[i], model.similarities[i]) if row >= 0
+            }
+            for i, user_id in enumerate(model.user_ids)
+        }
+        return cells, neighbours
+
+    def test_incremental_run_matches_full_run(self):
+        import train_model
+
+        foods = [
+            FoodItem.objects.create(name=f'Item {i}', price=5, category='Main', ingredients=f'rice spice{i}')
+            for i in range(5)
+        ]
+        users = [CustomUser.objects.create_user(username=f'user{i}', password='secret') for i in range(4)]
+        users[0].liked_food_items.add(foods[0], foods[1])
+        create_order(users[1], {foods[3].id: 1}, get_prices([foods[3].id]))
+        users[1].liked_food_items.add(foods[0])
+        users[2].liked_food_items.add(foods[1], foods[3])
+        users[3].disliked_food_items.add(foods[2])
+
+        with working_directory(), temporary_artifacts(), redirect_stdout(StringIO()):
+            call_command('export_data')
+            train_model.train_full()
+
+            set_interactions(users[1].id, {foods[3].id: 'dislike'})  # Ordered, so it stays 1
+            set_interactions(users[0].id, {foods[1].id: 'dislike', foods[4].id: 'like'})
+            call_command('export_data', incremental=True)
+            # Replaces a like that is already in the pending delta
+            set_interactions(users[0].id, {foods[4].id: 'dislike'})
+            newcomer = CustomUser.objects.create_user(username='newcomer', password='secret')
+            set_interactions(newcomer.id, {foods[0].id: 'like', foods[3].id: 'like'})
+            call_command('export_data', incremental=True)
+            train_model.train_incremental()
+            incremental = self.snapshot()
+
+            call_command('export_data')
+            train_model.train_full()
+            full = self.snapshot()
+
+        self.assertEqual(incremental[0], full[0])
+        self.assertEqual(full[0][(users[1].id, foods[3].id)], 1)
+        self.assertEqual(full[0][(users[0].id, foods[4].id)], -1)
+        self.assertEqual(incremental[1], full[1])
+
+    def test_full_run_does_not_publish_over_an_edit_made_meanwhile(self):
+        import train_model
+
+        foods = [FoodItem.objects.create(name=f'Item {i}', price=5, category='Main', ingredients='rice') for i in range(2)]
+        CustomUser.objects.create_user(username='alice', password='secret').liked_food_items.add(*foods)
+        save_model = train_model.save_model
+
+        def edit_then_save(version, *args):
+            # An admin edit publishes while the run is still writing its set
+            self.edited = publish_artifacts([(food.id, 'rice') for food in foods])
+            artifacts.prune_versions(1)
+            save_model(version, *args)
+
+        with working_directory(), temporary_artifacts(), redirect_stdout(StringIO()):
+            call_command('export_data')
+            with mock.patch.object(train_model, 'save_model', edit_then_save), self.assertRaises(SystemExit):
+                train_model.train_full()
+            self.assertEqual(artifacts.current_version(), self.edited)
+            self.assertEqual(os.listdir(artifacts.VERSIONS_DIR), [self.edited])
+
+
+class CollaborativeFilteringTests(CacheTestCase):
+    # Users 10 and 11 liked foods 1 and 3, user 12 disliked 1 and liked 2
+    matrix = sparse.csr_matrix(np.array([[1, 0, 1, 0], [1, 0, 1, 1], [-1, 1, 0, 0]], dtype=np.float32))
+
+    def model(self, user_ids=(10, 11, 12)):
+        import train_model
+
+        with redirect_stdout(StringIO()):
+            fitted = train_model.train_model(self.matrix)
+            neighbours, similarities = train_model.compute_neighbours(fitted, self.matrix, n_neighbours=4)
+        return CollaborativeModel(user_ids, [1, 2, 3, 4], self.matrix, neighbours, similarities)
+
+    def test_neighbour_lists_skip_the_user_and_pad(self):
+        model = self.model()
+        for row in range(3):
+            found = model.neighbours[row][model.neighbours[row] >= 0]
+            self.assertNotIn(row, found)
+            self.assertEqual(sorted(found), sorted({0, 1, 2} - {row}))
+        self.assertEqual(model.neighbours[0, 0], 1)  # The most similar user comes first
+        np.testing.assert_array_equal(model.neighbours[:, 2:], -1)
+        np.testing.assert_array_equal(model.similarities[:, 2:], 0)
+
+    def test_recommend_skips_rated_and_unseen(self):
+        model = self.model()
+        # User 10 rated 1 and 3; of the rest only 4 scores above zero
+        self.assertEqual(model.recommend(10), [4])
+        self.assertEqual(model.recommend(10, exclude_ids={4}), [])
+        self.assertEqual(model.recommend(99), [])
+        self.assertIsNone(model.scores(99))
+
+    def test_alpha_weights_the_collaborative_score(self):
+        content = np.array([1.0, 0.5, 0.0], dtype=np.float32)
+        cf = np.array([4.0, 2.0], dtype=np.float32)
+        ids, cf_ids = np.array([1, 2, 3]), np.array([3, 2])
+        np.testing.assert_allclose(blend_scores(ids, content, cf_ids, cf, 0), [1, 0.5, 0])
+        np.testing.assert_allclose(blend_scores(ids, content, cf_ids, cf, 1), [0, 0.5, 1])
+        np.testing.assert_allclose(blend_scores(ids, content, cf_ids, cf, 0.25), [0.75, 0.5, 0.25])
+        np.testing.assert_allclose(blend_scores(ids, None, cf_ids, cf, 0.5), [0, 0.25, 0.5])
+
+    def test_hybrid_endpoint(self):
+        ingredients = ['rice beans', 'rice chili', 'bread butter', 'bread jam']
+        items = [FoodItem.objects.create(name=text, price=5, category='Main', ingredients=text) for text in ingredients]
+        users = [CustomUser.objects.create_user(username=f'user{i}', password='secret') for i in range(3)]
+        users[0].liked_food_items.add(items[0], items[2])
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        with temporary_artifacts():
+            collaborative = self.model([user.id for user in users])
+            collaborative.food_ids = np.array([item.id for item in items])
+            publish_artifacts([(item.id, item.ingredients) for item in items], collaborative)
+
+            # Content only: the other rice and bread dishes; CF only: what user 1 liked on top
+            content = client.get('/api/recommendations_cf/', {'mode': 'hybrid', 'alpha': 0}).json()
+            self.assertEqual({item['id'] for item in content}, {items[1].id, items[3].id})
+            cf = client.get('/api/recommendations_cf/', {'mode': 'hybrid', 'alpha': 1}).json()
+            self.assertEqual(cf[0]['id'], items[3].id)
+            self.assertEqual([item['id'] for item in client.get('/api/recommendations_cf/').json()], [items[3].id])
+            self.assertEqual(client.get('/api/recommendations_cf/', {'mode': 'hybrid', 'alpha': 2}).status_code, 400)
+
+
+class BatchRecommendationTests(CacheTestCase):
+    def test_blocks_match_per_user_ranking(self):
+        rng = np.random.default_rng(0)
+        scorer = TopKScorer(np.arange(1, 201), sparse.random(200, 50, density=0.1, format='csr', random_state=0))
+        liked = [set(rng.choice(200, 4, replace=False) + 1) for _ in range(20)] + [set(), {999}]
+        excluded = [ids | {1, 2} for ids in liked]
+
+        batch = scorer.top_k_profiles(liked, excluded, k=5)
+        single = []
+        for ids, exclude_ids in zip(liked, excluded):
+            profile = scorer.profile(ids)
+            single.append([] if profile is None else scorer.top_k(profile, k=5, exclude_ids=exclude_ids))
+        self.assertEqual(batch, single)
+        self.assertEqual(batch[-2:], [[], []])
+
+    def test_endpoint_is_admin_only_and_matches_command(self):
+        # Every item shares salt, with no two scoring alike: tied scores may come back in either order
+        ingredients = [
+            'rice beans salt', 'rice chili salt pepper', 'bread butter salt', 'bread jam salt garlic onion',
+            'rice bread salt oil',
+        ]
+        items = [FoodItem.objects.create(name=text, price=5, category='Main', ingredients=text) for text in ingredients]
+        users = [CustomUser.objects.create_user(username=f'user{i}', password='secret') for i in range(3)]
+        for user, item in zip(users, items):
+            user.liked_food_items.add(item)
+        admin = CustomUser.objects.create_superuser(username='admin', password='secret')
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        self.assertEqual(client.get('/api/recommendations_ml/batch/').status_code, 403)
+
+        with temporary_artifacts():
+            publish_artifacts([(item.id, item.ingredients) for item in items])
+            client.force_authenticate(admin)
+            response = client.get('/api/recommendations_ml/batch/')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+            expected = [{'user_id': user.id, 'food_ids': rank_food_ml(user)} for user in CustomUser.objects.order_by('id')]
+            self.assertEqual(lines, expected)
+            # The rice dishes first for the user who liked rice and beans; no likes, no recommendations
+            self.assertEqual(set(expected[0]['food_ids'][:2]), {items[1].id, items[4].id})
+            self.assertEqual(expected[-1], {'user_id': admin.id, 'food_ids': []})
+
+            output = StringIO()
+            call_command('batch_recommendations', shard='1/2', stdout=output)
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()],
+                         [line for line in expected if line['user_id'] % 2 == 1])
+
+
+class ApproximateNearestNeighbourTests(CacheTestCase):
+    def setUp(self):
+        self.matrix = l2_normalize_rows(sparse.random(400, 60, density=0.1, format='csr', random_state=0))
+        self.index = IVFIndex.build(self.matrix, n_lists=8)
+
+    def test_probing_every_list_is_exact(self):
+        self.assertEqual(recall_at_k(self.index, self.matrix, range(0, 400, 10), nprobe=8), 1.0)
+
+        neighbours, similarities = self.index.search_rows(self.matrix, rows=[0, 5], k=3, nprobe=8)
+        scores = (self.matrix[[0, 5]] @ self.matrix.T).toarray()
+        scores[[0, 1], [0, 5]] = -np.inf
+        np.testing.assert_allclose(similarities, -np.sort(-scores, axis=1)[:, :3], rtol=1e-5)
+
+    def test_item_index_keeps_ann_in_step(self):
+        vectorizer = IngredientVectorizer(np.array([f'term{i:02d}' for i in range(60)]), np.ones(60))
+        index = ItemIndex(np.arange(1, 401), self.matrix, ann=self.index).without_items([1, 2, 3])
+        index = index.with_items(vectorizer, [(1000, 'term01 term02'), (1001, 'term03')])
+        self.assertEqual(len(index.ann), len(index))
+        self.assertEqual(index.top_k(self.matrix[10], k=5, nprobe=8), index.top_k(self.matrix[10], k=5))
+
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            loaded = ItemIndex.load(directory)
+            np.testing.assert_array_equal(loaded.ann.assignments, index.ann.assignments)
+            self.assertEqual(loaded.top_k(self.matrix[10], k=5, nprobe=2), index.top_k(self.matrix[10], k=5, nprobe=2))
+
+
+class ItemIndexEditTests(CacheTestCase):
+    def test_edits_from_workers_with_stale_sets_are_all_kept(self):
+        with temporary_artifacts():
+            first = publish_artifacts([(1, 'rice beans'), (2, 'bread butter')])
+            stale = recommender.models()
+            recommender.update_items([(3, 'rice chili')])
+
+            # Another worker still serving the first set, which never had item 3
+            model_store._models = stale
+            recommender.update_items([(4, 'bread jam')])
+            recommender.remove_items([2])
+
+            current = artifacts.current_version()
+            self.assertEqual(recommender.models().version, current)
+            self.assertEqual(sorted(recommender.models().get_item_index().ids.tolist()), [1, 3, 4])
+            # Published sets are never modified, so their manifests still hold
+            for version in (first, current):
+                artifacts.publish(version)
+            self.assertEqual(sorted(ItemIndex.load(artifacts.version_path(first, ITEM_INDEX_NAME)).ids.tolist()), [1, 2])
+
+    def test_admin_edits_publish_once_committed(self):
+        from django.contrib.admin.sites import site
+
+        food_admin = site._registry[FoodItem]
+        with temporary_artifacts():
+            first = publish_artifacts([(1, 'rice beans')])
+            item = FoodItem(name='Chili', price=5, category='Main', ingredients='rice chili')
+            with self.captureOnCommitCallbacks() as callbacks:
+                food_admin.save_model(None, item, None, change=False)
+            self.assertEqual(artifacts.current_version(), first)
+
+            for callback in callbacks:
+                callback()
+            self.assertNotEqual(artifacts.current_version(), first)
+            self.assertIn(item.id, recommender.models().get_item_index().ids.tolist())
+
+
+class ArtifactPublishingTests(CacheTestCase):
+    def test_running_process_switches_to_a_published_version(self):
+        with temporary_artifacts():
+            first = publish_artifacts([(1, 'rice beans'), (2, 'bread butter')])
+            self.assertEqual(recommender.models().version, first)
+
+            second = publish_artifacts([(1, 'rice beans'), (2, 'bread butter'), (3, 'rice chili')])
+            models = recommender.models()
+            self.assertEqual(models.version, second)
+            self.assertEqual(sorted(models.get_item_index().ids.tolist()), [1, 2, 3])
+
+            watcher = artifacts.PointerWatcher(3600)
+            artifacts.publish(first)
+            self.assertTrue(watcher.changed())
+            artifacts.publish(second)
+            self.assertFalse(watcher.changed())  # Not checked again until the interval is over
+
+    def test_incomplete_sets_are_not_served(self):
+        with temporary_artifacts():
+            first = publish_artifacts([(1, 'rice beans'), (2, 'bread butter')])
+            recommender.models()
+
+            incomplete = artifacts.derive_version(first, ())
+            artifacts.write_manifest(incomplete)
+            os.remove(artifacts.version_path(incomplete, f'{ITEM_INDEX_NAME}/ids.npy'))
+            with self.assertRaises(ValueError):
+                artifacts.publish(incomplete)
+            self.assertEqual(artifacts.current_version(), first)
+
+            # A set that passes its manifest but cannot be loaded keeps the old one in service
+            empty = artifacts.create_version()
+            artifacts.write_manifest(empty)
+            artifacts.publish(empty)
+            with self.assertLogs('api.model_store', 'WARNING'):
+                self.assertEqual(recommender.models().version, first)
+
+    def test_pruning_keeps_sets_still_being_written(self):
+        with temporary_artifacts():
+            writing = artifacts.create_version()
+            published = [publish_artifacts([(1, 'rice beans')]) for _ in range(2)]
+            artifacts.prune_versions(1)
+            self.assertEqual(sorted(os.listdir(artifacts.VERSIONS_DIR)), sorted([writing, published[-1]]))
+
+
+class LatentVectorizerTests(CacheTestCase):
+    def test_svd_rows_match_sklearn_and_round_trip(self):
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.preprocessing import normalize
+
+        documents = ['rice beans chili', 'rice curry coconut', 'bread butter jam', 'bread cheese tomato', 'chili tomato beans']
+        tfidf = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf.fit_transform(documents)
+        svd = TruncatedSVD(n_components=3, random_state=0).fit(tfidf_matrix)
+        vectorizer = IngredientVectorizer.from_sklearn(tfidf, svd)
+
+        rows = vectorizer.transform(documents)
+        self.assertEqual(rows.shape, (5, vectorizer.n_dimensions))
+        np.testing.assert_allclose(rows, normalize(svd.transform(tfidf_matrix)), atol=1e-5)
+
+        index = ItemIndex.build(vectorizer, enumerate(documents, start=1)).with_item(vectorizer, 6, 'rice chili')
+        with tempfile.TemporaryDirectory() as directory:
+            vectorizer.save(f'{directory}/vectorizer')
+            index.save(f'{directory}/item_index')
+            loaded_vectorizer = IngredientVectorizer.load(f'{directory}/vectorizer')
+            loaded = ItemIndex.load(f'{directory}/item_index')
+            self.assertTrue(loaded.matches(loaded_vectorizer))
+            query = loaded_vectorizer.transform(['beans'])
+            self.assertEqual(loaded.top_k(query, k=3), index.top_k(vectorizer.transform(['beans']), k=3))
+
+
+class IngredientFilterTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.token = Token.objects.create(user=self.user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.curry = FoodItem.objects.create(name='Curry', price=9, category='Main', ingredients='Chickpeas, Coconut  Milk, garlic')
+        self.salad = FoodItem.objects.create(name='Salad', price=6, category='Salad', ingredients='lettuce, tomatoes, garlic')
+        self.stew = FoodItem.objects.create(name='Stew', price=8, category='Main', ingredients='chickpeas, tomatoes')
+
+    def ids(self, url='/api/food-items/', **params):
+        response = self.client.get(url, params, HTTP_AUTHORIZATION=f'Token {self.token}')
+        return [item['id'] for item in response.json()]
+
+    def test_catalog_filters_follow_the_ingredient_text(self):
+        self.assertEqual(
+            list(self.curry.ingredient_set.order_by('name').values_list('name', flat=True)),
+            ['chickpeas', 'coconut milk', 'garlic'],
+        )
+        self.assertEqual(self.ids(ingredients='Chickpeas'), [self.curry.id, self.stew.id])
+        self.assertEqual(self.ids(ingredients='chickpeas,tomatoes'), [self.stew.id])
+        self.assertEqual(self.ids(exclude_ingredients='garlic'), [self.stew.id])
+
+        self.curry.ingredients = 'chickpeas, rice'
+        self.curry.save()
+        self.assertEqual(self.ids(ingredients='chickpeas', exclude_ingredients='garlic'), [self.curry.id, self.stew.id])
+        self.assertEqual(self.ids('/api/async/food-items/', exclude_ingredients='garlic,rice'), [self.stew.id])
+
+    def test_excluded_ingredients_are_masked_before_top_k(self):
+        self.assertEqual(ingredient_index().containing_any(['garlic', 'lettuce']).tolist(), [self.curry.id, self.salad.id])
+        self.salad.ingredients = 'lettuce, tomatoes'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salad.save()
+        self.assertEqual(ingredient_index().containing_any(['garlic']).tolist(), [self.curry.id])
+
+        terms = np.array(['chickpeas', 'coconut', 'garlic', 'lettuce', 'milk', 'tomatoes'])
+        vectorizer = IngredientVectorizer(terms, np.ones(len(terms)))
+        index = ItemIndex.build(vectorizer, FoodItem.objects.values_list('id', 'ingredients'))
+        excluded = index.scorer.exclusion_mask(ingredient_index().containing_any(['garlic']))
+        query = vectorizer.transform(['garlic chickpeas'])
+        self.assertEqual(index.top_k(query, k=2, excluded=excluded), [self.stew.id, self.salad.id])
+
+
+class CachedTokenAuthenticationTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.token = Token.objects.create(user=self.user).key
+        self.authentication = CachedTokenAuthentication()
+
+    def test_steady_state_needs_no_query(self):
+        user, token = self.authentication.authenticate_credentials(self.token)
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.authentication.authenticate_credentials(self.token)
+        self.assertEqual((cached_user, cached_token), (user, token))
+        self.assertIsNot(cached_user, user)
+
+    def test_logout_and_deactivation_invalidate(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(client.post('/api/logout/').status_code, 200)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token)
+
+        key = Token.objects.create(user=self.user).key
+        self.authentication.authenticate_credentials(key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User inactive or deleted.'):
+            self.authentication.authenticate_credentials(key)
+        self.assertEqual(self.client.get('/api/async/food-items/', HTTP_AUTHORIZATION=f'Token {key}').status_code, 401)
+
+    def test_saves_that_keep_the_auth_fields_keep_the_cached_lookup(self):
+        self.authentication.authenticate_credentials(self.token)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.last_login = user.date_joined
+        user.save(update_fields=['last_login'])
+        user.email = 'alice@example.com'
+        user.save()
+        self.assertIsNotNone(cache.get(TOKEN_KEY.format(key=self.token)))
+
+        user.set_password('another secret')
+        user.save()
+        self.assertIsNone(cache.get(TOKEN_KEY.format(key=self.token)))
+
+    def test_logout_reaches_other_workers_through_the_shared_cache(self):
+        self.authentication.authenticate_credentials(self.token)
+        entry = cache.get(TOKEN_KEY.format(key=self.token))
+        self.assertNotIn('password', entry[0])
+
+        # A worker with an empty local LRU authenticates from the shared entry
+        with mock.patch('api.authentication._local', LocalTokenCache(1024, 5)):
+            with CaptureQueriesContext(connection) as queries:
+                user, _ = self.authentication.authenticate_credentials(self.token)
+            self.assertEqual(len(queries), 0)
+            self.assertEqual(user.username, 'alice')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(client.post('/api/logout/').status_code, 200)
+        self.assertIsNone(cache.get(TOKEN_KEY.format(key=self.token)))
+        with mock.patch('api.authentication._local', LocalTokenCache(1024, 5)):
+            with self.assertRaises(AuthenticationFailed):
+                self.authentication.authenticate_credentials(self.token)
+
+
+class OrderWritePathTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice = FoodItem.objects.create(name='Rice', price='6.50', category='Main')
+        self.tea = FoodItem.objects.create(name='Tea', price='2.00', category='Beverage')
+
+    def test_total_and_lines_come_from_the_catalog(self):
+        items = [
+            {'id': self.rice.id, 'name': 'Rice', 'quantity': 2, 'price': '0.01'},
+            {'id': self.tea.id, 'quantity': 1},
+            {'id': self.rice.id, 'quantity': 1},
+        ]
+        response = self.client.post('/api/user/orders/', {'items': items, 'total': 0.01}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total'], 21.5)
+        self.assertEqual(response.json()['items'][0], {'id': self.rice.id, 'name': 'Rice', 'quantity': 3, 'price': '6.50'})
+        self.assertEqual(
+            list(OrderLine.objects.order_by('id').values_list('food_item_id', 'quantity', 'unit_price')),
+            [(self.rice.id, 3, Decimal('6.50')), (self.tea.id, 1, Decimal('2.00'))],
+        )
+
+        # Prices are cached per item and dropped once an edit of the item commits
+        self.tea.price = '3.00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/', {'items': items}, format='json')
+        self.assertEqual(response.json()['total'], 22.5)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertIn(f'IN ({self.tea.id})', selects[0])
+
+    def test_price_read_during_an_edit_is_not_served_after_it_commits(self):
+        self.assertEqual(get_prices([self.tea.id])[self.tea.id], ('Tea', Decimal('2.00')))
+        self.tea.price = '3.00'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.tea.save()
+        # Another worker read the row before the edit committed, and cached it under the current version
+        version = cache.get(PRICE_VERSION_KEY.format(food_id=self.tea.id))
+        cache.set(PRICE_KEY.format(food_id=self.tea.id), {'version': version, 'price': ('Tea', Decimal('2.00'))})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_prices([self.tea.id])[self.tea.id], ('Tea', Decimal('3.00')))
+
+    def test_every_id_is_validated(self):
+        response = self.client.post('/api/orders/', {'items': [{'id': self.rice.id}, {'id': 999}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['food_ids'], [999])
+        response = self.client.post('/api/orders/', {'items': [{'id': self.rice.id, 'quantity': 0}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderLine.objects.exists())
+
+    def test_quantities_must_be_whole_numbers(self):
+        for quantity in (2.7, True, '2.7', [2]):
+            response = self.client.post('/api/orders/', {'items': [{'id': self.rice.id, 'quantity': quantity}]}, format='json')
+            self.assertEqual(response.status_code, 400, quantity)
+        self.assertFalse(OrderLine.objects.exists())
+
+        for quantity in (2, 2.0, '2'):
+            response = self.client.post('/api/orders/', {'items': [{'id': self.rice.id, 'quantity': quantity}]}, format='json')
+            self.assertEqual(response.json()['items'][0]['quantity'], 2)
+
+
+class OrderHistoryTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day in range(1, 6):
+            order = Order.objects.create(user=self.user, items=[], total=day)
+            Order.objects.filter(pk=order.pk).update(created_at=f'2026-01-0{day}T12:00:00Z')
+
+    def test_keyset_pages_oldest_first_within_a_date_range(self):
+        self.assertEqual([order['total'] for order in self.client.get('/api/user/orders/').json()], [1, 2, 3, 4, 5])
+
+        page = self.client.get('/api/user/orders/', {'limit': 2, 'since': '2026-01-02'}).json()
+        self.assertEqual([order['total'] for order in page['results']], [2, 3])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([order['total'] for order in rest['results']], [4, 5])
+        self.assertIsNone(rest['next'])
+
+        totals = self.client.get('/api/user/orders/', {'since': '2026-01-02', 'until': '2026-01-04T00:00:00Z'}).json()
+        self.assertEqual([order['total'] for order in totals], [2, 3])
+        self.assertEqual(self.client.get('/api/user/orders/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_pages_cover_orders_placed_at_the_same_moment_once(self):
+        for total in (6, 7, 8):
+            order = Order.objects.create(user=self.user, items=[], total=total)
+            Order.objects.filter(pk=order.pk).update(created_at='2026-01-05T12:00:00Z')
+        totals = []
+        url, params = '/api/user/orders/', {'limit': 2}
+        while url:
+            page = self.client.get(url, params).json()
+            totals += [order['total'] for order in page['results']]
+            url, params = page['next'], None
+        self.assertEqual(totals, [1, 2, 3, 4, 5, 6, 7, 8])
+
+    def test_admin_list_query_count_does_not_grow(self):
+        admin = CustomUser.objects.create_superuser(username='admin', password='secret')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/admin/api/order/').status_code, 200)
+
+        other = CustomUser.objects.create_user(username='bob', password='secret')
+        for _ in range(10):
+            Order.objects.create(user=other, items=[], total=1)
+        with self.assertNumQueries(len(queries)):
+            self.client.get('/admin/api/order/')
+
+
+class ImageVariantTests(CacheTestCase):
+    def test_variants_are_named_by_content_and_exposed_once_written(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, 'JPEG')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with self.captureOnCommitCallbacks() as callbacks:
+                item = FoodItem.objects.create(
+                    name='Soup', price=5, category='Main', image=SimpleUploadedFile('soup.jpg', buffer.getvalue())
+                )
+            self.assertEqual(len(callbacks), 3)  # Resizing is handed to the thread pool after commit, and the versions move then
+            self.assertEqual(FoodItemSerializer(item).data['image_variants'], {})
+
+            image_hash = generate_variants(item.id)
+            item.refresh_from_db()
+            self.assertEqual(item.image_hash, image_hash)
+            urls = FoodItemSerializer(item).data['image_variants']
+            self.assertEqual(urls['webp']['160'], f'/media/{variant_name(image_hash, 160, "webp")}')
+            with Image.open(os.path.join(media, variant_name(image_hash, 160, 'jpg'))) as small:
+                self.assertEqual(small.size, (160, 80))
+            with Image.open(os.path.join(media, variant_name(image_hash, 960, 'webp'))) as large:
+                self.assertEqual(large.size, (960, 480))
+
+    def test_only_a_replaced_image_is_processed_and_its_old_variants_deleted(self):
+        def upload(color):
+            buffer = io.BytesIO()
+            Image.new('RGB', (400, 200), color).save(buffer, 'JPEG')
+            return SimpleUploadedFile(f'{color}.jpg', buffer.getvalue())
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with mock.patch('api.signals.schedule_variants') as schedule:
+                item = FoodItem.objects.create(name='Soup', price=5, category='Main', image=upload('red'))
+                old_hash = generate_variants(item.id)
+
+                item = FoodItem.objects.get(pk=item.pk)
+                item.price = 6
+                item.save()
+                schedule.assert_called_once_with(item.pk)  # Only by the create
+
+                item.image = upload('blue')
+                item.save()
+                self.assertEqual(schedule.call_count, 2)
+
+            new_hash = generate_variants(item.id)
+            self.assertNotEqual(new_hash, old_hash)
+            self.assertTrue(os.path.exists(os.path.join(media, variant_name(new_hash, 160, 'jpg'))))
+            self.assertFalse(os.path.exists(os.path.join(media, variant_name(old_hash, 160, 'jpg'))))
+
+
+class ConditionalRequestTests(CacheTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.items = [
+            FoodItem.objects.create(name=f'Main {i}', price=10 + i, category='Main', ingredients='rice') for i in range(3)
+        ]
+
+    def test_unchanged_responses_are_answered_with_304_without_queries(self):
+        for url in ('/api/food-items/', '/api/recommendations_ml/', '/api/async/food-items/',
+                    '/api/async/recommendations_cf/'):
+            response = self.client.get(url, {'category': 'Main'})
+            tag = response['ETag']
+            self.assertTrue(tag.startswith('W/"'))
+            self.assertIn('Authorization', response['Vary'])
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'category': 'Main'}, HTTP_IF_NONE_MATCH=tag)
+            self.assertEqual(len(queries), 0)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], tag)
+
+        # Other parameters are another resource
+        for url in ('/api/food-items/', '/api/recommendations_ml/'):
+            tag = self.client.get(url)['ETag']
+            response = self.client.get(url, {'exclude_ingredients': 'rice'}, HTTP_IF_NONE_MATCH=tag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_tags_change_with_the_catalog_and_counters(self):
+        catalog = self.client.get('/api/food-items/')['ETag']
+        recommendations = self.client.get('/api/recommendations_ml/')['ETag']
+
+        # Another user's like changes the counts in the listing, not this user's recommendations
+        other = APIClient()
+        other.force_authenticate(CustomUser.objects.create_user(username='bob', password='secret'))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.post(f'/api/food/{self.items[0].id}/like/')
+        self.assertEqual(self.client.get('/api/food-items/', HTTP_IF_NONE_MATCH=catalog).status_code, 200)
+        self.assertEqual(self.client.get('/api/recommendations_ml/', HTTP_IF_NONE_MATCH=recommendations).status_code, 304)
+
+        self.items[1].price = 99
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[1].save()
+        self.assertEqual(self.client.get('/api/recommendations_ml/', HTTP_IF_NONE_MATCH=recommendations).status_code, 200)
+
+    def test_version_bumped_by_another_worker_changes_the_tags(self):
+        tag = self.client.get('/api/food-items/')['ETag']
+        # A connection of its own, as another worker process would have
+        other_worker = caches.create_connection('default')
+        other_worker.set(CATALOG_VERSION_KEY, other_worker.get(CATALOG_VERSION_KEY) + 1, timeout=None)
+        self.assertEqual(self.client.get('/api/food-items/', HTTP_IF_NONE_MATCH=tag).status_code, 200)
+
+    def test_evicted_versions_come_back_unchanged(self):
+        tags = {url: self.client.get(url)['ETag'] for url in ('/api/food-items/', '/api/recommendations_ml/')}
+        cache.delete_many([CATALOG_VERSION_KEY, COUNTS_VERSION_KEY, USER_VERSION_KEY.format(user_id=self.user.id)])
+        for url, tag in tags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=tag).status_code, 304)
+
+    def test_a_published_set_changes_only_the_recommendation_tags(self):
+        self.user.liked_food_items.add(self.items[0])  # Ranked by the models, not by popularity
+        with temporary_artifacts():
+            publish_artifacts([(item.id, 'rice') for item in self.items])
+            catalog = self.client.get('/api/food-items/')['ETag']
+            recommendations = self.client.get('/api/recommendations_ml/')['ETag']
+            catalog_version = cache.get(CATALOG_VERSION_KEY)
+
+            publish_artifacts([(item.id, 'rice beans') for item in self.items])
+            self.assertEqual(self.client.get('/api/food-items/', HTTP_IF_NONE_MATCH=catalog).status_code, 304)
+            self.assertEqual(self.client.get('/api/recommendations_ml/', HTTP_IF_NONE_MATCH=recommendations).status_code, 200)
+            self.assertEqual(cache.get(CATALOG_VERSION_KEY), catalog_version)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        self.assertEqual([error.id for error in shared_cache_check(None)], ['api.E001'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(shared_cache_check(None), [])
@@ -0,0 +1,174 @@
+import numpy as np
+from scipy import sparse
+
+
+def l2_normalize_rows(matrix):
+    """Scale every row to unit length so a dot product is a cosine similarity."""
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def to_dense(matrix):
+    """``matrix`` as an ndarray, whether it is sparse or already dense."""
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+
+def top_k(scores, k, excluded=None):
+    """
+    Return the indices of the ``k`` highest scores, best first.
+
+    ``excluded`` is an optional boolean mask of positions that must never be
+    returned. Only the ``k`` winners are sorted; the rest of the array is
+    partitioned with ``np.argpartition`` in linear time.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    candidates = len(scores)
+    if excluded is not None:
+        scores = np.where(excluded, -np.inf, scores)
+        candidates -= int(np.count_nonzero(excluded))
+
+    k = min(k, candidates)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(scores):
+        winners = np.argpartition(-scores, k - 1)[:k]
+    else:
+        winners = np.arange(len(scores))
+    return winners[np.argsort(-scores[winners], kind='stable')][:k]
+
+
+def top_k_rows(scores, k):
+    """
+    Row-wise ``top_k`` over a 2-D block of scores, one index array per row.
+
+    Excluded positions are marked with -inf and never returned, so a row
+    with fewer than ``k`` candidates yields a shorter array.
+    """
+    rows, columns = scores.shape
+    k = min(k, columns)
+    if k <= 0:
+        return [np.empty(0, dtype=np.intp) for _ in range(rows)]
+
+    if k < columns:
+        winners = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        winners = np.broadcast_to(np.arange(columns), (rows, columns))
+    best = np.take_along_axis(scores, winners, axis=1)
+    order = np.argsort(-best, axis=1, kind='stable')
+    winners = np.take_along_axis(winners, order, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    return [row[np.isfinite(row_scores)] for row, row_scores in zip(winners, best)]
+
+
+class TopKScorer:
+    """
+    Rank catalog rows against a query vector.
+
+    Item rows (sparse TF-IDF or dense latent vectors) are L2-normalized once
+    up front, so scoring a query is a single matrix-vector product and
+    cosine similarity needs no per-request norms.
+    Pass ``normalized=True`` (and the persisted ``order`` of ``ids``) when
+    loading rows that were saved normalized, so memory-mapped arrays are
+    used as they are instead of being copied.
+    """
+
+    def __init__(self, ids, matrix, normalized=False, order=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        if normalized:
+            self.matrix = (
+                sparse.csr_matrix(matrix, dtype=np.float32) if sparse.issparse(matrix)
+                else np.asarray(matrix, dtype=np.float32)
+            )
+        else:
+            self.matrix = l2_normalize_rows(matrix)
+        self.order = np.argsort(self.ids, kind='stable') if order is None else order
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, food_ids):
+        """Map FoodItem ids to row positions, ignoring ids that are not indexed."""
+        food_ids = np.asarray(food_ids if isinstance(food_ids, np.ndarray) else list(food_ids), dtype=np.int64)
+        if not len(food_ids) or not len(self.ids):
+            return np.empty(0, dtype=np.intp)
+        found = np.searchsorted(self.ids, food_ids, sorter=self.order)
+        found = np.minimum(found, len(self.ids) - 1)
+        rows = self.order[found]
+        return rows[self.ids[rows] == food_ids]
+
+    def exclusion_mask(self, food_ids):
+        """Boolean mask that is True on the rows of ``food_ids``."""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[self.positions(food_ids)] = True
+        return mask
+
+    def exclusions(self, exclude_ids=(), excluded=None):
+        """The mask of ``exclude_ids`` combined with an ``excluded`` mask; None when nothing is excluded."""
+        if not len(exclude_ids):
+            return excluded
+        mask = self.exclusion_mask(exclude_ids)
+        return mask if excluded is None else mask | excluded
+
+    def profile(self, food_ids):
+        """Average the rows of ``food_ids`` into a single dense query vector."""
+        rows = self.positions(food_ids)
+        if not len(rows):
+            return None
+        return np.asarray(self.matrix[rows].mean(axis=0), dtype=np.float32).ravel()
+
+    def score(self, query):
+        """Cosine-style scores of every row against ``query`` in one product."""
+        if sparse.issparse(query):
+            query = query.toarray()
+        query = np.asarray(query, dtype=np.float32).ravel()
+        return np.asarray(self.matrix @ query).ravel()
+
+    def top_k(self, query, k=10, exclude_ids=(), excluded=None):
+        """Return the ids of the ``k`` best rows for ``query``, skipping ``exclude_ids`` and rows masked by ``excluded``."""
+        winners = top_k(self.score(query), k, self.exclusions(exclude_ids, excluded))
+        return [int(food_id) for food_id in self.ids[winners]]
+
+    def batch_size(self, memory_budget):
+        """How many users ``top_k_profiles`` can score at once within ``memory_budget`` bytes."""
+        # Per user and item: the sparse product (value + index), its dense
+        # float32 copy, the negated copy argpartition sorts and its int64 indices
+        per_user = 24 * len(self.ids)
+        return max(1, int(memory_budget // max(per_user, 1)))
+
+    def selector(self, food_id_lists, weight_rows=False):
+        """Sparse users x rows matrix marking the rows of each list of ids (scaled to mean if ``weight_rows``)."""
+        positions = [self.positions(food_ids) for food_ids in food_id_lists]
+        counts = np.array([len(rows) for rows in positions], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        columns = np.concatenate(positions) if positions else np.empty(0, dtype=np.intp)
+        weights = np.repeat(1.0 / np.maximum(counts, 1), counts) if weight_rows else np.ones(len(columns))
+        return sparse.csr_matrix(
+            (weights.astype(np.float32), columns, indptr), shape=(len(food_id_lists), len(self.ids))
+        )
+
+    def top_k_profiles(self, liked_id_lists, exclude_id_lists, k=10):
+        """
+        Batch ``profile`` + ``top_k`` for many users in one matrix-matrix product.
+
+        Returns one id list per user; users with no indexed liked items get [].
+        """
+        liked = self.selector(liked_id_lists, weight_rows=True)
+        # With sparse TF-IDF rows both factors are sparse, and a sparse product beats densifying the profiles
+        scores = to_dense((liked @ self.matrix) @ self.matrix.T).astype(np.float32, copy=False)
+
+        excluded = self.selector(exclude_id_lists).tocoo()
+        scores[excluded.row, excluded.col] = -np.inf
+        has_profile = np.diff(liked.indptr) > 0
+        return [
+            [int(food_id) for food_id in self.ids[winners]] if has_profile[user] else []
+            for user, winners in enumerate(top_k_rows(scores, k))
+        ]
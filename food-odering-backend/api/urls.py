@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import FoodItemList, OrderList, LoginView, LogoutView, RegisterView, UserOrdersView, like_food_item, dislike_food_item, recommend_food_ml
+from . import async_views
+from .views import FoodItemList, OrderList, LoginView, LogoutView, RegisterView, UserOrdersView, like_food_item, dislike_food_item, set_food_interaction, batch_food_interactions, recommend_food_ml, recommend_food_cf, batch_recommend_food_ml
 
 
 urlpatterns = [
@@ -11,5 +12,13 @@ urlpatterns = [
     path('user/orders/', UserOrdersView.as_view(), name='user-orders'),
     path('food/<int:food_id>/like/', like_food_item, name='like_food_item'),
     path('food/<int:food_id>/dislike/', dislike_food_item, name='dislike_food_item'),
+    path('food/<int:food_id>/interaction/', set_food_interaction, name='set_food_interaction'),
+    path('food/interactions/', batch_food_interactions, name='batch_food_interactions'),
     path('recommendations_ml/', recommend_food_ml, name='recommendations_ml'),
+    path('recommendations_cf/', recommend_food_cf, name='recommendations_cf'),
+    path('recommendations_ml/batch/', batch_recommend_food_ml, name='batch_recommendations_ml'),
+    # Async variants for ASGI workers (see api/async_views.py)
+    path('async/food-items/', async_views.food_items, name='async-food-items'),
+    path('async/recommendations_ml/', async_views.recommend_food_ml, name='async_recommendations_ml'),
+    path('async/recommendations_cf/', async_views.recommend_food_cf, name='async_recommendations_cf'),
 ]
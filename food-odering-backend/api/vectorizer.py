@@ -0,0 +1,113 @@
+import re
+
+import numpy as np
+from scipy import sparse
+
+from .artifacts import artifact_path, load_arrays, save_arrays
+from .topk import l2_normalize_rows
+
+# The fitted TF-IDF vocabulary and weights, stored next to the item index
+VECTORIZER_NAME = 'vectorizer'
+
+
+class IngredientVectorizer:
+    """
+    The transform half of a fitted TfidfVectorizer, kept as plain arrays.
+
+    ``terms`` is the sorted vocabulary (a term's position is its column, as
+    in scikit-learn) and ``idf`` holds its weights, so a loaded vectorizer is
+    memory-mapped and shared between workers instead of each one unpickling
+    its own vocabulary dict. Only the configuration train_model.py uses is
+    supported: word unigrams, raw counts, idf weighting and l2 rows.
+
+    With ``components`` (the rows of a TruncatedSVD fitted on the catalog's
+    TF-IDF matrix) documents are projected into that latent space instead:
+    ``transform`` then returns dense, unit-length float32 rows that are
+    ``n_dimensions`` wide.
+    """
+
+    def __init__(self, terms, idf, token_pattern=r'(?u)\b\w\w+\b', lowercase=True, components=None):
+        self.terms = terms
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.components = None if components is None else np.asarray(components, dtype=np.float32)
+        self.token_pattern = str(token_pattern)
+        self.lowercase = bool(lowercase)
+        self._tokenize = re.compile(self.token_pattern).findall
+
+    @property
+    def n_features(self):
+        return len(self.terms)
+
+    @property
+    def n_dimensions(self):
+        """Width of the rows ``transform`` returns."""
+        return self.n_features if self.components is None else self.components.shape[0]
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, svd=None):
+        params = vectorizer.get_params()
+        if (
+            params['analyzer'] != 'word' or tuple(params['ngram_range']) != (1, 1)
+            or params['tokenizer'] or params['preprocessor'] or params['strip_accents']
+            or params['binary'] or params['sublinear_tf'] or not params['use_idf'] or params['norm'] != 'l2'
+        ):
+            raise ValueError('Only word-unigram TF-IDF with l2 norm can be stored as arrays')
+
+        # scikit-learn numbers its columns in sorted term order
+        terms = np.array(vectorizer.get_feature_names_out(), dtype=str)
+        components = None if svd is None else svd.components_
+        return cls(terms, vectorizer.idf_, params['token_pattern'], params['lowercase'], components)
+
+    @classmethod
+    def load(cls, path=None, mmap_mode='r'):
+        data = load_arrays(path or artifact_path(VECTORIZER_NAME), mmap_mode)
+        return cls(
+            data['terms'], data['idf'], data['token_pattern'][()], data['lowercase'][()], data.get('components'),
+        )
+
+    def save(self, path=None):
+        save_arrays(
+            path or artifact_path(VECTORIZER_NAME),
+            terms=self.terms,
+            idf=self.idf,
+            token_pattern=np.array(self.token_pattern),
+            lowercase=np.array(self.lowercase),
+            **({} if self.components is None else {'components': self.components}),
+        )
+
+    def project(self, rows):
+        """Map TF-IDF rows into the latent space, if there is one."""
+        if self.components is None:
+            return rows
+        return l2_normalize_rows(np.asarray(rows @ self.components.T))
+
+    def transform(self, documents):
+        """TF-IDF (or latent) rows for ``documents``; terms outside the vocabulary are ignored."""
+        rows, tokens = [], []
+        n_documents = 0
+        for n_documents, document in enumerate(documents, start=1):
+            found = self._tokenize(document.lower() if self.lowercase else document)
+            tokens.extend(found)
+            rows.extend([n_documents - 1] * len(found))
+
+        shape = (n_documents, self.n_features)
+        if not tokens or not self.n_features:
+            return self.project(sparse.csr_matrix(shape, dtype=np.float32))
+
+        # Binary search the sorted vocabulary instead of hashing into a dict
+        tokens = np.array(tokens)
+        cols = np.minimum(np.searchsorted(self.terms, tokens), self.n_features - 1)
+        known = self.terms[cols] == tokens
+        counts = sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float32), (np.asarray(rows)[known], cols[known])), shape=shape
+        )
+        counts.data *= self.idf[counts.indices]
+        return self.project(l2_normalize_rows(counts))
+
+
+def load_vectorizer(path=None):
+    """Load the vectorizer of an artifact set, or None if it is missing."""
+    try:
+        return IngredientVectorizer.load(path)
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
@@ -1,114 +1,278 @@
-import joblib
+import hashlib
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
 from django.shortcuts import render
-from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import FoodItem, CustomUser, Order
-from .serializers import FoodItemSerializer, OrderSerializer
+from rest_framework.exceptions import APIException
+from .models import FoodItem, FoodItemIngredient, CustomUser, Order
+from .serializers import FoodItemSerializer, FoodItemListSerializer, OrderSerializer
+from .pagination import FoodItemCursorPagination, OrderCursorPagination
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import AllowAny
+from .authentication import CachedTokenAuthentication
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes
-from sklearn.metrics.pairwise import cosine_similarity
 from django.core.exceptions import ImproperlyConfigured
+from .recommender import HYBRID_ALPHA, recommender
+from .recommendation_cache import cached_recommendations, catalog_etag, recommendations_etag
+from .batch_recommendations import batch_recommendations, jsonl, parse_shard
+from .ingredients import parse_ingredients
+from .orders import create_order, get_prices, parse_order_items
+from .interactions import DISLIKES, INTERACTION_STATES, LIKES, remove_interaction, set_interactions
 
-# Load trained model and vectorizer with error handling
 
-try:
-    model = joblib.load('ml_models/recommendation_model.pkl')
-    vectorizer = joblib.load('ml_models/ingredient_vectorizer.pkl')
-except (FileNotFoundError, EOFError):
-    model = None
-    vectorizer = None
+def get_items_in_order(food_ids):
+    """Fetch FoodItems in one query, keeping the ranking order of ``food_ids``."""
+    items_by_id = FoodItem.objects.in_bulk(food_ids)
+    return [items_by_id[food_id] for food_id in food_ids if food_id in items_by_id]
 
-
-def get_cached_items():
-    """Cache food items to improve performance."""
-    cached_items = cache.get('all_items')
-    if not cached_items:
-        cached_items = list(FoodItem.objects.all())
-        cache.set('all_items', cached_items, timeout=3600)  # Cache for 1 hour
-    return cached_items
-
-def get_recommendations(user_id, liked_ingredients):
+def get_recommendations(user_id, liked_ingredients, exclude_ids=()):
     """Generate recommendations based on liked ingredients."""
-    if not vectorizer or not model:
-        return []
+    return get_items_in_order(recommender.rank_ingredients(liked_ingredients, exclude_ids))
 
-    if not liked_ingredients.strip():
+def rank_food_ml(user, exclude_ingredients=()):
+    """Rank the catalog by mean TF-IDF similarity to the user's liked items."""
+    liked_ids = set(user.liked_food_items.values_list('id', flat=True))
+    if not liked_ids:
         return []
 
-    # Transform liked ingredients into TF-IDF
-    user_vector = vectorizer.transform([liked_ingredients])
-    all_items = get_cached_items()
-    item_ingredients = [item.ingredients for item in all_items]
-    tfidf_matrix = vectorizer.transform(item_ingredients)
+    # Rank items by similarity, masking out what the user already rated
+    disliked_ids = set(user.disliked_food_items.values_list('id', flat=True))
+    return recommender.rank_profile(
+        liked_ids, exclude_ids=liked_ids | disliked_ids, exclude_ingredients=exclude_ingredients
+    )
 
-    # Compute similarity scores
-    similarity_scores = cosine_similarity(user_vector, tfidf_matrix).flatten()
+def parse_cf_params(params):
+    """Return (mode, alpha) from ?mode= and ?alpha=; raises ValueError with the message for the client."""
+    mode = params.get('mode', 'cf')
+    if mode not in ('cf', 'hybrid'):
+        raise ValueError('mode must be "cf" or "hybrid"')
+    if mode == 'cf':
+        return mode, None
 
-    # Get top recommendations
-    top_indices = similarity_scores.argsort()[-10:][::-1]
-    recommended_items = [all_items[i] for i in top_indices]
-
-    return recommended_items
+    try:
+        alpha = float(params.get('alpha', HYBRID_ALPHA))
+    except ValueError:
+        alpha = -1
+    if not 0 <= alpha <= 1:
+        raise ValueError('alpha must be a number between 0 and 1')
+    return mode, alpha
+
+def parse_excluded_ingredients(params, kind):
+    """
+    Return (names, cache kind) for ?exclude_ingredients=a,b. Each set of
+    names is cached under its own kind, suffixed with a digest of the names.
+    """
+    names = sorted(parse_ingredients(params.get('exclude_ingredients')))
+    if not names:
+        return (), kind
+    digest = hashlib.blake2b('\n'.join(names).encode(), digest_size=8).hexdigest()
+    return names, f'{kind}:without:{digest}'
+
+def parse_moment(value):
+    """An aware datetime from an ISO 8601 date or datetime; a date means its midnight. Raises ValueError."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+def parse_order_range(params):
+    """Queryset filters from ?since= (inclusive) and ?until= (exclusive); raises ValueError on bad dates."""
+    filters = {}
+    if params.get('since'):
+        filters['created_at__gte'] = parse_moment(params['since'])
+    if params.get('until'):
+        filters['created_at__lt'] = parse_moment(params['until'])
+    return filters
+
+def with_ingredient(name):
+    """Ids of the FoodItems linked to the ingredient ``name``, as a subquery on the through table."""
+    return FoodItemIngredient.objects.filter(ingredient__name=name).values('food_item_id')
+
+def parse_catalog_filters(params):
+    """
+    Queryset filter from ?category=, ?min_price=, ?max_price=,
+    ?ingredients= (items containing all of them) and ?exclude_ingredients=
+    (items containing none of them); raises InvalidOperation on bad prices.
+    """
+    filters = Q()
+    if params.get('category'):
+        filters &= Q(category=params['category'])
+    if params.get('min_price'):
+        filters &= Q(price__gte=Decimal(params['min_price']))
+    if params.get('max_price'):
+        filters &= Q(price__lte=Decimal(params['max_price']))
+    for name in parse_ingredients(params.get('ingredients')):
+        filters &= Q(id__in=with_ingredient(name))
+    excluded = parse_ingredients(params.get('exclude_ingredients'))
+    if excluded:
+        filters &= ~Q(id__in=FoodItemIngredient.objects.filter(ingredient__name__in=excluded).values('food_item_id'))
+    return filters
+
+def etag_matches(request, tag):
+    """True when the request's If-None-Match names ``tag`` (weak comparison) or is ``*``."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or tag.removeprefix('W/') in {candidate.removeprefix('W/') for candidate in tags}
+
+def with_etag(response, tag):
+    """
+    Tag a per-user response. Clients and shared caches must revalidate it,
+    and a cache must not hand it to another token.
+    """
+    response['ETag'] = tag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+def not_modified(tag):
+    return with_etag(HttpResponseNotModified(), tag)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommend_food_ml(request):
+    """Rank by the user's liked items; ?exclude_ingredients=a,b drops items containing any of them."""
     user = request.user
-    liked_items = user.liked_food_items.all()
+    exclude_ingredients, kind = parse_excluded_ingredients(request.query_params, 'ml')
+    # Unchanged versions mean unchanged recommendations: answer 304 before any query
+    tag = recommendations_etag(kind, user.id)
+    if etag_matches(request, tag):
+        return not_modified(tag)
 
-    if not liked_items:
-        return Response([], status=status.HTTP_200_OK)
+    # Reuse the ranked ids until the user rates something or the catalog changes
+    ranked_ids = cached_recommendations(kind, user.id, lambda: rank_food_ml(user, exclude_ingredients))
+    recommendations = get_items_in_order(ranked_ids)
 
-    # Collect all ingredients and replace None with an empty string
-    all_items = FoodItem.objects.all()
-    ingredients_list = [item.ingredients if item.ingredients else "" for item in all_items]
-    item_ids = [item.id for item in all_items]
+    # Serialize and return top recommendations
+    serializer = FoodItemSerializer(recommendations, many=True)
+    return with_etag(Response(serializer.data, status=status.HTTP_200_OK), tag)
 
-    # Create TF-IDF matrix using the preloaded vectorizer
-    tfidf_matrix = vectorizer.transform(ingredients_list)
 
-    # Find similarity for liked items
-    liked_indices = [item_ids.index(item.id) for item in liked_items]
-    liked_tfidf = tfidf_matrix[liked_indices]
-    similarity_scores = cosine_similarity(liked_tfidf, tfidf_matrix).mean(axis=0)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recommend_food_cf(request):
+    """
+    Recommend what the user's nearest neighbours liked.
+    Pass ?mode=hybrid (and optionally ?alpha=0..1) to blend in the ingredient score,
+    and ?exclude_ingredients=a,b to drop items containing any of them.
+    """
+    user = request.user
+    try:
+        mode, alpha = parse_cf_params(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    exclude_ingredients, kind = parse_excluded_ingredients(
+        request.query_params, 'cf' if mode == 'cf' else f'hybrid:{alpha}'
+    )
+    tag = recommendations_etag(kind, user.id)
+    if etag_matches(request, tag):
+        return not_modified(tag)
+
+    def rank():
+        liked_items = list(user.liked_food_items.all())
+        rated_ids = {item.id for item in liked_items}
+        rated_ids.update(user.disliked_food_items.values_list('id', flat=True))
+
+        if mode == 'cf':
+            return recommender.rank_collaborative(user.id, exclude_ids=rated_ids, exclude_ingredients=exclude_ingredients)
+
+        liked_ingredients = " ".join([item.ingredients or "" for item in liked_items])
+        return recommender.rank_hybrid(
+            user.id, liked_ingredients, rated_ids, alpha, exclude_ingredients=exclude_ingredients
+        )
+
+    recommendations = get_items_in_order(cached_recommendations(kind, user.id, rank))
+    serializer = FoodItemSerializer(recommendations, many=True)
+    return with_etag(Response(serializer.data, status=status.HTTP_200_OK), tag)
 
-    # Rank items by similarity and fix int64 issue
-    recommendations = [
-        all_items[int(i)] for i in similarity_scores.argsort()[::-1]
-        if all_items[int(i)] not in liked_items
-    ]
 
-    # Serialize and return top recommendations
-    serializer = FoodItemSerializer(recommendations[:10], many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+# Most recommendations per user the batch endpoint returns
+MAX_BATCH_TOP_K = 100
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def batch_recommend_food_ml(request):
+    """
+    Stream recommendations_ml results for every active user as JSON lines:
+    {"user_id": 1, "food_ids": [...]} per line. ?k= sets the list length and
+    ?shard=i/n limits it to users whose id modulo n is i.
+    """
+    try:
+        shard = parse_shard(request.query_params.get('shard', '0/1'))
+        k = int(request.query_params.get('k', 10))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= k <= MAX_BATCH_TOP_K:
+        return Response({'error': f'k must be between 1 and {MAX_BATCH_TOP_K}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return StreamingHttpResponse(jsonl(batch_recommendations(shard, k=k)), content_type='application/x-ndjson')
 
 
 # Food Item API View
 class FoodItemList(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        """
+        List the catalog with like/dislike counts and the user's own rating.
+
+        Optional query parameters:
+        - category, min_price, max_price: server-side filters (indexed)
+        - ingredients, exclude_ingredients: comma-separated ingredient names
+          the items must all contain / must not contain (indexed)
+        - fields=id,name,...: only serialize these fields
+        - limit (and the returned cursors): keyset pagination on id
+
+        Responses carry an ETag; a matching If-None-Match gets a 304 without
+        touching the database.
+        """
+        params = request.query_params
+        fields = [name for name in params.get('fields', '').split(',') if name]
         try:
-            items = FoodItem.objects.all()
-            data = []
-            for item in items:
-                serialized_item = FoodItemSerializer(item).data
-                serialized_item['likes'] = item.likes.count()
-                serialized_item['dislikes'] = item.dislikes.count()
-                serialized_item['user_interaction'] = (
-                    "like" if request.user in item.likes.all() else
-                    "dislike" if request.user in item.dislikes.all() else None
-                )
-                data.append(serialized_item)
-            return Response(data, status=status.HTTP_200_OK)
+            filters = parse_catalog_filters(params)
+        except InvalidOperation:
+            return Response({'error': 'min_price and max_price must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        tag = catalog_etag(request.user.id, params.lists())
+        if etag_matches(request, tag):
+            return not_modified(tag)
+
+        try:
+            # Counts are denormalized columns and the user's own ratings come
+            # from two id lookups, so the query count does not grow with the catalog.
+            # Anything the client did not ask for in ?fields= is skipped entirely.
+            items = FoodItem.objects.filter(filters).order_by('id')
+
+            context = {'fields': fields}
+            if not fields or 'user_interaction' in fields:
+                context['liked_ids'] = set(request.user.liked_food_items.values_list('id', flat=True))
+                context['disliked_ids'] = set(request.user.disliked_food_items.values_list('id', flat=True))
+
+            paginator = FoodItemCursorPagination()
+            page = paginator.paginate_queryset(items, request, view=self)
+            if page is not None:
+                data = FoodItemListSerializer(page, many=True, context=context).data
+                return with_etag(paginator.get_paginated_response(data), tag)
+
+            data = FoodItemListSerializer(items, many=True, context=context).data
+            return with_etag(Response(data, status=status.HTTP_200_OK), tag)
+        except APIException:
+            raise  # Let DRF answer bad cursors with a 404
         except Exception as e:
             return Response(
                 {"error": "Failed to fetch food items", "details": str(e)},
@@ -123,13 +287,13 @@ def like_food_item(request, food_id):
         user = request.user
 
         if request.method == 'POST':
-            # Add to likes
-            food_item.likes.add(user)
+            # Add to likes, replacing any dislike
+            set_interactions(user.id, {food_item.id: 'like'})
             return Response({'message': 'Food item liked successfully'}, status=status.HTTP_200_OK)
 
         elif request.method == 'DELETE':
             # Remove from likes
-            food_item.likes.remove(user)
+            remove_interaction(LIKES, 'like_count', food_item.id, user.id)
             return Response({'message': 'Like removed successfully'}, status=status.HTTP_200_OK)
 
     except FoodItem.DoesNotExist:
@@ -143,18 +307,68 @@ def dislike_food_item(request, food_id):
         user = request.user
 
         if request.method == 'POST':
-            # Add to dislikes
-            food_item.dislikes.add(user)
+            # Add to dislikes, replacing any like
+            set_interactions(user.id, {food_item.id: 'dislike'})
             return Response({'message': 'Food item disliked successfully'}, status=status.HTTP_200_OK)
 
         elif request.method == 'DELETE':
             # Remove from dislikes
-            food_item.dislikes.remove(user)
+            remove_interaction(DISLIKES, 'dislike_count', food_item.id, user.id)
             return Response({'message': 'Dislike removed successfully'}, status=status.HTTP_200_OK)
 
     except FoodItem.DoesNotExist:
         return Response({'error': 'Food item not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def set_food_interaction(request, food_id):
+    """Set the user's rating of one food item: {"interaction": "like" | "dislike" | "none"}."""
+    interaction = request.data.get('interaction')
+    if interaction not in INTERACTION_STATES:
+        return Response({'error': 'interaction must be "like", "dislike" or "none"'}, status=status.HTTP_400_BAD_REQUEST)
+    if not FoodItem.objects.filter(id=food_id).exists():
+        return Response({'error': 'Food item not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    set_interactions(request.user.id, {food_id: interaction})
+    return Response({'food_id': food_id, 'interaction': interaction}, status=status.HTTP_200_OK)
+
+# Largest number of queued taps accepted in one batch
+MAX_INTERACTION_BATCH = 500
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_food_interactions(request):
+    """
+    Apply queued taps in one transaction:
+    [{"food_id": 1, "interaction": "like"}, {"food_id": 2, "interaction": "none"}, ...]
+    When an item appears more than once, the last entry wins.
+    """
+    entries = request.data
+    if not isinstance(entries, list) or len(entries) > MAX_INTERACTION_BATCH:
+        return Response(
+            {'error': f'Expected a list of at most {MAX_INTERACTION_BATCH} interactions'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    states = {}
+    for entry in entries:
+        try:
+            food_id = int(entry['food_id'])
+            interaction = entry['interaction']
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Each interaction needs a food_id and an interaction'}, status=status.HTTP_400_BAD_REQUEST)
+        if interaction not in INTERACTION_STATES:
+            return Response({'error': 'interaction must be "like", "dislike" or "none"'}, status=status.HTTP_400_BAD_REQUEST)
+        states[food_id] = interaction
+
+    missing = set(states) - set(FoodItem.objects.filter(id__in=states).values_list('id', flat=True))
+    if missing:
+        return Response({'error': 'Food item not found', 'food_ids': sorted(missing)}, status=status.HTTP_404_NOT_FOUND)
+
+    if states:
+        set_interactions(request.user.id, states)
+    return Response({'updated': len(states)}, status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommend_food(request):
@@ -164,29 +378,46 @@ def recommend_food(request):
     if not liked_items:
         return Response([], status=status.HTTP_200_OK)
 
-    liked_ingredients = " ".join([item.ingredients for item in liked_items])
-    recommendations = get_recommendations(user.id, liked_ingredients)
+    liked_ingredients = " ".join([item.ingredients or "" for item in liked_items])
+    rated_ids = {item.id for item in liked_items}
+    rated_ids.update(user.disliked_food_items.values_list('id', flat=True))
+    recommendations = get_recommendations(user.id, liked_ingredients, exclude_ids=rated_ids)
 
     # Serialize and return recommendations
     serializer = FoodItemSerializer(recommendations, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
+def place_order(request):
+    """
+    Create an order from {"items": [{"id": 1, "quantity": 2}, ...]}.
+    Every id must exist; names, prices and the total come from the catalog,
+    never from the client.
+    """
+    try:
+        quantities = parse_order_items(request.data.get('items'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    prices = get_prices(quantities)
+    missing = set(quantities) - set(prices)
+    if missing:
+        return Response(
+            {'error': 'Invalid food item in order', 'food_ids': sorted(missing)}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        order = create_order(request.user, quantities, prices)
+    except Exception as e:
+        return Response({'error': 'Failed to save order', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
 # Order API View
 class OrderList(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        serializer = OrderSerializer(data=request.data)
-        if serializer.is_valid():
-            # Validate items
-            item_ids = [item['id'] for item in request.data.get('items', [])]
-            if not FoodItem.objects.filter(id__in=item_ids).exists():
-                return Response({'error': 'Invalid food item in order'}, status=status.HTTP_400_BAD_REQUEST)
-
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return place_order(request)
 
 # Login View
 class LoginView(APIView):
@@ -204,7 +435,7 @@ class LoginView(APIView):
 
 # Logout View
 class LogoutView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -237,23 +468,35 @@ class RegisterView(APIView):
 
 # User Orders View
 class UserOrdersView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        """
+        The user's orders, oldest first.
+
+        Optional query parameters:
+        - since, until: ISO 8601 dates or datetimes; since is inclusive, until exclusive
+        - limit (and the returned cursors): keyset pages in the same order
+        """
         try:
-            orders = Order.objects.filter(user=request.user)
+            filters = parse_order_range(request.query_params)
+        except ValueError:
+            return Response({'error': 'since and until must be ISO 8601 dates or datetimes'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            orders = Order.objects.filter(user=request.user, **filters).order_by('created_at', 'id')
+            paginator = OrderCursorPagination()
+            page = paginator.paginate_queryset(orders, request, view=self)
+            if page is not None:
+                return paginator.get_paginated_response(OrderSerializer(page, many=True).data)
+
             serializer = OrderSerializer(orders, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except APIException:
+            raise  # Let DRF answer bad cursors with a 404
         except Exception as e:
             return Response({'error': 'Failed to fetch orders', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def post(self, request):
-        serializer = OrderSerializer(data=request.data)
-        if serializer.is_valid():
-            try:
-                serializer.save(user=request.user)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                return Response({'error': 'Failed to save order', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return place_order(request)
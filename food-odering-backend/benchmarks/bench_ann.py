@@ -0,0 +1,130 @@
+"""
+Measure the recall/latency trade-off of the IVF index against exact scans.
+
+Items: a synthetic TF-IDF catalog where every item draws its ingredients
+from one of ``--topics`` overlapping groups. Sampled items are used as
+queries (the item itself excluded, as for "more like this"). ``exact`` is
+TopKScorer.top_k over the whole catalog, ``ivf`` scores the members of the
+``nprobe`` closest clusters only.
+
+Users: a synthetic like/dislike matrix with the same topic structure. It
+compares the precomputation of every user's 20 nearest neighbours by an
+exact chunked scan with IVFIndex.search_rows.
+
+Recall@k counts a result as a hit when it scores at least as high as the
+k-th exact result, so ties at the cut-off are not counted as misses.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_ann --items 500000
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from api.ann import IVFIndex, recall_at_k
+from api.topk import TopKScorer, l2_normalize_rows, top_k_rows
+
+
+def topic_rows(rng, rows, columns, topics, per_row, spread, values):
+    """Sparse rows whose entries fall in a window of ``spread`` columns picked by each row's topic."""
+    topic = rng.integers(0, topics, rows)
+    start = topic * (columns // topics)
+    cols = (start[:, None] + rng.integers(0, spread, (rows, per_row))) % columns
+    data = values(rows * per_row).astype(np.float32)
+    matrix = sparse.csr_matrix((data, (np.repeat(np.arange(rows), per_row), cols.ravel())), shape=(rows, columns))
+    matrix.sum_duplicates()
+    return l2_normalize_rows(matrix)
+
+
+def per_query_ms(function, queries):
+    start = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def bench_items(args, nprobes):
+    rng = np.random.default_rng(0)
+    matrix = topic_rows(rng, args.items, args.terms, args.topics, 8, 3 * args.terms // args.topics, rng.random)
+    scorer = TopKScorer(np.arange(len(matrix.indptr) - 1), matrix, normalized=True)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix)
+    print(f"items: {args.items}, {args.terms} terms; {index.n_lists} clusters built in {time.perf_counter() - start:.1f}s")
+
+    rows = rng.choice(args.items, args.queries, replace=False)
+    queries = [matrix[row].toarray().ravel() for row in rows]
+    print(f"{'mode':>10} {'ms/query':>9} {'recall@10':>10}")
+    exact = per_query_ms(lambda query: scorer.top_k(query, k=10), queries)
+    print(f"{'exact':>10} {exact:>9.2f} {1:>10.3f}")
+    for nprobe in nprobes:
+        latency = per_query_ms(lambda query: index.search(matrix, query, 10, nprobe), queries)
+        recall = recall_at_k(index, matrix, rows, k=10, nprobe=nprobe)
+        print(f"{f'ivf {nprobe}':>10} {latency:>9.2f} {recall:>10.3f}")
+
+
+def exact_neighbours(matrix, k, budget=2 ** 24):
+    """Every row's ``k`` best other rows by a chunked exact scan."""
+    n_rows = matrix.shape[0]
+    found = []
+    chunk = max(1, budget // n_rows)
+    for start in range(0, n_rows, chunk):
+        scores = (matrix[start:start + chunk] @ matrix.T).toarray()
+        scores[np.arange(len(scores)), np.arange(start, start + len(scores))] = -np.inf
+        found.extend(top_k_rows(scores, k))
+    return found
+
+
+def bench_users(args, nprobes):
+    rng = np.random.default_rng(1)
+    values = lambda size: np.where(rng.random(size) < 0.9, 1.0, -1.0)
+    matrix = topic_rows(rng, args.users, args.foods, args.topics, 10, 3 * args.foods // args.topics, values)
+
+    start = time.perf_counter()
+    exact = exact_neighbours(matrix, 20)
+    exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix)
+    build_seconds = time.perf_counter() - start
+    print(f"\nusers: {args.users}, {args.foods} foods; {index.n_lists} clusters built in {build_seconds:.1f}s")
+
+    # Tie-aware recall of the 20-neighbour lists on a sample of users
+    sample = rng.choice(args.users, min(args.users, args.queries), replace=False)
+    sample_scores = (matrix[sample] @ matrix.T).toarray()
+    print(f"{'mode':>10} {'seconds':>8} {'recall@20':>10}")
+    print(f"{'exact':>10} {exact_seconds:>8.1f} {1:>10.3f}")
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        neighbours, _ = index.search_rows(matrix, k=20, nprobe=nprobe)
+        seconds = time.perf_counter() - start
+        recalls = []
+        for scores, row in zip(sample_scores, sample):
+            cutoff = scores[exact[row][-1]]
+            found = neighbours[row][neighbours[row] >= 0]
+            recalls.append(np.count_nonzero(scores[found] >= cutoff) / len(exact[row]))
+        print(f"{f'ivf {nprobe}':>10} {seconds:>8.1f} {np.mean(recalls):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=200_000)
+    parser.add_argument('--terms', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=30_000)
+    parser.add_argument('--foods', type=int, default=20_000)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', default='1,4,8,16,32', help='Comma-separated nprobe values')
+    args = parser.parse_args()
+
+    nprobes = [int(value) for value in args.nprobe.split(',')]
+    if args.items:
+        bench_items(args, nprobes)
+    if args.users:
+        bench_users(args, nprobes)
+
+
+if __name__ == '__main__':
+    main()
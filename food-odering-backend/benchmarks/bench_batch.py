@@ -0,0 +1,59 @@
+"""
+Compare per-user profile ranking with blocked batch ranking.
+
+``single`` calls TopKScorer.profile and top_k once per user, the way
+/api/recommendations_ml/ does. ``batch`` scores blocks of users with one
+users x items product via TopKScorer.top_k_profiles, with the block size
+taken from the memory budget. Both run on a synthetic TF-IDF index, and the
+fraction of users whose top-k lists agree exactly is reported (differences
+come from float rounding between the two products).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_batch --users 5000
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from api.topk import TopKScorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--terms', type=int, default=5_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--likes', type=int, default=10, help='Liked items per user')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--budgets', default='16,64,256', help='Comma-separated memory budgets in MiB')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = sparse.random(args.items, args.terms, density=8 / args.terms, format='csr', random_state=0)
+    scorer = TopKScorer(np.arange(1, args.items + 1), matrix)
+    liked = [set(rng.choice(args.items, args.likes, replace=False) + 1) for _ in range(args.users)]
+    excluded = [ids | set(rng.choice(args.items, 3) + 1) for ids in liked]
+
+    start = time.perf_counter()
+    single = [scorer.top_k(scorer.profile(ids), k=args.k, exclude_ids=ex) for ids, ex in zip(liked, excluded)]
+    elapsed = time.perf_counter() - start
+    print(f"{args.users} users, {args.items} items, {args.terms} terms")
+    print(f"{'mode':>12} {'block':>6} {'seconds':>8} {'users/s':>9} {'agree':>6}")
+    print(f"{'single':>12} {1:>6} {elapsed:>8.2f} {args.users / elapsed:>9.0f} {1:>6.3f}")
+
+    for budget in (int(value) for value in args.budgets.split(',')):
+        block = scorer.batch_size(budget * 2**20)
+        start = time.perf_counter()
+        batch = []
+        for offset in range(0, args.users, block):
+            batch.extend(scorer.top_k_profiles(liked[offset:offset + block], excluded[offset:offset + block], k=args.k))
+        elapsed = time.perf_counter() - start
+        agree = np.mean([a == b for a, b in zip(single, batch)])
+        print(f"{f'batch {budget}M':>12} {block:>6} {elapsed:>8.2f} {args.users / elapsed:>9.0f} {agree:>6.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare loading the training interactions from CSV and from the columnar
+.npy dataset.
+
+Writes a synthetic dataset in both formats, then loads each one in a fresh
+process with train_model.load_data and reports wall time and peak RSS. The
+loaded columns are summed so memory-mapped pages are actually read.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_dataset --rows 5000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from api.dataset import INTERACTION_CODES, DatasetWriter
+
+
+def write_synthetic(directory, rows, users, foods, seed=0):
+    rng = np.random.default_rng(seed)
+    user_id = rng.integers(1, users + 1, size=rows)
+    food_id = rng.integers(1, foods + 1, size=rows)
+    names = np.array(list(INTERACTION_CODES))
+    interaction = names[rng.integers(0, len(names), size=rows)]
+
+    csv_path = os.path.join(directory, 'interactions.csv')
+    pd.DataFrame({'user_id': user_id, 'food_id': food_id, 'interaction': interaction}).to_csv(csv_path, index=False)
+
+    dataset_path = os.path.join(directory, 'dataset')
+    writer = DatasetWriter(dataset_path)
+    writer.columns['user_id'].frombytes(user_id.astype(np.int64).tobytes())
+    writer.columns['food_id'].frombytes(food_id.astype(np.int64).tobytes())
+    codes = np.array([INTERACTION_CODES[name] for name in names], dtype=np.int8)
+    writer.columns['interaction'].frombytes(codes[np.searchsorted(names, interaction, sorter=np.argsort(names))].tobytes())
+    writer.save()
+
+    items_path = os.path.join(directory, 'items.csv')
+    pd.DataFrame({'food_id': np.arange(1, foods + 1), 'ingredients': 'rice, water'}).to_csv(items_path, index=False)
+    return csv_path, dataset_path, items_path
+
+
+def peak_rss_kib():
+    # ru_maxrss survives fork+exec, so a child would report the parent's peak;
+    # VmHWM belongs to the new address space
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def load_in_child(kind, csv_path, dataset_path, items_path, results):
+    import train_model
+
+    before = peak_rss_kib()
+    start = time.perf_counter()
+    if kind == 'csv':
+        data, _ = train_model.load_data(csv_path, items_path, dataset_path=os.path.join(dataset_path, 'missing'))
+    else:
+        data, _ = train_model.load_data(csv_path, items_path, dataset_path=dataset_path)
+    checksum = int(data['user_id'].sum() + data['food_id'].sum() + data['interaction'].sum())
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kib()
+    results.put((kind, elapsed, (peak - before) / 1024, checksum))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--foods', type=int, default=10_000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_synthetic(directory, args.rows, args.users, args.foods)
+        print(f"{args.rows} interactions; csv {os.path.getsize(paths[0]) / 2**20:.1f} MiB")
+        print(f"{'format':>8} {'load s':>8} {'peak RSS MiB':>14}")
+        for kind in ('csv', 'npy'):
+            results = context.Queue()
+            child = context.Process(target=load_in_child, args=(kind, *paths, results))
+            child.start()
+            kind, elapsed, peak_mib, _ = results.get()
+            child.join()
+            print(f"{kind:>8} {elapsed:>8.2f} {peak_mib:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure Django startup and first-request latency with and without warmup.
+
+``check`` is the wall time of ``manage.py check`` (median of several runs),
+which every management command pays before doing any work. ``boot`` is
+django.setup() plus loading the URLconf in a fresh process, as a worker
+does. ``first`` and ``second`` are the latencies of the first two
+/api/recommendations_ml/ requests (different users, so neither is served
+from the result cache) against an in-memory test database. With
+RECOMMENDER_WARMUP=1 the ML stack is loaded during boot instead of by the
+first request.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def time_check(warmup, runs):
+    env = dict(os.environ, RECOMMENDER_WARMUP='1' if warmup else '0')
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'manage.py', 'check'], env=env, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def first_requests():
+    """Runs in a fresh interpreter; prints boot, first and second request seconds."""
+    start = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'food_ordering.settings')
+    import django
+    django.setup()
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    boot = time.perf_counter() - start
+
+    from django.conf import settings
+    from django.db import connection
+    from rest_framework.test import APIClient
+    from api.models import CustomUser, FoodItem
+
+    settings.ALLOWED_HOSTS = ['*']
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    items = [FoodItem.objects.create(name=f'Item {i}', price=5, category='Main', ingredients=f'rice beans {i}') for i in range(30)]
+    client = APIClient()
+    latencies = []
+    for name in ('alice', 'bob'):
+        user = CustomUser.objects.create_user(username=name, password='secret')
+        user.liked_food_items.add(*items[:3])
+        client.force_authenticate(user)
+        start = time.perf_counter()
+        response = client.get('/api/recommendations_ml/')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    print(boot, *latencies)
+
+
+def time_first_requests(warmup, runs):
+    env = dict(os.environ, RECOMMENDER_WARMUP='1' if warmup else '0')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_startup', '--child'],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        samples.append([float(value) for value in output.split()[-3:]])
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        first_requests()
+        return
+
+    print(f"{'warmup':>7} {'check s':>8} {'boot s':>7} {'first ms':>9} {'second ms':>10}")
+    for warmup in (False, True):
+        check = time_check(warmup, args.runs)
+        boot, first, second = time_first_requests(warmup, args.runs)
+        print(f"{'on' if warmup else 'off':>7} {check:>8.2f} {boot:>7.2f} {first * 1000:>9.1f} {second * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare sparse TF-IDF item rows with dense TruncatedSVD (latent) rows.
+
+A synthetic catalog of ingredient lists (``--terms`` vocabulary, items
+drawing ``--ingredients`` terms from one of ``--topics`` groups) is
+vectorized with TfidfVectorizer as train_model.py does, then reduced to each
+of ``--dimensions``. For every representation it reports the bytes the
+item rows take (plus the SVD components the vectorizer has to keep), the
+latency of a profile query as /api/recommendations_ml/ runs it (average
+three liked rows from one topic, score the catalog, pick the top 10), and
+the share of those 10 that come from the liked items' topic.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_svd --items 100000
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from api.topk import TopKScorer
+from api.vectorizer import IngredientVectorizer
+
+
+def synthetic_catalog(rng, items, terms, topics, ingredients):
+    words = np.array([f'ingredient{i}' for i in range(terms)])
+    topic = rng.integers(0, topics, items)
+    spread = 3 * terms // topics
+    columns = (topic[:, None] * (terms // topics) + rng.integers(0, spread, (items, ingredients))) % terms
+    return [' '.join(words[row]) for row in columns], topic
+
+
+def nbytes(matrix):
+    if hasattr(matrix, 'indptr'):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return matrix.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--terms', type=int, default=20_000)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--ingredients', type=int, default=8, help='Ingredients per item')
+    parser.add_argument('--dimensions', default='64,128,256', help='Comma-separated latent sizes')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    documents, topic = synthetic_catalog(rng, args.items, args.terms, args.topics, args.ingredients)
+    tfidf = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = tfidf.fit_transform(documents)
+    ids = np.arange(1, args.items + 1)
+
+    # Three liked items from one topic per query, as a user's likes tend to be
+    liked = []
+    for anchor in rng.choice(args.items, args.queries, replace=False):
+        same_topic = np.flatnonzero(topic == topic[anchor])
+        liked.append(set(rng.choice(same_topic, 3) + 1))
+
+    print(f"{args.items} items, {tfidf_matrix.shape[1]} terms, {tfidf_matrix.nnz / args.items:.1f} terms per item")
+    print(f"{'rows':>10} {'rows MiB':>9} {'extra MiB':>10} {'fit s':>6} {'ms/query':>9} {'on-topic@10':>12}")
+
+    def report(name, scorer, extra_bytes, fit_seconds):
+        start = time.perf_counter()
+        results = [scorer.top_k(scorer.profile(ids_), k=10, exclude_ids=ids_) for ids_ in liked]
+        latency = (time.perf_counter() - start) / len(liked) * 1000
+        on_topic = np.mean([
+            np.mean(topic[np.asarray(found) - 1] == topic[next(iter(ids_)) - 1]) for ids_, found in zip(liked, results)
+        ])
+        print(f"{name:>10} {nbytes(scorer.matrix) / 2**20:>9.1f} {extra_bytes / 2**20:>10.1f} "
+              f"{fit_seconds:>6.1f} {latency:>9.2f} {on_topic:>12.3f}")
+
+    report('tf-idf', TopKScorer(ids, tfidf_matrix), 0, 0)
+    for dimensions in (int(value) for value in args.dimensions.split(',')):
+        start = time.perf_counter()
+        svd = TruncatedSVD(n_components=dimensions, random_state=0).fit(tfidf_matrix)
+        fit_seconds = time.perf_counter() - start
+        vectorizer = IngredientVectorizer.from_sklearn(tfidf, svd)
+        scorer = TopKScorer(ids, vectorizer.project(tfidf_matrix), normalized=True)
+        report(f'svd {dimensions}', scorer, vectorizer.components.nbytes, fit_seconds)
+
+
+if __name__ == '__main__':
+    main()
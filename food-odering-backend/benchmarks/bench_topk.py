@@ -0,0 +1,90 @@
+"""
+Micro-benchmark for the top-K recommendation scorer.
+
+Times one request's worth of ranking work (profile, scoring, masking and
+top-K selection) on synthetic TF-IDF-like catalogs and reports p50/p99
+latency. Pass ``--baseline`` to also time the previous approach of a full
+``cosine_similarity`` matrix followed by a full ``argsort``.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_topk
+    python -m benchmarks.bench_topk --sizes 1000 100000 --baseline
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from api.topk import TopKScorer
+
+
+def synthetic_catalog(n_items, vocabulary, terms_per_item, seed=0):
+    """Random sparse item rows with a fixed number of terms each."""
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, vocabulary, size=n_items * terms_per_item, dtype=np.int32)
+    indptr = np.arange(0, n_items * terms_per_item + 1, terms_per_item, dtype=np.int64)
+    data = rng.random(n_items * terms_per_item, dtype=np.float32)
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(n_items, vocabulary))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def bench_scorer(scorer, liked, disliked, runs):
+    samples = []
+    for i in range(runs):
+        liked_ids = liked[i]
+        start = time.perf_counter()
+        profile = scorer.profile(liked_ids)
+        scorer.top_k(profile, k=10, exclude_ids=set(liked_ids) | set(disliked[i]))
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_baseline(matrix, liked, runs):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    samples = []
+    for i in range(runs):
+        liked_ids = set(liked[i])
+        start = time.perf_counter()
+        scores = cosine_similarity(matrix[liked[i]], matrix).mean(axis=0)
+        ranked = [int(j) for j in scores.argsort()[::-1] if int(j) not in liked_ids][:10]
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--vocabulary', type=int, default=5_000)
+    parser.add_argument('--terms', type=int, default=8, help='Non-zero terms per item')
+    parser.add_argument('--liked', type=int, default=5, help='Liked items per user')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--baseline', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'items':>10} {'method':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for n_items in args.sizes:
+        matrix = synthetic_catalog(n_items, args.vocabulary, args.terms)
+        scorer = TopKScorer(np.arange(n_items), matrix)
+        liked = [rng.choice(n_items, size=args.liked, replace=False) for _ in range(args.runs)]
+        disliked = [rng.choice(n_items, size=args.liked, replace=False) for _ in range(args.runs)]
+
+        p50, p99 = bench_scorer(scorer, liked, disliked, args.runs)
+        print(f"{n_items:>10} {'topk':>10} {p50:>10.3f} {p99:>10.3f}")
+        if args.baseline:
+            runs = max(1, args.runs // 10) if n_items > 100_000 else args.runs
+            p50, p99 = bench_baseline(matrix, liked, runs)
+            print(f"{n_items:>10} {'baseline':>10} {p50:>10.3f} {p99:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
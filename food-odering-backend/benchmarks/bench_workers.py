@@ -0,0 +1,125 @@
+"""
+Compare the memory of N worker processes serving the same artifact set.
+
+Writes a synthetic item index, vectorizer and collaborative model, then
+starts N workers that each load them and score one query against every
+item and user, so all pages are touched. ``copy`` reads every array into
+private memory (what np.load of an .npz and unpickling a TfidfVectorizer
+did); ``mmap`` maps the .npy files read-only so the workers share them
+through the page cache. The workers stay alive together while RSS and PSS
+(proportional set size: shared pages split between their users) are read,
+and the idle cost of the interpreter with numpy/scipy loaded is subtracted.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_workers --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+
+def random_rows(rng, rows, cols, per_row):
+    """CSR matrix with ``per_row`` random entries in every row."""
+    indptr = np.arange(rows + 1, dtype=np.int32) * per_row
+    indices = rng.integers(0, cols, size=rows * per_row, dtype=np.int32)
+    return sparse.csr_matrix((rng.random(rows * per_row, dtype=np.float32), indices, indptr), shape=(rows, cols))
+
+
+def write_synthetic(directory, items, users, foods, terms, seed=0):
+    from api.collaborative import CollaborativeModel
+    from api.item_index import ItemIndex
+    from api.vectorizer import IngredientVectorizer
+
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(sorted({f'ingredient{i}' for i in range(terms)}))
+    IngredientVectorizer(vocabulary, rng.random(terms) + 1).save(os.path.join(directory, 'vectorizer'))
+
+    matrix = random_rows(rng, items, terms, 12)
+    ItemIndex(np.arange(1, items + 1), matrix).save(os.path.join(directory, 'item_index'))
+
+    interactions = random_rows(rng, users, foods, 40)
+    neighbours = rng.integers(0, users, size=(users, 20), dtype=np.int32)
+    similarities = rng.random((users, 20), dtype=np.float32)
+    CollaborativeModel(
+        np.arange(1, users + 1), np.arange(1, foods + 1), interactions, neighbours, similarities
+    ).save(os.path.join(directory, 'collaborative'))
+
+
+def memory_kib():
+    """(RSS, PSS) of this process in KiB."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def worker(mode, directory, ready, done, results):
+    from api.collaborative import CollaborativeModel
+    from api.item_index import ItemIndex
+    from api.vectorizer import IngredientVectorizer
+
+    idle = memory_kib()
+    mmap_mode = 'r' if mode == 'mmap' else None
+    vectorizer = IngredientVectorizer.load(os.path.join(directory, 'vectorizer'), mmap_mode)
+    index = ItemIndex.load(os.path.join(directory, 'item_index'), mmap_mode)
+    collaborative = CollaborativeModel.load(os.path.join(directory, 'collaborative'), mmap_mode)
+
+    # Touch every page the way serving would over time
+    index.scorer.score(np.ones(vectorizer.n_features, dtype=np.float32))
+    collaborative.interactions.T @ np.ones(collaborative.interactions.shape[0], dtype=np.float32)
+    collaborative.neighbours.sum(), collaborative.similarities.sum(), collaborative.user_order.sum()
+    vectorizer.transform([' '.join(vectorizer.terms[:50])])
+
+    ready.wait()
+    rss, pss = memory_kib()
+    results.put((rss - idle[0], pss - idle[1]))
+    done.wait()
+
+
+def measure(context, mode, directory, workers):
+    ready, done = context.Barrier(workers + 1), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, directory, ready, done, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    ready.wait()
+    samples = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    rss, pss = np.array(samples).T / 1024
+    return rss.mean(), pss.mean(), pss.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--items', type=int, default=500_000)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--foods', type=int, default=20_000)
+    parser.add_argument('--terms', type=int, default=50_000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic(directory, args.items, args.users, args.foods, args.terms)
+        size = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+        )
+        print(f"{args.workers} workers; artifacts {size / 2**20:.1f} MiB on disk")
+        print(f"{'mode':>6} {'RSS/worker MiB':>15} {'PSS/worker MiB':>15} {'total PSS MiB':>14}")
+        for mode in ('copy', 'mmap'):
+            rss, pss, total = measure(context, mode, directory, args.workers)
+            print(f"{mode:>6} {rss:>15.1f} {pss:>15.1f} {total:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -51,7 +51,7 @@ AUTH_USER_MODEL = 'api.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -112,6 +112,37 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# Every worker must see the same cache: token lookups, recommendation version
+# stamps and cached prices are invalidated by whichever worker handles the
+# change. Set REDIS_URL (or MEMCACHED_LOCATION) wherever more than one process
+# serves requests; `manage.py check --deploy` fails without one. The fallback
+# is private to each process and only suits runserver and the tests.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -152,3 +183,36 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Seconds between checks for a newly published recommendation artifact set
+# (ml_models/CURRENT); workers swap to it without restarting
+MODEL_RELOAD_INTERVAL = 30
+
+# Import numpy/scipy and map the recommendation artifacts when Django starts
+# instead of on the first recommendation request. Enable it for web workers
+# (RECOMMENDER_WARMUP=1) so management commands keep starting fast.
+RECOMMENDER_WARMUP = os.environ.get('RECOMMENDER_WARMUP') == '1'
+
+# Threads the async endpoints (api/async_views.py) score recommendations on;
+# also the most rankings that run at once in one worker
+RECOMMENDER_THREADS = int(os.environ.get('RECOMMENDER_THREADS', 4))
+
+# Clusters scored per query when the item index carries an ANN index (built
+# by train_model.py for catalogs of 10k+ items). Higher is closer to exact
+# and slower; 0 always scans the whole catalog.
+RECOMMENDER_ANN_NPROBE = int(os.environ.get('RECOMMENDER_ANN_NPROBE', 8))
+
+# Token lookups (api/authentication.py) are cached in the shared cache for
+# AUTH_TOKEN_CACHE_TIMEOUT seconds and in a per-process LRU of
+# AUTH_TOKEN_LOCAL_SIZE entries for AUTH_TOKEN_LOCAL_TTL seconds. Logout and
+# user changes invalidate the shared entry and the local LRU of the worker
+# that handled them, so AUTH_TOKEN_LOCAL_TTL bounds how long other workers
+# lag behind.
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_SIZE = 1024
+AUTH_TOKEN_LOCAL_TTL = 5
+
+# Threads that write resized copies of uploaded food images (api/images.py)
+IMAGE_VARIANT_THREADS = int(os.environ.get('IMAGE_VARIANT_THREADS', 2))
+# Lifetime of resized images in the browser cache; their names change with their content
+IMAGE_VARIANT_MAX_AGE = 365 * 24 * 3600
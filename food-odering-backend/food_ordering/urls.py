@@ -20,8 +20,22 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
+
+from api.images import VARIANT_DIR
 
 urlpatterns = [
     path('admin/', admin.site.urls),
      path('api/', include('api.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.DEBUG:
+    # Resized images are named by content, so browsers may keep them for good;
+    # configure the same header on the web server that serves media in production
+    urlpatterns += static(
+        f'{settings.MEDIA_URL}{VARIANT_DIR}/',
+        cache_control(public=True, max_age=settings.IMAGE_VARIANT_MAX_AGE, immutable=True)(serve),
+        document_root=f'{settings.MEDIA_ROOT}/{VARIANT_DIR}',
+    )
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,83 +1,429 @@
+import argparse
+import hashlib
+import os
+import shutil
 import pandas as pd
 import numpy as np
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.neighbors import NearestNeighbors
 import joblib
+from api.ann import DEFAULT_NPROBE, build_ann, recall_at_k
+from api.artifacts import (
+    KEEP_VERSIONS, artifact_lock, artifact_path, create_version, current_version, prune_versions, publish,
+    version_dir, write_manifest,
+)
+from api.collaborative import COLLABORATIVE_NAME, CollaborativeModel
+from api.dataset import (
+    DATASET_DIR, build_interaction_matrix, build_order_matrix, encode_interactions, exists as dataset_exists, load_columns,
+    merge_interactions,
+)
+from api.item_index import ITEM_INDEX_NAME, ItemIndex
+from api.topk import l2_normalize_rows
+from api.vectorizer import VECTORIZER_NAME, IngredientVectorizer, load_vectorizer
 
 # File paths
 data_file_path = "ml_models/recommendation_data.csv"  # CSV file exported by export_data.py
-MODEL_FILE = 'ml_models/recommendation_model.pkl'  # File to save the trained model
-VECTORIZER_FILE = 'ml_models/ingredient_vectorizer.pkl'  # File to save the TF-IDF vectorizer
+items_file_path = "ml_models/recommendation_items.csv"  # One row of ingredients per food item
+delta_file_path = "ml_models/recommendation_data_delta.csv"  # Written by export_data --incremental
 
-def load_data(file_path):
-    """Load the dataset from a CSV file."""
+# Artifact names; every run writes a complete set to a new version directory
+MODEL_NAME = 'recommendation_model.pkl'  # The NearestNeighbors model, for offline use only
+ITEMS_NAME = 'items.npz'  # Food ids and ingredient hashes, to find changed items incrementally
+APPLIED_DELTA_NAME = 'applied_delta.csv'  # The delta an incremental run consumed
+N_NEIGHBOURS = 20  # Neighbours precomputed per user
+SIMILARITY_BUDGET = 2 ** 24  # Similarity cells held in memory at once by incremental updates
+RECALL_SAMPLES = 200  # Queries used to report the recall of the ANN indexes
+
+def load_data(file_path, items_path=items_file_path, dataset_path=DATASET_DIR):
+    """
+    Load the interaction columns and the item table.
+    Interactions are memory-mapped from the columnar dataset when it exists,
+    with the CSV file as a fallback (export_data --format csv removes the
+    dataset, so the newer export always wins); either way the interaction
+    column is integer coded.
+    """
     try:
-        data = pd.read_csv(file_path)
-        print(f"Data loaded successfully with {len(data)} rows.")
-        return data
+        if dataset_exists(dataset_path):
+            print(f"Loading interactions from {dataset_path}")
+            data = load_columns(dataset_path)
+        else:
+            print(f"Loading interactions from {file_path}")
+            csv_data = pd.read_csv(file_path)
+            data = {
+                'user_id': csv_data['user_id'].to_numpy(),
+                'food_id': csv_data['food_id'].to_numpy(),
+                'interaction': encode_interactions(csv_data['interaction'].to_numpy()),
+            }
+        items = pd.read_csv(items_path)
+        print(f"Data loaded successfully with {len(data['user_id'])} rows and {len(items)} items.")
+        return data, items
     except FileNotFoundError:
         print("Data file not found. Please run the export_data command first.")
         exit()
 
-def preprocess_data(data):
+def preprocess_data(data, items, dimensions=0):
     """
     Preprocess the data.
-    - Transform ingredients using TF-IDF.
-    - Create a user-item interaction matrix.
+    - Transform ingredients using TF-IDF, one document per food item, and
+      optionally reduce the rows to ``dimensions`` dense latent dimensions.
+    - Create a sparse user-item interaction matrix (like/order = 1, dislike = -1)
+      with the user and food ids of its rows and columns.
+    Returns the item rows, the interactions and an IngredientVectorizer.
     """
     # TF-IDF vectorization of ingredients
-    vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(data['ingredients'].fillna(''))
-
-    # Create a user-item interaction matrix
-    interaction_matrix = pd.pivot_table(
-        data,
-        index='user_id',
-        columns='food_id',
-        values='interaction',
-        aggfunc=lambda x: 1 if 'like' in x or 'order' in x else -1 if 'dislike' in x else 0,
-        fill_value=0
+    tfidf = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = tfidf.fit_transform(items['ingredients'].fillna(''))
+    vectorizer = IngredientVectorizer.from_sklearn(tfidf, reduce_dimensions(tfidf_matrix, dimensions))
+    item_matrix = vectorizer.project(tfidf_matrix)
+
+    # Create a user-item interaction matrix without a dense intermediate
+    interaction_matrix, user_ids, food_ids = build_interaction_matrix(
+        data['user_id'], data['food_id'], data['interaction']
     )
 
     print("Data preprocessing complete.")
-    return tfidf_matrix, interaction_matrix, vectorizer
+    return item_matrix, (interaction_matrix, user_ids, food_ids), vectorizer
+
+def reduce_dimensions(tfidf_matrix, dimensions):
+    """
+    Fit a TruncatedSVD (latent semantic analysis) of the item TF-IDF rows,
+    or return None when ``dimensions`` is 0. Items then become dense
+    ``dimensions``-wide rows instead of vocabulary-wide sparse ones.
+    """
+    if not dimensions:
+        return None
+    limit = min(tfidf_matrix.shape) - 1
+    if dimensions > limit:
+        print(f"Only {limit} latent dimensions are possible with this catalog; using {limit}.")
+        dimensions = limit
+    if dimensions < 1:
+        return None
+    svd = TruncatedSVD(n_components=dimensions, random_state=0)
+    svd.fit(tfidf_matrix)
+    print(f"Reduced {tfidf_matrix.shape[1]} terms to {dimensions} latent dimensions "
+          f"({svd.explained_variance_ratio_.sum():.1%} of the variance).")
+    return svd
 
 def train_model(interaction_matrix):
     """
     Train a collaborative filtering model using Nearest Neighbors.
     """
-    # Convert the interaction matrix to a numpy array
-    interaction_matrix_np = interaction_matrix.to_numpy()
-
-    # Train a NearestNeighbors model
+    # Train a NearestNeighbors model on the sparse interaction matrix
     model = NearestNeighbors(metric='cosine', algorithm='brute')
-    model.fit(interaction_matrix_np)
+    model.fit(interaction_matrix)
 
     print("Model training complete.")
     return model
 
-def save_model(model, vectorizer):
-    """Save the trained model and vectorizer to files."""
-    joblib.dump(model, MODEL_FILE)
-    joblib.dump(vectorizer, VECTORIZER_FILE)
-    print(f"Model saved to {MODEL_FILE}")
-    print(f"Vectorizer saved to {VECTORIZER_FILE}")
+def compute_neighbours(model, interaction_matrix, n_neighbours=N_NEIGHBOURS, ann=None, nprobe=DEFAULT_NPROBE):
+    """
+    Precompute each user's nearest neighbours so serving is a lookup.
+    Returns (neighbours, similarities) arrays of shape (users, n_neighbours),
+    padded with -1 / 0 when there are fewer users than neighbours.
+    With an ANN index over the users, each one is only compared with the
+    users in its ``nprobe`` closest clusters instead of with everyone.
+    """
+    if ann is not None:
+        found, scores = ann.search_rows(l2_normalize_rows(interaction_matrix), k=n_neighbours, nprobe=nprobe)
+        print(f"Neighbour lists computed from {nprobe} of {ann.n_lists} user clusters.")
+        return found.astype(np.int32), np.where(found >= 0, scores, 0).astype(np.float32)
+
+    n_users = interaction_matrix.shape[0]
+    neighbours = np.full((n_users, n_neighbours), -1, dtype=np.int32)
+    similarities = np.zeros((n_users, n_neighbours), dtype=np.float32)
+
+    n_query = min(n_neighbours + 1, n_users)
+    distances, indices = model.kneighbors(interaction_matrix, n_neighbors=n_query)
+    for row in range(n_users):
+        # Drop the user itself from its own neighbour list
+        keep = indices[row] != row
+        found = indices[row][keep][:n_neighbours]
+        neighbours[row, :len(found)] = found
+        similarities[row, :len(found)] = 1 - distances[row][keep][:n_neighbours]
+
+    print("Neighbour lists computed.")
+    return neighbours, similarities
+
+def update_neighbours(interaction_matrix, neighbours, similarities, affected, n_neighbours=N_NEIGHBOURS,
+                      ann=None, nprobe=DEFAULT_NPROBE):
+    """
+    Refresh neighbour lists after the rows in ``affected`` changed.
+
+    Affected users get their lists recomputed against everyone. Every other
+    user only needs its similarity to the affected users: stale entries that
+    point at them are dropped and the fresh values compete with the rest of
+    the stored list. One sparse product of all users against the affected
+    ones covers both, so the cost grows with the number of changed users,
+    not with the square of the user base. ``neighbours`` / ``similarities``
+    may have fewer rows than the matrix; rows for new users are appended.
+    With an ANN index, affected users are only compared with their
+    ``nprobe`` closest clusters.
+    """
+    n_users = interaction_matrix.shape[0]
+    missing = n_users - len(neighbours)
+    neighbours = np.vstack([neighbours, np.full((missing, n_neighbours), -1, dtype=np.int32)])
+    similarities = np.vstack([similarities, np.zeros((missing, n_neighbours), dtype=np.float32)])
+    if not len(affected):
+        return neighbours, similarities
+
+    normalized = l2_normalize_rows(interaction_matrix)
+    is_affected = np.zeros(n_users, dtype=bool)
+    is_affected[affected] = True
+
+    if ann is not None:
+        # Affected users: only the members of their closest clusters
+        found, scores = ann.search_rows(normalized, affected, k=n_neighbours, nprobe=nprobe)
+        neighbours[affected] = found
+        similarities[affected] = np.where(found >= 0, scores, 0)
+    else:
+        # Affected users: full rows of similarities, a few users at a time
+        chunk = max(1, SIMILARITY_BUDGET // n_users)
+        for start in range(0, len(affected), chunk):
+            rows = affected[start:start + chunk]
+            scores = (normalized[rows] @ normalized.T).toarray()
+            scores[np.arange(len(rows)), rows] = -np.inf  # Never your own neighbour
+            neighbours[rows], similarities[rows] = _best(np.arange(n_users), scores, n_neighbours)
+
+    # Everyone else: keep the stored entries that are still valid and merge in
+    # the similarity to each affected user
+    others = np.flatnonzero(~is_affected)
+    against_affected = normalized[affected].T
+    chunk = max(1, SIMILARITY_BUDGET // (len(affected) + n_neighbours))
+    for start in range(0, len(others), chunk):
+        rows = others[start:start + chunk]
+        stored = neighbours[rows]
+        stored_scores = np.where((stored >= 0) & ~is_affected[stored], similarities[rows], -np.inf)
+        candidates = np.hstack([stored, np.broadcast_to(affected, (len(rows), len(affected)))])
+        scores = np.hstack([stored_scores, (normalized[rows] @ against_affected).toarray()])
+        neighbours[rows], similarities[rows] = _best(candidates, scores, n_neighbours)
+
+    print(f"Neighbour lists updated for {len(affected)} changed users.")
+    return neighbours, similarities
+
+def _best(candidates, scores, n_neighbours):
+    """Pick the ``n_neighbours`` highest-scoring candidates per row, padded with -1 / 0."""
+    n_rows = len(scores)
+    if candidates.ndim == 1:
+        candidates = np.broadcast_to(candidates, scores.shape)
+    width = min(n_neighbours, scores.shape[1])
+    top = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    neighbours = np.full((n_rows, n_neighbours), -1, dtype=np.int32)
+    similarities = np.zeros((n_rows, n_neighbours), dtype=np.float32)
+    found = np.isfinite(top_scores)
+    neighbours[:, :width] = np.where(found, np.take_along_axis(candidates, top, axis=1), -1)
+    similarities[:, :width] = np.where(found, top_scores, 0)
+    return neighbours, similarities
+
+def ingredient_hashes(items):
+    """Stable 64-bit hash of each item's ingredients, so changed items can be found later."""
+    return np.array([
+        int.from_bytes(hashlib.blake2b(str(ingredients).encode(), digest_size=8).digest(), 'little')
+        for ingredients in items['ingredients'].fillna('')
+    ], dtype=np.uint64)
+
+def save_items(version, items):
+    np.savez(
+        artifact_path(ITEMS_NAME, version),
+        ids=items['food_id'].to_numpy(dtype=np.int64),
+        hashes=ingredient_hashes(items),
+    )
+
+def save_item_index(version, index):
+    index.save(artifact_path(ITEM_INDEX_NAME, version))
+    print(f"Item index saved to {artifact_path(ITEM_INDEX_NAME, version)} ({len(index)} items)")
+
+def save_collaborative(version, user_ids, food_ids, interaction_matrix, neighbours, similarities, ann=None,
+                       ordered=None):
+    """Save the sparse interaction matrix, id mappings, neighbour lists, user ANN index and order cells."""
+    path = artifact_path(COLLABORATIVE_NAME, version)
+    CollaborativeModel(
+        user_ids, food_ids, interaction_matrix, neighbours, similarities, ann=ann, ordered=ordered
+    ).save(path)
+    print(f"Collaborative data saved to {path}")
+
+def save_model(version, model, vectorizer):
+    """
+    Save the trained model, and the vectorizer as memory-mappable arrays
+    (pass a fitted TfidfVectorizer or an IngredientVectorizer).
+    """
+    if not isinstance(vectorizer, IngredientVectorizer):
+        vectorizer = IngredientVectorizer.from_sklearn(vectorizer)
+    joblib.dump(model, artifact_path(MODEL_NAME, version))
+    vectorizer.save(artifact_path(VECTORIZER_NAME, version))
+    print(f"Model saved to {artifact_path(MODEL_NAME, version)}")
+    print(f"Vectorizer saved to {artifact_path(VECTORIZER_NAME, version)}")
+
+def report_recall(name, ann, matrix, nprobe):
+    """Print the recall@10 of an ANN index against an exact scan, on a sample of its own rows."""
+    if ann is None:
+        return
+    rng = np.random.default_rng(0)
+    rows = rng.choice(matrix.shape[0], min(RECALL_SAMPLES, matrix.shape[0]), replace=False)
+    recall = recall_at_k(ann, matrix, rows, k=10, nprobe=nprobe)
+    print(f"{name} ANN index: {ann.n_lists} clusters, recall@10 {recall:.3f} at nprobe={nprobe}")
+
+def publish_version(version, base):
+    """
+    Make ``version`` the set served by running workers, which pick it up
+    without a restart. Call with the artifact lock held. If a set other
+    than ``base`` (the one the run started from) was published meanwhile,
+    e.g. by an admin edit, ``version`` is discarded rather than publishing
+    over that set's changes.
+    """
+    current = current_version()
+    if current != base:
+        shutil.rmtree(version_dir(version), ignore_errors=True)
+        print(f"Artifact version {current} was published after this run started from {base}; discarded {version}. Run the training again.")
+        exit(1)
+    publish(version)
+    prune_versions(KEEP_VERSIONS)
+    print(f"Published artifact version {version}")
+
+def train_full(nprobe=DEFAULT_NPROBE, dimensions=0):
+    base = current_version()
 
-def main():
     # Load data
-    data = load_data(data_file_path)
+    data, items = load_data(data_file_path)
     if data is None:
         return
 
     # Preprocess data
-    tfidf_matrix, interaction_matrix, vectorizer = preprocess_data(data)
+    item_matrix, interactions, vectorizer = preprocess_data(data, items, dimensions)
 
     # Train the model
+    interaction_matrix, user_ids, food_ids = interactions
+    ordered = build_order_matrix(user_ids, food_ids, data['user_id'], data['food_id'], data['interaction'])
     model = train_model(interaction_matrix)
+    normalized = l2_normalize_rows(interaction_matrix)
+    user_ann = build_ann(normalized)  # None for small user bases, which are compared exhaustively
+    neighbours, similarities = compute_neighbours(model, interaction_matrix, ann=user_ann, nprobe=nprobe)
+    index = ItemIndex(items['food_id'].to_numpy(), item_matrix).with_ann()
+    report_recall('User', user_ann, normalized, nprobe)
+    report_recall('Item', index.ann, index.matrix, nprobe)
+
+    # Save the model, vectorizer, item index and collaborative filtering data
+    version = create_version()
+    save_model(version, model, vectorizer)
+    save_item_index(version, index)
+    save_items(version, items)
+    save_collaborative(version, user_ids, food_ids, interaction_matrix, neighbours, similarities, user_ann, ordered)
+    # Admin edits publish sets derived from the current one; the lock keeps
+    # them from publishing or pruning in between, and the manifest is only
+    # written under it, so pruning never takes a set still being written
+    with artifact_lock():
+        write_manifest(version, mode='full', users=len(user_ids), items=len(items))
+        publish_version(version, base)
 
-    # Save the model and vectorizer
-    save_model(model, vectorizer)
+def train_incremental(nprobe=DEFAULT_NPROBE):
+    """
+    Apply the pending interaction delta and catalog changes to the current
+    artifact set and publish the result as a new version. The vectorizer's
+    vocabulary is kept, so ingredients it has never seen only count after
+    the next full run.
+    """
+    base = current_version()
+    vectorizer = load_vectorizer(artifact_path(VECTORIZER_NAME, base)) if base else None
+    if vectorizer is None:
+        print("No versioned artifacts to update yet. Run a full training first.")
+        exit()
+
+    version = create_version()
+    applied_path = os.path.join(version_dir(version), APPLIED_DELTA_NAME)
+    if os.path.exists(delta_file_path):
+        # Claim the delta so exports made while we run start a new one
+        os.replace(delta_file_path, applied_path)
+    try:
+        items = pd.read_csv(items_file_path)
+
+        # Interactions: merge the delta and refresh only the neighbour lists it touches
+        collaborative = CollaborativeModel.load(artifact_path(COLLABORATIVE_NAME, base))
+        delta = pd.read_csv(applied_path) if os.path.exists(applied_path) else pd.DataFrame(
+            {'user_id': [], 'food_id': [], 'interaction': []}
+        )
+        interaction_matrix, user_ids, food_ids, affected, ordered = merge_interactions(
+            collaborative.interactions, collaborative.user_ids, collaborative.food_ids,
+            delta['user_id'].to_numpy(dtype=np.int64), delta['food_id'].to_numpy(dtype=np.int64),
+            encode_interactions(delta['interaction'].to_numpy()), collaborative.ordered,
+        )
+        print(f"Merged {len(delta)} new interactions from {len(affected)} users.")
+        if collaborative.ann is not None:
+            # Changed and new users move to their closest cluster (the scale of a row
+            # does not change which centroid is closest, so no normalizing needed)
+            user_ann = collaborative.ann.with_rows(interaction_matrix, affected)
+        else:
+            user_ann = build_ann(l2_normalize_rows(interaction_matrix))
+        neighbours, similarities = update_neighbours(
+            interaction_matrix, collaborative.neighbours, collaborative.similarities, affected,
+            ann=user_ann, nprobe=nprobe,
+        )
+        model = train_model(interaction_matrix)  # Brute-force NN only stores the matrix
+
+        # Catalog: re-vectorize new or edited items and drop deleted ones
+        index = ItemIndex.load(artifact_path(ITEM_INDEX_NAME, base))
+        try:
+            with np.load(artifact_path(ITEMS_NAME, base)) as known:
+                known_hashes = dict(zip(known['ids'].tolist(), known['hashes'].tolist()))
+        except FileNotFoundError:
+            known_hashes = {}
+        hashes = ingredient_hashes(items).tolist()
+        changed = [
+            (food_id, ingredients)
+            for food_id, ingredients, digest in zip(items['food_id'].tolist(), items['ingredients'].fillna('').tolist(), hashes)
+            if known_hashes.get(food_id) != digest
+        ]
+        removed = set(index.ids.tolist()) - set(items['food_id'].tolist())
+        index = index.with_items(vectorizer, changed).without_items(removed)
+        if index.ann is None:
+            index = index.with_ann()
+        print(f"Item index: {len(changed)} items added or changed, {len(removed)} removed.")
+
+        save_model(version, model, vectorizer)
+        save_item_index(version, index)
+        save_items(version, items)
+        save_collaborative(
+            version, user_ids, food_ids, interaction_matrix, neighbours, similarities, user_ann, ordered
+        )
+        write_manifest(version, mode='incremental', base=base, users=len(user_ids), items=len(items))
+    except BaseException:
+        # Hand the delta back so the next run applies it; a newer delta may already exist
+        if os.path.exists(applied_path):
+            with open(applied_path) as applied, open(delta_file_path, 'a') as pending:
+                if pending.tell():
+                    next(applied)  # Skip the header
+                shutil.copyfileobj(applied, pending)
+        shutil.rmtree(version_dir(version), ignore_errors=True)
+        raise
+    publish_version(version, base)
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the recommendation models.')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help=f'Apply {delta_file_path} and catalog changes to the current artifacts instead of retraining',
+    )
+    parser.add_argument(
+        '--nprobe', type=int, default=DEFAULT_NPROBE,
+        help='Clusters searched per user when finding neighbours with the ANN index (built for 10k+ users)',
+    )
+    parser.add_argument(
+        '--dimensions', type=int, default=0,
+        help='Reduce the ingredient TF-IDF vectors to this many dense latent dimensions with TruncatedSVD '
+             '(0 keeps sparse TF-IDF rows). Incremental runs keep the setting of the version they update.',
+    )
+    args = parser.parse_args()
+    if args.incremental:
+        # Admin edits publish sets derived from the current one too; neither may publish over the other.
+        # Held for the whole run, since the run derives its set from the current one as well
+        with artifact_lock():
+            train_incremental(args.nprobe)
+    else:
+        train_full(args.nprobe, args.dimensions)
 
 if __name__ == "__main__":
     main()
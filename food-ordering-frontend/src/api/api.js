@@ -61,3 +61,28 @@ export const fetchRecommendations = async (token) => {
   });
   return response.data;
 };
+
+export const setFoodInteraction = async (foodId, interaction, token) => {
+  if (!token) throw new Error("Token is missing");
+  const response = await axios.put(
+    `${API_BASE_URL}food/${foodId}/interaction/`,
+    { interaction },
+    {
+      headers: {
+        Authorization: `Token ${token}`,
+      },
+    }
+  );
+  return response.data;
+};
+
+// Send queued taps in one request: [{ food_id, interaction }, ...]
+export const flushFoodInteractions = async (interactions, token) => {
+  if (!token) throw new Error("Token is missing");
+  const response = await axios.post(`${API_BASE_URL}food/interactions/`, interactions, {
+    headers: {
+      Authorization: `Token ${token}`,
+    },
+  });
+  return response.data;
+};
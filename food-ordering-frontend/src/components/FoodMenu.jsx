@@ -60,33 +60,31 @@ const FoodMenu = ({
     }
   }, [selectedCategory]);
 
+  // Set the user's rating of an item; the server keeps like/dislike exclusive
+  const setInteraction = async (itemId, interaction) => {
+    const token = localStorage.getItem("token");
+    if (!token) throw new Error("Token is missing");
+
+    const response = await fetch(`http://127.0.0.1:8000/api/food/${itemId}/interaction/`, {
+      method: "PUT",
+      headers: {
+        Authorization: `Token ${token}`,
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ interaction }),
+    });
+    // Keep showing the previous rating when the server did not store the new one
+    if (!response.ok) throw new Error(`Failed to set interaction: ${response.status}`);
+    setInteractions((prev) => ({
+      ...prev,
+      [itemId]: interaction === "none" ? null : interaction,
+    }));
+  };
+
   const handleLike = async (itemId) => {
     try {
-      const token = localStorage.getItem("token");
-      if (!token) throw new Error("Token is missing");
-
-      // Check if the current state is "like"
-      if (interactions[itemId] === "like") {
-        // Remove the like
-        await fetch(`http://127.0.0.1:8000/api/food/${itemId}/like/`, {
-          method: "DELETE",
-          headers: {
-            Authorization: `Token ${token}`,
-            "Content-Type": "application/json",
-          },
-        });
-        setInteractions((prev) => ({ ...prev, [itemId]: null }));
-      } else {
-        // Add a like
-        await fetch(`http://127.0.0.1:8000/api/food/${itemId}/like/`, {
-          method: "POST",
-          headers: {
-            Authorization: `Token ${token}`,
-            "Content-Type": "application/json",
-          },
-        });
-        setInteractions((prev) => ({ ...prev, [itemId]: "like" }));
-      }
+      // Toggle the like off if it is already set
+      await setInteraction(itemId, interactions[itemId] === "like" ? "none" : "like");
     } catch (error) {
       console.error("Error toggling like:", error);
     }
@@ -94,31 +92,8 @@ const FoodMenu = ({
 
   const handleDislike = async (itemId) => {
     try {
-      const token = localStorage.getItem("token");
-      if (!token) throw new Error("Token is missing");
-
-      // Check if the current state is "dislike"
-      if (interactions[itemId] === "dislike") {
-        // Remove the dislike
-        await fetch(`http://127.0.0.1:8000/api/food/${itemId}/dislike/`, {
-          method: "DELETE",
-          headers: {
-            Authorization: `Token ${token}`,
-            "Content-Type": "application/json",
-          },
-        });
-        setInteractions((prev) => ({ ...prev, [itemId]: null }));
-      } else {
-        // Add a dislike
-        await fetch(`http://127.0.0.1:8000/api/food/${itemId}/dislike/`, {
-          method: "POST",
-          headers: {
-            Authorization: `Token ${token}`,
-            "Content-Type": "application/json",
-          },
-        });
-        setInteractions((prev) => ({ ...prev, [itemId]: "dislike" }));
-      }
+      // Toggle the dislike off if it is already set
+      await setInteraction(itemId, interactions[itemId] === "dislike" ? "none" : "dislike");
     } catch (error) {
       console.error("Error toggling dislike:", error);
     }